@@ -3,20 +3,22 @@
 负责账户配置、多账户协调和会话缓存管理
 """
 import asyncio
+import heapq
 import json
 import logging
 import os
-import random
-import threading
 import time
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, TYPE_CHECKING, Iterable
+from typing import Callable, Dict, List, Optional, TYPE_CHECKING, Iterable
 
 from fastapi import HTTPException
 
 # 导入存储层（支持数据库）
 from core import storage
+from core.scheduler import SchedulingPolicy, create_policy
+from core.session_cache import SessionCacheBackend, create_session_cache
 
 if TYPE_CHECKING:
     from core.jwt import JWTManager
@@ -40,7 +42,20 @@ QUOTA_TYPES = {
     "videos": "视频"
 }
 
-@dataclass
+_BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+def _parse_beijing_timestamp(value: Optional[str], fmt: str) -> Optional[float]:
+    """解析北京时间字符串为 epoch 秒，无效时返回 None"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, fmt).replace(tzinfo=_BEIJING_TZ).timestamp()
+    except Exception:
+        return None
+
+
+@dataclass(slots=True)
 class AccountConfig:
     """单个账户配置"""
     account_id: str
@@ -63,46 +78,41 @@ class AccountConfig:
     mail_domain: Optional[str] = None
     mail_api_key: Optional[str] = None
     trial_end: Optional[str] = None  # 试用到期日 (格式: "2026-03-25"，独立于cookie过期)
+    # 解析后的时间戳缓存（epoch 秒，随 expires_at / trial_end 赋值自动更新）
+    _expires_ts: Optional[float] = field(init=False, repr=False, compare=False)
+    _trial_end_ts: Optional[float] = field(init=False, repr=False, compare=False)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name == "expires_at":
+            object.__setattr__(self, "_expires_ts", _parse_beijing_timestamp(value, "%Y-%m-%d %H:%M:%S"))
+        elif name == "trial_end":
+            object.__setattr__(self, "_trial_end_ts", _parse_beijing_timestamp(value, "%Y-%m-%d"))
+
+    @property
+    def expires_ts(self) -> Optional[float]:
+        """过期时间戳（epoch 秒），未设置或格式无效时为 None"""
+        return self._expires_ts
 
     def get_remaining_hours(self) -> Optional[float]:
         """计算账户剩余小时数"""
-        if not self.expires_at:
-            return None
-        try:
-            # 解析过期时间（假设为北京时间）
-            beijing_tz = timezone(timedelta(hours=8))
-            expire_time = datetime.strptime(self.expires_at, "%Y-%m-%d %H:%M:%S")
-            expire_time = expire_time.replace(tzinfo=beijing_tz)
-
-            # 当前时间（北京时间）
-            now = datetime.now(beijing_tz)
-
-            # 计算剩余时间
-            remaining = (expire_time - now).total_seconds() / 3600
-            return remaining
-        except Exception:
+        if self._expires_ts is None:
             return None
+        return (self._expires_ts - time.time()) / 3600
 
     def is_expired(self) -> bool:
         """检查账户是否已过期"""
-        remaining = self.get_remaining_hours()
-        if remaining is None:
+        if self._expires_ts is None:
             return False  # 未设置过期时间，默认不过期
-        return remaining <= 0
+        return self._expires_ts <= time.time()
 
     def get_trial_days_remaining(self) -> Optional[int]:
         """计算试用期剩余天数（基于 trial_end 字段）"""
-        if not self.trial_end:
-            return None
-        try:
-            beijing_tz = timezone(timedelta(hours=8))
-            end_date = datetime.strptime(self.trial_end, "%Y-%m-%d")
-            end_date = end_date.replace(tzinfo=beijing_tz)
-            now = datetime.now(beijing_tz)
-            remaining = (end_date.date() - now.date()).days
-            return max(0, remaining)
-        except Exception:
+        if self._trial_end_ts is None:
             return None
+        end_date = datetime.fromtimestamp(self._trial_end_ts, _BEIJING_TZ).date()
+        remaining = (end_date - datetime.now(_BEIJING_TZ).date()).days
+        return max(0, remaining)
 
 
 @dataclass(frozen=True)
@@ -138,6 +148,19 @@ def format_account_expiration(remaining_hours: Optional[float]) -> tuple:
         return ("正常", "#4caf50", f"{remaining_hours:.1f} 小时")
 
 
+TTFB_EWMA_ALPHA = 0.2  # 首响延迟 EWMA 平滑系数
+
+
+def _next_quota_reset_time() -> float:
+    """下一次每日配额重置时间戳（北京时间16:00）"""
+    beijing_tz = timezone(timedelta(hours=8))
+    now = datetime.now(beijing_tz)
+    reset = now.replace(hour=16, minute=0, second=0, microsecond=0)
+    if now >= reset:
+        reset += timedelta(days=1)
+    return reset.timestamp()
+
+
 class AccountManager:
     """单个账户管理器"""
     def __init__(
@@ -164,7 +187,38 @@ class AccountManager:
         self.conversation_count = 0  # 累计成功次数（用于统计展示）
         self.failure_count = 0  # 累计失败次数（用于统计展示）
         self.session_usage_count = 0  # 本次启动后使用次数（用于均衡轮询）
+        self.last_used_at = 0.0  # 最近一次被分配的时间（用于 JWT 预刷新判断热点账户）
+        self.in_flight = 0  # 已分配且未结束的请求数（并发槽位，用于调度和限流）
+        self.ttfb_ewma_ms: Optional[float] = None  # 首响延迟指数滑动平均（毫秒）
         self.disabled_reason: Optional[str] = None  # 自动禁用原因（如 "403 Access Restricted"）
+        # 可用性变化回调（由 MultiAccountManager 注册，用于维护可用性索引）
+        self.state_listener: Optional[Callable[[str], None]] = None
+
+    def record_ttfb(self, ttfb_ms: float) -> None:
+        """更新首响延迟 EWMA"""
+        if self.ttfb_ewma_ms is None:
+            self.ttfb_ewma_ms = float(ttfb_ms)
+        else:
+            self.ttfb_ewma_ms += TTFB_EWMA_ALPHA * (ttfb_ms - self.ttfb_ewma_ms)
+
+    def get_remaining_daily_quota(self, quota_types: Optional[Iterable[str]] = None) -> float:
+        """当日剩余配额（未启用配额上限时返回已用次数的相反数，便于比较）"""
+        if isinstance(quota_types, str):
+            quota_types = [quota_types]
+        quota_type = next((qt for qt in (quota_types or []) if qt != "text"), "text")
+        from core.config import config
+        quota_limits = config.quota_limits
+        self._reset_daily_usage_if_needed()
+        used = self.daily_usage.get(quota_type, 0)
+        limit = getattr(quota_limits, f"{quota_type}_daily_limit", 0) if quota_limits.enabled else 0
+        if limit > 0:
+            return float(limit - used)
+        return float(-used)
+
+    def notify_state_change(self) -> None:
+        """通知可用性索引：冷却/禁用/每日计数等状态已变化"""
+        if self.state_listener is not None:
+            self.state_listener(self.config.account_id)
 
     def handle_non_http_error(self, error_context: str = "", request_id: str = "", quota_type: Optional[str] = None) -> None:
         """
@@ -224,6 +278,7 @@ class AccountManager:
             return
         self._reset_daily_usage_if_needed()
         self.daily_usage[quota_type] += 1
+        self.notify_state_change()
 
     def handle_http_error(self, status_code: int, error_detail: str = "", request_id: str = "", quota_type: Optional[str] = None) -> None:
         """
@@ -256,6 +311,7 @@ class AccountManager:
         if status_code == 403:
             self.config.disabled = True
             self.disabled_reason = "403 Access Restricted"
+            self.notify_state_change()
             logger.error(
                 f"[ACCOUNT] [{self.config.account_id}] {req_tag}"
                 f"⛔ 账户遇到 403 权限错误，已自动禁用"
@@ -266,6 +322,7 @@ class AccountManager:
         # 401认证错误：冷却 text 配额（等效冷却整个账户，但可自动恢复）
         if status_code == 401:
             self.quota_cooldowns["text"] = time.time()
+            self.notify_state_change()
             cooldown_seconds = self.text_rate_limit_cooldown_seconds
             logger.warning(
                 f"[ACCOUNT] [{self.config.account_id}] {req_tag}"
@@ -280,6 +337,7 @@ class AccountManager:
                 quota_type = "text"
 
             self.quota_cooldowns[quota_type] = time.time()
+            self.notify_state_change()
             cooldown_seconds = self._get_quota_cooldown_seconds(quota_type)
             logger.warning(
                 f"[ACCOUNT] [{self.config.account_id}] {req_tag}"
@@ -297,6 +355,24 @@ class AccountManager:
             f"{': ' + error_detail[:100] if error_detail else ''}"
         )
 
+    def get_next_state_change_time(self) -> Optional[float]:
+        """下一次可用性可能自动变化的时间（冷却结束、账户过期、每日配额重置）"""
+        candidates = []
+        for quota_type, cooldown_time in self.quota_cooldowns.items():
+            candidates.append(cooldown_time + self._get_quota_cooldown_seconds(quota_type))
+        expires_ts = self.config.expires_ts
+        if expires_ts is not None and expires_ts > time.time():
+            candidates.append(expires_ts)
+        from core.config import config
+        quota_limits = config.quota_limits
+        if quota_limits.enabled:
+            for quota_type in QUOTA_TYPES:
+                limit = getattr(quota_limits, f"{quota_type}_daily_limit", 0)
+                if limit > 0 and self.daily_usage.get(quota_type, 0) >= limit:
+                    candidates.append(_next_quota_reset_time())
+                    break
+        return min(candidates) if candidates else None
+
     def is_quota_available(self, quota_type: str) -> bool:
         """检查指定配额是否可用（先检查每日上限，再检查冷却）。"""
         if quota_type not in QUOTA_TYPES:
@@ -343,6 +419,17 @@ class AccountManager:
         # 检查其他配额
         return all(self.is_quota_available(qt) for qt in quota_types if qt != "text")
 
+    def is_degraded(self) -> bool:
+        """JWT 刷新卡住或失败退避中（调度时降低优先级）"""
+        return self.jwt_manager is not None and self.jwt_manager.is_degraded()
+
+    def ensure_jwt_manager(self) -> "JWTManager":
+        """获取 JWTManager（延迟初始化，避免循环依赖）"""
+        if self.jwt_manager is None:
+            from core.jwt import JWTManager
+            self.jwt_manager = JWTManager(self.config, self.http_client, self.user_agent)
+        return self.jwt_manager
+
     async def get_jwt(self, request_id: str = "") -> str:
         """获取 JWT token (带错误处理)"""
         # 检查账户是否过期
@@ -352,11 +439,7 @@ class AccountManager:
             raise HTTPException(403, f"Account {self.config.account_id} has expired")
 
         try:
-            if self.jwt_manager is None:
-                # 延迟初始化 JWTManager (避免循环依赖)
-                from core.jwt import JWTManager
-                self.jwt_manager = JWTManager(self.config, self.http_client, self.user_agent)
-            jwt = await self.jwt_manager.get(request_id)
+            jwt = await self.ensure_jwt_manager().get(request_id)
             self.is_available = True
             return jwt
         except Exception as e:
@@ -512,94 +595,206 @@ class AccountManager:
         }
 
 
+class AccountAvailabilityIndex:
+    """
+    账户可用性索引
+
+    按配额类型维护可用账户池（"*" 表示不限配额），选号时不再逐个扫描全部账户：
+    - 池使用 列表 + 位置字典，加入/移除/随机访问均为 O(1)
+    - 冷却结束、账户过期、每日配额重置等"定时变化"记录在最小堆中，到期时才重新评估
+    - 冷却/禁用/计数变化通过事件回调即时更新；选中后再做一次廉价校验兜底
+    """
+
+    ALL = "*"
+
+    def __init__(self):
+        self._pools: Dict[str, List[str]] = {key: [] for key in (self.ALL, *QUOTA_TYPES)}
+        self._positions: Dict[str, Dict[str, int]] = {key: {} for key in self._pools}
+        self._wake_heap: List[tuple] = []
+        self._wake_at: Dict[str, float] = {}
+
+    def _add(self, pool_key: str, account_id: str) -> None:
+        positions = self._positions[pool_key]
+        if account_id in positions:
+            return
+        pool = self._pools[pool_key]
+        positions[account_id] = len(pool)
+        pool.append(account_id)
+
+    def _remove(self, pool_key: str, account_id: str) -> None:
+        positions = self._positions[pool_key]
+        pos = positions.pop(account_id, None)
+        if pos is None:
+            return
+        pool = self._pools[pool_key]
+        last = pool.pop()
+        if last != account_id:
+            pool[pos] = last
+            positions[last] = pos
+
+    def discard(self, account_id: str) -> None:
+        for pool_key in self._pools:
+            self._remove(pool_key, account_id)
+        self._wake_at.pop(account_id, None)
+
+    def clear(self) -> None:
+        for pool_key in self._pools:
+            self._pools[pool_key].clear()
+            self._positions[pool_key].clear()
+        self._wake_heap.clear()
+        self._wake_at.clear()
+
+    def evaluate(self, account: AccountManager) -> None:
+        """重新计算单个账户在各池中的成员关系，并登记下一次唤醒时间"""
+        account_id = account.config.account_id
+        usable = not account.config.disabled and not account.config.is_expired()
+        for pool_key in self._pools:
+            quota_types = None if pool_key == self.ALL else [pool_key]
+            if usable and account.are_quotas_available(quota_types):
+                self._add(pool_key, account_id)
+            else:
+                self._remove(pool_key, account_id)
+
+        wake_at = account.get_next_state_change_time() if not account.config.disabled else None
+        if wake_at is None:
+            self._wake_at.pop(account_id, None)
+        elif self._wake_at.get(account_id) != wake_at:
+            self._wake_at[account_id] = wake_at
+            heapq.heappush(self._wake_heap, (wake_at, account_id))
+
+    def process_due(self, accounts: Dict[str, AccountManager], now: Optional[float] = None) -> int:
+        """重新评估唤醒时间已到的账户，返回处理数量"""
+        now = time.time() if now is None else now
+        heap = self._wake_heap
+        processed = 0
+        while heap and heap[0][0] <= now:
+            wake_at, account_id = heapq.heappop(heap)
+            if self._wake_at.get(account_id) != wake_at:
+                continue  # 过期的堆条目
+            del self._wake_at[account_id]
+            account = accounts.get(account_id)
+            if account is not None:
+                self.evaluate(account)
+                processed += 1
+        return processed
+
+    def pool_for(self, quota_types: Optional[Iterable[str]]) -> List[str]:
+        """返回满足配额需求的候选池（多种配额时取最小的池，候选需再校验）"""
+        if not quota_types:
+            return self._pools[self.ALL]
+        if isinstance(quota_types, str):
+            quota_types = [quota_types]
+        keys = [qt for qt in quota_types if qt in self._pools] or ["text"]
+        return min((self._pools[key] for key in keys), key=len)
+
+    def is_exact(self, quota_types: Optional[Iterable[str]]) -> bool:
+        """候选池是否与配额需求完全对应（无需额外过滤）"""
+        if not quota_types:
+            return True
+        if isinstance(quota_types, str):
+            return True
+        return len({qt for qt in quota_types if qt != "text"}) <= 1
+
+    def get_metrics(self) -> dict:
+        return {
+            "pools": {key: len(pool) for key, pool in self._pools.items()},
+            "scheduled_wakeups": len(self._wake_at),
+            "heap_size": len(self._wake_heap),
+        }
+
+
+def _remove_waiter(waiters: deque, waiter: "_SlotWaiter") -> None:
+    try:
+        waiters.remove(waiter)
+    except ValueError:
+        pass
+
+
+class _SlotWaiter:
+    """准入队列中的等待者
+
+    每释放一个槽位只唤醒一个等待者；被唤醒但拿不到槽位（例如等待的是其他账户）时
+    保留在队列中的位置，把这次唤醒传给后面的等待者。
+    """
+
+    __slots__ = ("future",)
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.future = loop.create_future()
+
+    @property
+    def notified(self) -> bool:
+        return self.future.done() and not self.future.cancelled()
+
+    def notify(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+    def rearm(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.future = loop.create_future()
+
+
 class MultiAccountManager:
     """多账户协调器"""
     def __init__(self, session_cache_ttl_seconds: int):
         self.accounts: Dict[str, AccountManager] = {}
         self.account_list: List[str] = []  # 账户ID列表 (用于轮询)
         self.current_index = 0
-        self._cache_lock = asyncio.Lock()  # 缓存操作专用锁
-        self._counter_lock = threading.Lock()  # 轮询计数器锁
-        self._request_counter = 0  # 请求计数器
-        self._last_account_count = 0  # 可用账户数量
-        # 全局会话缓存：{conv_key: {"account_id": str, "session_id": str, "updated_at": float}}
-        self.global_session_cache: Dict[str, dict] = {}
-        self.cache_max_size = 1000  # 最大缓存条目数
-        self.cache_ttl = session_cache_ttl_seconds  # 缓存过期时间（秒）
-        # Session级别锁：防止同一对话的并发请求冲突
-        self._session_locks: Dict[str, asyncio.Lock] = {}
-        self._session_locks_lock = asyncio.Lock()  # 保护锁字典的锁
-        self._session_locks_max_size = 2000  # 最大锁数量
-
-    def _clean_expired_cache(self):
-        """清理过期的缓存条目"""
-        current_time = time.time()
-        expired_keys = [
-            key for key, value in self.global_session_cache.items()
-            if current_time - value["updated_at"] > self.cache_ttl
-        ]
-        for key in expired_keys:
-            del self.global_session_cache[key]
-        if expired_keys:
-            logger.info(f"[CACHE] 清理 {len(expired_keys)} 个过期会话缓存")
-
-    def _ensure_cache_size(self):
-        """确保缓存不超过最大大小（LRU策略）"""
-        if len(self.global_session_cache) > self.cache_max_size:
-            # 按更新时间排序，删除最旧的20%
-            sorted_items = sorted(
-                self.global_session_cache.items(),
-                key=lambda x: x[1]["updated_at"]
-            )
-            remove_count = len(sorted_items) - int(self.cache_max_size * 0.8)
-            for key, _ in sorted_items[:remove_count]:
-                del self.global_session_cache[key]
-            logger.info(f"[CACHE] LRU清理 {remove_count} 个最旧会话缓存")
+        # 账户调度策略（轮询 / 最少进行中 / 剩余配额最多 / 延迟加权）
+        from core.config import config
+        self.scheduler: SchedulingPolicy = create_policy(config.performance.account_scheduler)
+        # 并发限制：每账户最大并发请求数（0 表示不限制），槽位不足时排队等待
+        self.max_streams_per_account = config.performance.max_concurrent_streams_per_account
+        self.admission_timeout_seconds = config.performance.account_admission_timeout_seconds
+        self._slot_waiters: deque = deque()  # 等待槽位的请求（_SlotWaiter，FIFO）
+        # 重载账户配置后指向新的管理器（排队中的请求和槽位释放转交给它）
+        self._successor: Optional["MultiAccountManager"] = None
+        # 统计数据变更回调（由 main 设置为 stats_aggregator.mark_dirty，重载时转交给新管理器）
+        self.stats_listener: Optional[Callable[[], None]] = None
+        self._admission_waits = 0
+        self._admission_timeouts = 0
+        self._admission_wait_total_ms = 0.0
+        self._admission_wait_max_ms = 0.0
+        # 对话 -> Session 绑定缓存（启用数据库时持久化，跨重启/多 worker 共享）
+        self.session_cache: SessionCacheBackend = create_session_cache(
+            session_cache_ttl_seconds, config.performance.session_cache_max_entries
+        )
+        # 可用账户索引（按配额类型分池）
+        self.availability = AccountAvailabilityIndex()
 
     async def start_background_cleanup(self):
         """启动后台缓存清理任务（每5分钟执行一次）"""
         try:
             while True:
                 await asyncio.sleep(300)  # 5分钟
-                async with self._cache_lock:
-                    self._clean_expired_cache()
-                    self._ensure_cache_size()
+                try:
+                    await self.session_cache.cleanup()
+                except Exception as e:
+                    logger.error(f"[CACHE] 会话缓存清理失败: {e}")
         except asyncio.CancelledError:
             logger.info("[CACHE] 后台清理任务已停止")
         except Exception as e:
             logger.error(f"[CACHE] 后台清理任务异常: {e}")
 
+    async def get_session_cache(self, conv_key: str) -> Optional[dict]:
+        """查询对话绑定的账户和 Session（过期或不存在时返回 None）"""
+        return await self.session_cache.get(conv_key)
+
     async def set_session_cache(self, conv_key: str, account_id: str, session_id: str):
-        """线程安全地设置会话缓存"""
-        async with self._cache_lock:
-            self.global_session_cache[conv_key] = {
-                "account_id": account_id,
-                "session_id": session_id,
-                "updated_at": time.time()
-            }
-            # 检查缓存大小
-            self._ensure_cache_size()
+        """设置会话缓存"""
+        await self.session_cache.set(conv_key, account_id, session_id)
 
     async def update_session_time(self, conv_key: str):
-        """线程安全地更新会话时间戳"""
-        async with self._cache_lock:
-            if conv_key in self.global_session_cache:
-                self.global_session_cache[conv_key]["updated_at"] = time.time()
+        """更新会话时间戳"""
+        await self.session_cache.touch(conv_key)
+
+    async def delete_session_cache(self, conv_key: str):
+        """删除会话缓存（绑定的账户失效时）"""
+        await self.session_cache.delete(conv_key)
 
     async def acquire_session_lock(self, conv_key: str) -> asyncio.Lock:
-        """获取指定对话的锁（用于防止同一对话的并发请求冲突）"""
-        async with self._session_locks_lock:
-            # 清理过多的锁（LRU策略：删除不在缓存中的锁）
-            if len(self._session_locks) > self._session_locks_max_size:
-                # 只保留当前缓存中存在的锁
-                valid_keys = set(self.global_session_cache.keys())
-                keys_to_remove = [k for k in self._session_locks if k not in valid_keys]
-                for k in keys_to_remove[:len(keys_to_remove)//2]:  # 删除一半无效锁
-                    del self._session_locks[k]
-
-            if conv_key not in self._session_locks:
-                self._session_locks[conv_key] = asyncio.Lock()
-            return self._session_locks[conv_key]
+        """获取指定对话的锁（用于防止同一对话的并发请求冲突，随缓存条目回收）"""
+        return self.session_cache.lock_for(conv_key)
 
     def update_http_client(self, http_client):
         """更新所有账户使用的 http_client（用于代理变更后重建客户端）"""
@@ -623,10 +818,49 @@ class MultiAccountManager:
             manager.conversation_count = global_stats["account_conversations"].get(config.account_id, 0)
         if "account_failures" in global_stats:
             manager.failure_count = global_stats["account_failures"].get(config.account_id, 0)
+        manager.state_listener = self.refresh_account_availability
         self.accounts[config.account_id] = manager
         self.account_list.append(config.account_id)
+        self.availability.evaluate(manager)
         logger.debug(f"[MULTI] [ACCOUNT] 添加账户: {config.account_id}")
 
+    def refresh_account_availability(self, account_id: str) -> None:
+        """账户状态变化后更新可用性索引"""
+        account = self.accounts.get(account_id)
+        if account is None:
+            self.availability.discard(account_id)
+            return
+        self.availability.evaluate(account)
+        if self._slot_waiters:
+            self._notify_next_waiter()
+
+    def set_scheduler(self, name: str) -> None:
+        """切换调度策略（策略未变化时保留现有状态）"""
+        if self.scheduler.name != name:
+            self.scheduler = create_policy(name)
+            logger.info(f"[MULTI] [ACCOUNT] 调度策略已切换: {self.scheduler.name}")
+
+    def rebuild_availability_index(self) -> None:
+        """全量重建可用性索引（加载账户、修改配额/冷却配置后调用）"""
+        self.availability.clear()
+        for account in self.accounts.values():
+            self.availability.evaluate(account)
+        metrics = self.availability.get_metrics()
+        logger.debug(f"[MULTI] [ACCOUNT] 可用性索引已重建: {metrics['pools']}")
+
+    def _candidate_ids(self, required_quota_types: Optional[Iterable[str]]) -> tuple:
+        """返回 (候选账户ID列表, 是否需逐个校验)"""
+        self.availability.process_due(self.accounts)
+        pool = self.availability.pool_for(required_quota_types)
+        return pool, not self.availability.is_exact(required_quota_types)
+
+    def _is_selectable(self, account: AccountManager, required_quota_types: Optional[Iterable[str]]) -> bool:
+        return (
+            not account.config.disabled
+            and not account.config.is_expired()
+            and account.are_quotas_available(required_quota_types)
+        )
+
     def get_available_accounts(
         self,
         required_quota_types: Optional[Iterable[str]] = None
@@ -644,24 +878,18 @@ class MultiAccountManager:
             2. is_expired() → 跳过（账户过期）
             3. are_quotas_available() → 跳过（配额冷却中）
         """
-        available = []
-
-        for acc in self.accounts.values():
-            # 1. 检查手动禁用
-            if acc.config.disabled:
-                continue
-
-            # 2. 检查账户过期
-            if acc.config.is_expired():
-                continue
-
-            # 3. 检查配额可用性（包括冷却检查）
-            if not acc.are_quotas_available(required_quota_types):
-                continue
-
-            available.append(acc)
-
-        return available
+        pool, needs_filter = self._candidate_ids(required_quota_types)
+        accounts = [self.accounts[account_id] for account_id in pool]
+        if needs_filter:
+            accounts = [acc for acc in accounts if self._is_selectable(acc, required_quota_types)]
+        return accounts
+
+    def count_available_accounts(self, required_quota_types: Optional[Iterable[str]] = None) -> int:
+        """可用账户数量（单一配额类型时为 O(1)）"""
+        pool, needs_filter = self._candidate_ids(required_quota_types)
+        if not needs_filter:
+            return len(pool)
+        return len(self.get_available_accounts(required_quota_types))
 
     async def get_account(
         self,
@@ -669,7 +897,7 @@ class MultiAccountManager:
         request_id: str = "",
         required_quota_types: Optional[Iterable[str]] = None
     ) -> AccountManager:
-        """获取账户 - Round-Robin轮询
+        """获取账户 - 按调度策略选择（默认 Round-Robin 轮询）
 
         Args:
             account_id: 指定账户ID（可选，如果指定则直接返回该账户）
@@ -685,7 +913,7 @@ class MultiAccountManager:
         """
         req_tag = f"[req_{request_id}] " if request_id else ""
 
-        # 指定账户ID时直接返回
+        # 指定账户ID时直接返回（槽位已满时等待该账户释放）
         if account_id:
             if account_id not in self.accounts:
                 raise HTTPException(404, f"Account {account_id} not found")
@@ -694,29 +922,195 @@ class MultiAccountManager:
                 raise HTTPException(503, f"Account {account_id} temporarily unavailable")
             if not account.are_quotas_available(required_quota_types):
                 raise HTTPException(503, f"Account {account_id} quota temporarily unavailable")
+            if self._slot_waiters or not self._has_free_slot(account):
+                # 槽位已满，或前面已有请求在排队（不插队）
+                # 等待期间账户配置可能被重载，每次唤醒都从当前管理器重新取账户
+                def slot_free() -> bool:
+                    manager = self.current()
+                    current = manager.accounts.get(account_id)
+                    return current is None or manager._has_free_slot(current)
+
+                await self._wait_for_slot(slot_free, request_id)
+                account = self.current().accounts.get(account_id)
+                if account is None:
+                    raise HTTPException(404, f"Account {account_id} not found")
+            account.in_flight += 1
+            account.last_used_at = time.time()
             return account
 
-        # 获取可用账户列表
-        available_accounts = self.get_available_accounts(required_quota_types)
+        result = {}
 
-        if not available_accounts:
-            raise HTTPException(503, "No available accounts")
+        def try_select() -> bool:
+            result["value"] = self.current()._select_account(required_quota_types)
+            return result["value"][0] is not None or result["value"][2] == 0
 
-        # 轮询选择
-        with self._counter_lock:
-            if len(available_accounts) != self._last_account_count:
-                self._request_counter = random.randint(0, 999999)
-                self._last_account_count = len(available_accounts)
-            index = self._request_counter % len(available_accounts)
-            self._request_counter += 1
+        if self._slot_waiters:
+            # 已有请求在排队：新请求排到队尾，不插队
+            await self._wait_for_slot(try_select, request_id)
+            selected, index, pool_size = result["value"]
+        else:
+            selected, index, pool_size = self._select_account(required_quota_types)
+            if selected is None and pool_size > 0:
+                # 有可用账户但并发槽位已满：进入全局准入队列等待
+                await self._wait_for_slot(try_select, request_id)
+                selected, index, pool_size = result["value"]
 
-        selected = available_accounts[index]
+        if selected is None:
+            raise HTTPException(503, "No available accounts")
+
+        selected.in_flight += 1
         selected.session_usage_count += 1
+        selected.last_used_at = time.time()
 
         logger.info(f"[MULTI] [ACCOUNT] {req_tag}选择账户: {selected.config.account_id} "
-                    f"(索引: {index}/{len(available_accounts)}, 使用: {selected.session_usage_count})")
+                    f"(策略: {self.scheduler.name}, 索引: {index}/{pool_size}, "
+                    f"进行中: {selected.in_flight}, 使用: {selected.session_usage_count})")
         return selected
 
+    def get_upcoming_accounts(self, count: int) -> List[AccountManager]:
+        """调度策略接下来可能选中的账户（用于 JWT 预刷新）"""
+        pool = self.availability.pool_for(None)
+        return [self.accounts[pool[index]] for index in self.scheduler.upcoming(pool, count)]
+
+    def _has_free_slot(self, account: AccountManager) -> bool:
+        return self.max_streams_per_account <= 0 or account.in_flight < self.max_streams_per_account
+
+    def _select_account(self, required_quota_types: Optional[Iterable[str]]) -> tuple:
+        """从可用性索引中按调度策略选择，返回 (账户或None, 下标, 候选池大小)
+
+        候选状态已变化时修正索引后重选；策略选中的账户槽位已满或 JWT 刷新降级时，
+        回退为逐个查找，优先有空闲槽位且未降级的账户。
+        """
+        pool, needs_filter = self._candidate_ids(required_quota_types)
+        index = 0
+        attempts = len(pool)
+        fallback = False
+        while pool and attempts > 0:
+            attempts -= 1
+            index = self.scheduler.select(pool, self.accounts, required_quota_types)
+            candidate = self.accounts[pool[index]]
+            if not self._is_selectable(candidate, required_quota_types):
+                if not needs_filter:
+                    # 索引与真实状态不一致（如冷却时间被外部修改），修正后继续
+                    self.availability.evaluate(candidate)
+                continue
+            if self._has_free_slot(candidate) and not candidate.is_degraded():
+                return candidate, index, len(pool)
+            fallback = True
+            break
+
+        if fallback:
+            degraded = None
+            for index, candidate_id in enumerate(pool):
+                candidate = self.accounts[candidate_id]
+                if not self._has_free_slot(candidate) or not self._is_selectable(candidate, required_quota_types):
+                    continue
+                if not candidate.is_degraded():
+                    return candidate, index, len(pool)
+                if degraded is None:
+                    degraded = (candidate, index)
+            if degraded is not None:
+                # 只剩降级账户时仍然使用（刷新失败会快速返回错误，由调用方切换账户）
+                return degraded[0], degraded[1], len(pool)
+        return None, index, len(pool)
+
+    async def _wait_for_slot(self, ready: Callable[[], bool], request_id: str = "") -> None:
+        """在全局准入队列中按 FIFO 等待，直到 ready() 为真；超时抛出 503"""
+        req_tag = f"[req_{request_id}] " if request_id else ""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        deadline = start + self.admission_timeout_seconds
+        self._admission_waits += 1
+        # 排到当前管理器的队列上（配置重载后由新管理器的 release_account 唤醒）
+        manager = self.current()
+        waiter = _SlotWaiter(loop)
+        manager._slot_waiters.append(waiter)
+        logger.info(f"[MULTI] [ACCOUNT] {req_tag}账户并发已满，进入等待队列 (排队: {len(manager._slot_waiters)})")
+        acquired = False
+        try:
+            if len(manager._slot_waiters) > 1 and ready():
+                # 排在别人后面但当前就有空闲槽位：从队首开始依次让前面的请求先尝试
+                manager._notify_next_waiter()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._admission_timeouts += 1
+                    logger.warning(f"[MULTI] [ACCOUNT] {req_tag}等待账户槽位超时 ({self.admission_timeout_seconds}秒)")
+                    raise HTTPException(503, "All accounts are busy, please retry later")
+                # asyncio.wait 不会取消 future，也不会在唤醒与取消同时发生时吞掉取消
+                await asyncio.wait((waiter.future,), timeout=remaining)
+                if not waiter.notified:
+                    continue
+                current = self.current()
+                if current is not manager:
+                    # 配置已重载：转到新管理器的队列
+                    _remove_waiter(manager._slot_waiters, waiter)
+                    manager = current
+                    manager._slot_waiters.append(waiter)
+                if ready():
+                    acquired = True
+                    return
+                # 这次释放的槽位用不上：保留位置，把唤醒传给后面的等待者
+                manager._notify_next_waiter(after=waiter)
+                waiter.rearm(loop)
+        finally:
+            _remove_waiter(manager._slot_waiters, waiter)
+            if not acquired and waiter.notified:
+                # 被唤醒后因超时/取消退出，唤醒不能丢
+                manager._notify_next_waiter()
+            waited_ms = (time.monotonic() - start) * 1000
+            self._admission_wait_total_ms += waited_ms
+            self._admission_wait_max_ms = max(self._admission_wait_max_ms, waited_ms)
+
+    def _notify_next_waiter(self, after: Optional[_SlotWaiter] = None) -> None:
+        """按入队顺序唤醒一个尚未被唤醒的等待者（after 不为空时只考虑排在它后面的）"""
+        skipping = after is not None
+        for waiter in self._slot_waiters:
+            if skipping:
+                skipping = waiter is not after
+                continue
+            if not waiter.future.done():
+                waiter.notify()
+                return
+
+    def _wake_slot_waiters(self) -> None:
+        """唤醒全部排队中的请求（配置重载时使用，由它们转到新管理器的队列）"""
+        for waiter in list(self._slot_waiters):
+            waiter.notify()
+
+    def current(self) -> "MultiAccountManager":
+        """配置重载后的最新管理器（未重载时返回自身）"""
+        manager = self
+        while manager._successor is not None:
+            manager = manager._successor
+        return manager
+
+    def release_account(self, account: AccountManager) -> None:
+        """请求结束，释放账户并发槽位
+
+        按账户ID在当前管理器上释放：配置重载时进行中的计数已复制到新的 AccountManager，
+        请求持有的旧对象不再参与调度。
+        """
+        manager = self.current()
+        target = manager.accounts.get(account.config.account_id, account)
+        if target.in_flight > 0:
+            target.in_flight -= 1
+        if target is not account and account.in_flight > 0:
+            account.in_flight -= 1
+        manager._notify_next_waiter()
+
+    def get_admission_metrics(self) -> dict:
+        return {
+            "max_streams_per_account": self.max_streams_per_account,
+            "timeout_seconds": self.admission_timeout_seconds,
+            "queue_depth": len(self._slot_waiters),
+            "in_flight": sum(acc.in_flight for acc in self.accounts.values()),
+            "waits": self._admission_waits,
+            "timeouts": self._admission_timeouts,
+            "avg_wait_ms": round(self._admission_wait_total_ms / self._admission_waits, 2) if self._admission_waits else 0.0,
+            "max_wait_ms": round(self._admission_wait_max_ms, 2),
+        }
+
 
 # ---------- 配置管理 ----------
 
@@ -835,6 +1229,8 @@ def load_multi_account_config(
         if is_expired:
             manager.accounts[config.account_id].is_available = False
 
+    manager.rebuild_availability_index()
+
     if not manager.accounts:
         logger.warning(f"[CONFIG] 没有有效的账户配置，服务将启动但无法处理请求，请在管理面板添加账户")
     else:
@@ -842,6 +1238,18 @@ def load_multi_account_config(
     return manager
 
 
+def prune_account_latency(global_stats: dict, account_ids) -> int:
+    """移除已不存在账户的延迟直方图，返回移除数量"""
+    latency = global_stats.get("account_latency") if global_stats else None
+    if latency is None:
+        return 0
+    keep = set(account_ids)
+    stale = [key for key in latency.keys() if key not in keep]
+    for key in stale:
+        latency.discard(key)
+    return len(stale)
+
+
 def reload_accounts(
     multi_account_mgr: MultiAccountManager,
     http_client,
@@ -860,13 +1268,15 @@ def reload_accounts(
             "is_available": account_mgr.is_available,
             "last_error_time": account_mgr.last_error_time,
             "session_usage_count": account_mgr.session_usage_count,
+            "in_flight": account_mgr.in_flight,
+            "ttfb_ewma_ms": account_mgr.ttfb_ewma_ms,
+            "last_used_at": account_mgr.last_used_at,
             "quota_cooldowns": dict(account_mgr.quota_cooldowns),
             "daily_usage": dict(account_mgr.daily_usage),
             "daily_usage_date": account_mgr.daily_usage_date,
         }
 
-    # Clear session cache and reload config.
-    multi_account_mgr.global_session_cache.clear()
+    # Reload config; the session cache is kept (bindings to removed accounts are dropped on lookup).
     new_mgr = load_multi_account_config(
         http_client,
         user_agent,
@@ -883,6 +1293,9 @@ def reload_accounts(
             account_mgr.failure_count = stats.get("failure_count", 0)
             account_mgr.last_error_time = stats.get("last_error_time", 0.0)
             account_mgr.session_usage_count = stats.get("session_usage_count", 0)
+            account_mgr.in_flight = stats.get("in_flight", 0)
+            account_mgr.ttfb_ewma_ms = stats.get("ttfb_ewma_ms")
+            account_mgr.last_used_at = stats.get("last_used_at", 0.0)
             account_mgr.daily_usage = stats.get("daily_usage", {"text": 0, "images": 0, "videos": 0})
             account_mgr.daily_usage_date = stats.get("daily_usage_date", "")
 
@@ -906,6 +1319,14 @@ def reload_accounts(
 
             logger.debug(f"[CONFIG] Account {account_id} refreshed; runtime state preserved")
 
+    new_mgr.session_cache = multi_account_mgr.session_cache
+    new_mgr.stats_listener = multi_account_mgr.stats_listener
+    new_mgr.rebuild_availability_index()
+    if prune_account_latency(global_stats, new_mgr.accounts.keys()) and new_mgr.stats_listener is not None:
+        new_mgr.stats_listener()  # 移除结果需要落盘，否则重启后会从持久化数据恢复
+    # 旧管理器上排队的请求转到新管理器：立即唤醒，重试时从新管理器选择并在其队列上等待
+    multi_account_mgr._successor = new_mgr
+    multi_account_mgr._wake_slot_waiters()
     logger.info(
         f"[CONFIG] Reloaded config; accounts={len(new_mgr.accounts)}; cooldown/error state preserved"
     )
@@ -989,12 +1410,14 @@ def update_account_disabled_status(
             raise ValueError(f"账户 {account_id} 不存在")
         if account_id in multi_account_mgr.accounts:
             multi_account_mgr.accounts[account_id].config.disabled = disabled
+            multi_account_mgr.refresh_account_availability(account_id)
         return multi_account_mgr
 
     if account_id not in multi_account_mgr.accounts:
         raise ValueError(f"账户 {account_id} 不存在")
     account_mgr = multi_account_mgr.accounts[account_id]
     account_mgr.config.disabled = disabled
+    multi_account_mgr.refresh_account_availability(account_id)
 
     accounts_data = load_accounts_from_source()
     for i, acc in enumerate(accounts_data, 1):
@@ -1020,6 +1443,7 @@ def bulk_update_account_disabled_status(
         for account_id in account_ids:
             if account_id in multi_account_mgr.accounts:
                 multi_account_mgr.accounts[account_id].config.disabled = disabled
+                multi_account_mgr.refresh_account_availability(account_id)
         errors = [f"{account_id}: 账户不存在" for account_id in missing]
         status_text = "已禁用" if disabled else "已启用"
         logger.info(f"[CONFIG] 批量{status_text} {updated}/{len(account_ids)} 个账户")
@@ -1034,6 +1458,7 @@ def bulk_update_account_disabled_status(
             continue
         account_mgr = multi_account_mgr.accounts[account_id]
         account_mgr.config.disabled = disabled
+        multi_account_mgr.refresh_account_availability(account_id)
         success_count += 1
 
     accounts_data = load_accounts_from_source()
@@ -86,6 +86,7 @@ class BasicConfig(BaseModel):
     register_default_count: int = Field(default=1, ge=1, description="默认注册数量")
     register_domain: str = Field(default="", description="DuckMail 域名（推荐）")
     image_expire_hours: int = Field(default=12, ge=-1, le=720, description="图片/视频过期时间（小时），-1为永不删除")
+    media_max_disk_gb: float = Field(default=0, ge=0, le=10240, description="图片/视频总空间上限（GB），超出后从最旧的文件开始删除，0为不限制")
 
 
 class ImageGenerationConfig(BaseModel):
@@ -275,6 +276,33 @@ class AutomationSelectorsConfig(BaseModel):
     ], description="发送失败关键词")
 
 
+class PerformanceConfig(BaseModel):
+    """性能配置"""
+    stats_flush_interval_seconds: int = Field(default=5, ge=1, le=300, description="统计数据落盘间隔（秒）")
+    request_log_flush_interval_ms: int = Field(default=500, ge=50, le=60000, description="请求日志批量写入间隔（毫秒）")
+    request_log_batch_size: int = Field(default=200, ge=1, le=5000, description="请求日志单批最大条数")
+    max_concurrent_streams_per_account: int = Field(default=0, ge=0, le=100, description="每账户最大并发请求数（0 表示不限制）")
+    account_admission_timeout_seconds: int = Field(default=30, ge=1, le=600, description="账户槽位已满时的最长排队时间（秒）")
+    session_pool_size: int = Field(default=0, ge=0, le=10, description="每个活跃账户预创建的 Session 数（0 表示关闭）")
+    session_pool_ttl_seconds: int = Field(default=900, ge=60, le=3600, description="预创建 Session 的有效期（秒）")
+    session_cache_max_entries: int = Field(default=10000, ge=100, le=1000000, description="对话 Session 缓存最大条目数")
+    context_replay_max_chars: int = Field(default=0, ge=0, le=10000000, description="重放历史上下文的最大字符数（0 表示不限制）")
+    context_replay_keep_last_messages: int = Field(default=10, ge=1, le=200, description="压缩重放上下文时完整保留的最近消息数")
+    upload_concurrency: int = Field(default=4, ge=1, le=16, description="单个请求的附件并发上传数")
+    media_workers: int = Field(default=4, ge=1, le=32, description="媒体落盘/编码线程数")
+    account_scheduler: str = Field(
+        default="round_robin",
+        description="账户调度策略：round_robin/least_in_flight/most_remaining_quota/latency_ewma",
+    )
+
+    @validator("account_scheduler")
+    def validate_account_scheduler(cls, v):
+        allowed = ["round_robin", "least_in_flight", "most_remaining_quota", "latency_ewma"]
+        if v not in allowed:
+            raise ValueError(f"account_scheduler 必须是 {allowed} 之一")
+        return v
+
+
 class SecurityConfig(BaseModel):
     """安全配置（仅从环境变量读取，不可热更新）"""
     admin_key: str = Field(default="", description="管理员密钥（必需）")
@@ -295,6 +323,7 @@ class AppConfig(BaseModel):
     public_display: PublicDisplayConfig
     session: SessionConfig
     automation_selectors: AutomationSelectorsConfig = Field(default_factory=AutomationSelectorsConfig)
+    performance: PerformanceConfig = Field(default_factory=PerformanceConfig)
 
 
 # ==================== 配置管理器 ====================
@@ -393,6 +422,7 @@ class ConfigManager:
             register_default_count=int(register_default_raw),
             register_domain=str(register_domain_raw or "").strip(),
             image_expire_hours=int(basic_data.get("image_expire_hours", 12)),
+            media_max_disk_gb=float(basic_data.get("media_max_disk_gb") or 0),
         )
 
         # 4. 加载其他配置（从数据库，带容错处理）
@@ -451,6 +481,14 @@ class ConfigManager:
             print(f"[WARN] 自动化选择器配置加载失败，使用默认值: {e}")
             automation_selectors_config = AutomationSelectorsConfig()
 
+        try:
+            performance_config = PerformanceConfig(
+                **yaml_data.get("performance", {})
+            )
+        except Exception as e:
+            print(f"[WARN] 性能配置加载失败，使用默认值: {e}")
+            performance_config = PerformanceConfig()
+
         # 5. 构建完整配置
         self._config = AppConfig(
             security=security_config,
@@ -462,6 +500,7 @@ class ConfigManager:
             public_display=public_display_config,
             session=session_config,
             automation_selectors=automation_selectors_config,
+            performance=performance_config,
         )
 
     def _load_yaml(self) -> dict:
@@ -531,6 +570,9 @@ class ConfigManager:
             automation_selectors_config = AutomationSelectorsConfig(
                 **data.get("automation_selectors", {})
             )
+            performance_config = PerformanceConfig(
+                **data.get("performance", {})
+            )
 
             # 验证通过，构建完整配置
             test_config = AppConfig(
@@ -543,6 +585,7 @@ class ConfigManager:
                 public_display=public_display_config,
                 session=session_config,
                 automation_selectors=automation_selectors_config,
+                performance=performance_config,
             )
         except Exception as e:
             # 验证失败，不保存到数据库
@@ -717,4 +760,8 @@ class _ConfigProxy:
     def automation_selectors(self):
         return config_manager.config.automation_selectors
 
+    @property
+    def performance(self):
+        return config_manager.config.performance
+
 config = _ConfigProxy()
@@ -1,190 +1,311 @@
 """
-统计数据库操作 - 使用 storage.py 的统一数据库连接
+统计数据库操作 - 使用 storage.py 的统一数据库连接（SQLite / PostgreSQL）
 """
 import time
+import logging
 from datetime import datetime
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 import asyncio
-from collections import defaultdict
-from core.storage import _get_sqlite_conn, _sqlite_lock
+from collections import defaultdict, deque
+from core import storage
+from core.histogram import bucket_index, percentiles_from_buckets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL_MS = 500
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_MAX_QUEUE = 10000
+
+# 看板时间范围 -> (汇总粒度, 桶大小秒, 桶数量)
+TIME_RANGES = {
+    "24h": ("hour", 3600, 24),
+    "7d": ("hour", 6 * 3600, 28),
+    "30d": ("day", 24 * 3600, 30),
+}
+_GRANULARITY_SECONDS = {"hour": 3600, "day": 24 * 3600}
+
+
+def _local_utc_offset() -> int:
+    """本地时区相对 UTC 的偏移（秒），用于让小时/天桶对齐本地时间"""
+    offset = datetime.now().astimezone().utcoffset()
+    return int(offset.total_seconds()) if offset else 0
+
+
+def _align(ts: int, size: int, utc_offset: int) -> int:
+    return ts - ((ts + utc_offset) % size)
+
+
+def build_rollup_deltas(rows: List[tuple], utc_offset: Optional[int] = None) -> dict:
+    """把一批请求日志聚合为小时/天汇总增量和延迟直方图增量
+
+    rows: [(timestamp, model, ttfb_ms, total_ms, status, status_code), ...]
+    返回 {"hour": [...], "day": [...], "hist": [...]}，供 storage 以累加方式 upsert。
+    """
+    if utc_offset is None:
+        utc_offset = _local_utc_offset()
+    result = {}
+    hist = defaultdict(int)
+    for granularity, size in _GRANULARITY_SECONDS.items():
+        sums = defaultdict(lambda: [0, 0, 0, 0, 0, 0, 0])
+        for ts, model, ttfb, total, status, status_code in rows:
+            bucket_start = _align(int(ts), size, utc_offset)
+            entry = sums[(bucket_start, model)]
+            entry[0] += 1
+            if status != "success":
+                entry[1] += 1
+                if status_code == 429:
+                    entry[2] += 1
+            elif ttfb is not None and total is not None:
+                entry[3] += ttfb
+                entry[4] += 1
+                entry[5] += total
+                entry[6] += 1
+                hist[(granularity, bucket_start, model, "ttfb", bucket_index(ttfb))] += 1
+                hist[(granularity, bucket_start, model, "total", bucket_index(total))] += 1
+        result[granularity] = [(bucket_start, model, *values) for (bucket_start, model), values in sums.items()]
+    result["hist"] = [(*key, count) for key, count in hist.items()]
+    return result
+
+
+class RequestLogWriter:
+    """请求日志批量写入器：内存队列 + 单个后台刷新任务
+
+    请求路径只做 O(1) 入队；后台任务每 flush_interval_ms 或队列达到 batch_size 时
+    用 executemany 批量写入。队列有上限，满时丢弃新记录并计数（背压指标）。
+    """
+
+    def __init__(
+        self,
+        flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ):
+        self.flush_interval_ms = flush_interval_ms
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self._queue: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+        # 指标
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._batches = 0
+        self._flush_failures = 0
+        self._max_queue_depth = 0
+        self._last_batch_size = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def enqueue(self, row: tuple) -> bool:
+        """入队一条日志（非阻塞），队列已满时丢弃并返回 False"""
+        if len(self._queue) >= self.max_queue:
+            self._dropped += 1
+            return False
+        self._queue.append(row)
+        self._enqueued += 1
+        depth = len(self._queue)
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+        if depth >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    @staticmethod
+    def _insert_batch(batch: list) -> bool:
+        """写入原始日志并在同一事务内累加汇总表（在工作线程中执行）"""
+        return storage.insert_request_logs_sync(batch, build_rollup_deltas(batch))
+
+    async def _write_batch(self, batch: list) -> bool:
+        start = time.perf_counter()
+        try:
+            ok = await asyncio.to_thread(self._insert_batch, batch)
+        except Exception as e:
+            logger.error(f"[DATABASE] 请求日志批量写入异常: {str(e)[:100]}")
+            ok = False
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if not ok:
+            self._flush_failures += 1
+            return False
+        self._written += len(batch)
+        self._batches += 1
+        self._last_batch_size = len(batch)
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+        return True
+
+    async def flush(self) -> int:
+        """写出队列中的全部记录，返回写入条数"""
+        written = 0
+        while self._queue:
+            count = min(self.batch_size, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(count)]
+            if not await self._write_batch(batch):
+                # 写入失败：放回队首（超出上限的部分计为丢弃），等待下次重试
+                room = max(0, self.max_queue - len(self._queue))
+                requeue = batch[:room]
+                self._dropped += len(batch) - len(requeue)
+                self._queue.extendleft(reversed(requeue))
+                break
+            written += count
+        return written
+
+    async def run(self) -> None:
+        """后台刷新循环"""
+        self._wakeup = asyncio.Event()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(self.flush_interval_ms, 10) / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[DATABASE] 请求日志刷新异常: {type(e).__name__}: {str(e)[:100]}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """停止后台任务并写出剩余记录"""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def get_metrics(self) -> dict:
+        return {
+            "flush_interval_ms": self.flush_interval_ms,
+            "batch_size": self.batch_size,
+            "max_queue": self.max_queue,
+            "queue_depth": len(self._queue),
+            "max_queue_depth": self._max_queue_depth,
+            "enqueued": self._enqueued,
+            "written": self._written,
+            "dropped": self._dropped,
+            "batches": self._batches,
+            "flush_failures": self._flush_failures,
+            "last_batch_size": self._last_batch_size,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self._batches, 2) if self._batches else 0.0,
+        }
 
 
 class StatsDatabase:
-    """统计数据库管理类 - 使用统一的 data.db"""
+    """统计数据库管理类 - 使用统一的 data.db / PostgreSQL"""
+
+    def __init__(self):
+        self.log_writer = RequestLogWriter()
 
-    async def insert_request_log(
+    def record_request_log(
         self, timestamp: float, model: str, ttfb_ms: int = None,
         total_ms: int = None, status: str = "success", status_code: int = None
-    ):
-        """插入请求记录"""
-        def _insert():
-            conn = _get_sqlite_conn()
-            with _sqlite_lock:
-                conn.execute(
-                    """
-                    INSERT INTO request_logs
-                    (timestamp, model, ttfb_ms, total_ms, status, status_code)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (int(timestamp), model, ttfb_ms, total_ms, status, status_code)
-                )
-                conn.commit()
-
-        await asyncio.to_thread(_insert)
+    ) -> bool:
+        """记录请求日志（入队，由后台任务批量写入）"""
+        return self.log_writer.enqueue(
+            (int(timestamp), model, ttfb_ms, total_ms, status, status_code)
+        )
 
     async def get_stats_by_time_range(self, time_range: str = "24h") -> Dict:
-        """按时间范围获取统计数据"""
+        """按时间范围获取统计数据（读取小时/天汇总表）"""
         def _query():
-            now = time.time()
-            if time_range == "24h":
-                start_time = now - 24 * 3600
-                bucket_size = 3600
-            elif time_range == "7d":
-                start_time = now - 7 * 24 * 3600
-                bucket_size = 6 * 3600
-            elif time_range == "30d":
-                start_time = now - 30 * 24 * 3600
-                bucket_size = 24 * 3600
-            else:
-                start_time = now - 24 * 3600
-                bucket_size = 3600
-
-            conn = _get_sqlite_conn()
-            with _sqlite_lock:
-                rows = conn.execute(
-                    """
-                    SELECT timestamp, model, ttfb_ms, total_ms, status, status_code
-                    FROM request_logs
-                    WHERE timestamp >= ?
-                    ORDER BY timestamp
-                    """,
-                    (int(start_time),)
-                ).fetchall()
-
-            # 数据分桶
-            buckets = defaultdict(lambda: {
-                "total": 0, "failed": 0, "rate_limited": 0,
-                "models": defaultdict(int),
-                "model_ttfb": defaultdict(list),
-                "model_total": defaultdict(list)
-            })
-
-            for row in rows:
-                ts, model, ttfb, total, status, status_code = row
-                bucket_key = int((ts - start_time) // bucket_size)
-                bucket = buckets[bucket_key]
-
-                bucket["total"] += 1
-                bucket["models"][model] += 1
-
-                if status != "success":
-                    bucket["failed"] += 1
-                    if status_code == 429:
-                        bucket["rate_limited"] += 1
-
-                if status == "success" and ttfb is not None and total is not None:
-                    bucket["model_ttfb"][model].append(ttfb)
-                    bucket["model_total"][model].append(total)
-
-            # 生成结果
-            num_buckets = int((now - start_time) // bucket_size) + 1
+            granularity, bucket_size, num_buckets = TIME_RANGES.get(time_range, TIME_RANGES["24h"])
+            utc_offset = _local_utc_offset()
+            now = int(time.time())
+            start_time = _align(now, bucket_size, utc_offset) - (num_buckets - 1) * bucket_size
+
+            rollups = storage.load_request_rollups_sync(granularity, start_time)
+            histograms = storage.load_request_histograms_sync(granularity, start_time)
+
+            total_requests = [0] * num_buckets
+            failed_requests = [0] * num_buckets
+            rate_limited_requests = [0] * num_buckets
+            # 每个模型每个桶: [请求数, ttfb_sum, ttfb_count, total_sum, total_count]
+            model_buckets = defaultdict(lambda: [[0, 0, 0, 0, 0] for _ in range(num_buckets)])
+
+            for bucket_start, model, total, failed, rate_limited, ttfb_sum, ttfb_count, total_sum, total_count in rollups:
+                index = int((bucket_start - start_time) // bucket_size)
+                if index < 0 or index >= num_buckets:
+                    continue
+                total_requests[index] += total
+                failed_requests[index] += failed
+                rate_limited_requests[index] += rate_limited
+                entry = model_buckets[model][index]
+                entry[0] += total
+                entry[1] += ttfb_sum
+                entry[2] += ttfb_count
+                entry[3] += total_sum
+                entry[4] += total_count
+
             labels = []
-            total_requests = []
-            failed_requests = []
-            rate_limited_requests = []
-
-            # 先收集所有出现过的模型
-            all_models = set()
-            for bucket in buckets.values():
-                all_models.update(bucket["models"].keys())
-                all_models.update(bucket["model_ttfb"].keys())
-                all_models.update(bucket["model_total"].keys())
-
-            # 初始化每个模型的数据列表
-            model_requests = {model: [] for model in all_models}
-            model_ttfb_times = {model: [] for model in all_models}
-            model_total_times = {model: [] for model in all_models}
-
-            # 遍历每个时间桶
             for i in range(num_buckets):
-                bucket_time = start_time + i * bucket_size
-                dt = datetime.fromtimestamp(bucket_time)
-
-                if time_range == "24h":
-                    labels.append(dt.strftime("%H:00"))
-                elif time_range == "7d":
+                dt = datetime.fromtimestamp(start_time + i * bucket_size)
+                if time_range == "7d":
                     labels.append(dt.strftime("%m-%d %H:00"))
-                else:
+                elif time_range == "30d":
                     labels.append(dt.strftime("%m-%d"))
+                else:
+                    labels.append(dt.strftime("%H:00"))
 
-                bucket = buckets[i]
-                total_requests.append(bucket["total"])
-                failed_requests.append(bucket["failed"])
-                rate_limited_requests.append(bucket["rate_limited"])
-
-                # 为每个模型添加数据（存在则添加实际值，不存在则添加0）
-                for model in all_models:
-                    # 请求数
-                    model_requests[model].append(bucket["models"].get(model, 0))
-
-                    # TTFB平均时间
-                    if model in bucket["model_ttfb"] and bucket["model_ttfb"][model]:
-                        avg_ttfb = sum(bucket["model_ttfb"][model]) / len(bucket["model_ttfb"][model])
-                        model_ttfb_times[model].append(avg_ttfb)
-                    else:
-                        model_ttfb_times[model].append(0)
-
-                    # 总响应平均时间
-                    if model in bucket["model_total"] and bucket["model_total"][model]:
-                        avg_total = sum(bucket["model_total"][model]) / len(bucket["model_total"][model])
-                        model_total_times[model].append(avg_total)
-                    else:
-                        model_total_times[model].append(0)
-
-            # 数据已经是按时间顺序（旧→新），不需要反转
-            # ECharts 从左到右渲染，所以最旧的在左边，最新的在右边
+            model_requests = {}
+            model_ttfb_times = {}
+            model_total_times = {}
+            for model, entries in model_buckets.items():
+                model_requests[model] = [entry[0] for entry in entries]
+                model_ttfb_times[model] = [entry[1] / entry[2] if entry[2] else 0 for entry in entries]
+                model_total_times[model] = [entry[3] / entry[4] if entry[4] else 0 for entry in entries]
 
+            # 延迟分位数（整个时间范围内按模型合并直方图）
+            model_hist = defaultdict(lambda: {"ttfb": {}, "total": {}})
+            for model, metric, bucket, count in histograms:
+                if metric in ("ttfb", "total"):
+                    model_hist[model][metric][int(bucket)] = int(count)
+            model_latency_percentiles = {
+                model: {
+                    "ttfb": percentiles_from_buckets(metrics["ttfb"]),
+                    "total": percentiles_from_buckets(metrics["total"]),
+                }
+                for model, metrics in model_hist.items()
+            }
+
+            # 数据按时间顺序（旧→新），ECharts 从左到右渲染
             return {
                 "labels": labels,
                 "total_requests": total_requests,
                 "failed_requests": failed_requests,
                 "rate_limited_requests": rate_limited_requests,
-                "model_requests": dict(model_requests),
-                "model_ttfb_times": dict(model_ttfb_times),
-                "model_total_times": dict(model_total_times)
+                "model_requests": model_requests,
+                "model_ttfb_times": model_ttfb_times,
+                "model_total_times": model_total_times,
+                "model_latency_percentiles": model_latency_percentiles,
             }
 
         return await asyncio.to_thread(_query)
 
     async def get_total_counts(self) -> Tuple[int, int]:
-        """获取总成功和失败次数"""
-        def _query():
-            conn = _get_sqlite_conn()
-            with _sqlite_lock:
-                success = conn.execute(
-                    "SELECT COUNT(*) FROM request_logs WHERE status = 'success'"
-                ).fetchone()[0]
-                failed = conn.execute(
-                    "SELECT COUNT(*) FROM request_logs WHERE status != 'success'"
-                ).fetchone()[0]
-            return success, failed
-
-        return await asyncio.to_thread(_query)
+        """获取总成功和失败次数（读取天汇总表）"""
+        return await asyncio.to_thread(storage.count_request_rollups_sync)
 
     async def cleanup_old_data(self, days: int = 30):
         """清理过期数据 - 默认保留30天"""
-        def _cleanup():
-            cutoff_time = int(time.time() - days * 24 * 3600)
-            conn = _get_sqlite_conn()
-            with _sqlite_lock:
-                cursor = conn.execute(
-                    "DELETE FROM request_logs WHERE timestamp < ?",
-                    (cutoff_time,)
-                )
-                conn.commit()
-                return cursor.rowcount
-
-        return await asyncio.to_thread(_cleanup)
+        cutoff_time = int(time.time() - days * 24 * 3600)
+        return await asyncio.to_thread(storage.delete_request_logs_before_sync, cutoff_time)
 
 
 # 全局实例
@@ -3,6 +3,7 @@
 负责与Google Gemini Business API的所有交互操作
 """
 import asyncio
+import base64
 import json
 import logging
 import os
@@ -10,19 +11,28 @@ import re
 import time
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple, Union
 
 import httpx
 from fastapi import HTTPException
 
+from core.media_executor import media_executor
+from core.media_store import TEMP_FILE_SUFFIX, media_store
+from core.message import is_valid_base64
+
 if TYPE_CHECKING:
     from main import AccountManager
+    from core.message import Attachment
+    from core.upload_cache import UploadCache
 
 logger = logging.getLogger(__name__)
 
 # Google API 基础URL
 GEMINI_API_BASE = "https://biz-discoveryengine.googleapis.com/v1alpha"
 
+# 生成媒体流式下载 / 增量编码的块大小（3 的倍数，保证分块 base64 可直接拼接）
+MEDIA_CHUNK_SIZE = 3 * 64 * 1024
+
 
 
 def get_common_headers(jwt: str, user_agent: str) -> dict:
@@ -142,13 +152,17 @@ async def create_google_session(
 async def upload_context_file(
     session_name: str,
     mime_type: str,
-    base64_content: str,
+    base64_content: Union[str, bytes],
     account_manager: "AccountManager",
     http_client: httpx.AsyncClient,
     user_agent: str,
     request_id: str = ""
 ) -> str:
-    """上传文件到指定 Session，返回 fileId"""
+    """上传文件到指定 Session，返回 fileId
+
+    base64_content 可以是 base64 字节：直接拼接进请求体，避免 json.dumps 再复制/扫描一遍大字符串。
+    字节必须来自 Attachment.base64_bytes()（已校验或由 b64encode 生成），字符串会在拼接前校验。
+    """
     jwt = await account_manager.get_jwt(request_id)
     headers = get_common_headers(jwt, user_agent)
 
@@ -163,14 +177,20 @@ async def upload_context_file(
             "name": session_name,
             "fileName": file_name,
             "mimeType": mime_type,
-            "fileContents": base64_content
         }
     }
+    if isinstance(base64_content, str):
+        base64_content = base64_content.encode("ascii", "replace")
+        if not is_valid_base64(base64_content):
+            raise HTTPException(400, "Invalid base64 file content")
+    # base64 字符无需 JSON 转义：在末尾的 "}}" 前插入 fileContents 字段
+    body_json = json.dumps(body, separators=(",", ":")).encode()
+    payload = b"".join((body_json[:-2], b',"fileContents":"', base64_content, b'"}}'))
 
     r = await http_client.post(
         f"{GEMINI_API_BASE}/locations/global/widgetAddContextFile",
         headers=headers,
-        json=body,
+        content=payload,
         timeout=60.0,
     )
 
@@ -196,6 +216,72 @@ async def upload_context_file(
     return file_id
 
 
+async def upload_context_files(
+    session_name: str,
+    files: List["Attachment"],
+    account_manager: "AccountManager",
+    http_client: httpx.AsyncClient,
+    user_agent: str,
+    request_id: str = "",
+    max_concurrency: int = 4,
+    upload_cache: Optional["UploadCache"] = None,
+) -> List[str]:
+    """并发上传多个文件到指定 Session，按输入顺序返回 fileId
+
+    并发数不超过 max_concurrency；任一文件失败时取消其余上传并抛出该异常。
+    传入 upload_cache 时，同一 Session 内已上传过的相同内容直接复用 fileId。
+    """
+    if not files:
+        return []
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    timings_ms: List[int] = [0] * len(files)
+
+    reused = 0
+
+    async def upload_one(index: int, file: "Attachment") -> str:
+        nonlocal reused
+        if upload_cache is not None:
+            cached_id = upload_cache.get(session_name, file.digest, file.size)
+            if cached_id:
+                reused += 1
+                return cached_id
+        async with semaphore:
+            start = time.perf_counter()
+            file_id = await upload_context_file(
+                session_name, file.mime, file.base64_bytes(), account_manager, http_client, user_agent, request_id
+            )
+            timings_ms[index] = int((time.perf_counter() - start) * 1000)
+        if upload_cache is not None:
+            upload_cache.put(session_name, file.digest, file_id, file.size)
+        return file_id
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(upload_one(index, file)) for index, file in enumerate(files)]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        failed = next((task for task in tasks if task in done and task.exception() is not None), None)
+        if failed is not None:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise failed.exception()
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    total_ms = int((time.perf_counter() - start) * 1000)
+    req_tag = f"[req_{request_id}] " if request_id else ""
+    logger.info(
+        f"[FILE] [{account_manager.config.account_id}] {req_tag}上传 {len(files)} 个文件完成: "
+        f"总耗时 {total_ms}ms，各文件 {'/'.join(str(ms) for ms in timings_ms)}ms（并发 {max(1, max_concurrency)}"
+        f"{f'，复用 {reused} 个' if reused else ''}）"
+    )
+    return [task.result() for task in tasks]
+
+
 async def get_session_file_metadata(
     account_mgr: "AccountManager",
     session_name: str,
@@ -245,17 +331,58 @@ def build_image_download_url(session_name: str, file_id: str) -> str:
     return f"{GEMINI_API_BASE}/{session_name}:downloadFile?fileId={file_id}&alt=media"
 
 
-async def download_image_with_jwt(
+async def _stream_download_to_file(
+    account_mgr: "AccountManager",
+    url: str,
+    http_client: httpx.AsyncClient,
+    user_agent: str,
+    path: str,
+    request_id: str = "",
+) -> int:
+    """流式下载到文件（401 时刷新 JWT 重试一次），返回字节数"""
+    for auth_attempt in range(2):
+        jwt = await account_mgr.get_jwt(request_id)
+        headers = get_common_headers(jwt, user_agent)
+        async with http_client.stream("GET", url, headers=headers, follow_redirects=True) as resp:
+            if resp.status_code == 401 and auth_attempt == 0:
+                continue
+            resp.raise_for_status()
+            size = 0
+            f = await media_executor.run("file", open, path, "wb")
+            try:
+                async for chunk in resp.aiter_bytes(MEDIA_CHUNK_SIZE):
+                    await media_executor.run("write", f.write, chunk)
+                    size += len(chunk)
+            finally:
+                await media_executor.run("file", f.close)
+            return size
+    raise HTTPException(401, "Media download unauthorized")
+
+
+def remove_media_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"[MEDIA] 删除临时文件失败: {path}: {e}")
+
+
+async def download_media_to_file(
     account_mgr: "AccountManager",
     session_name: str,
     file_id: str,
     http_client: httpx.AsyncClient,
     user_agent: str,
+    dest_dir: str,
     request_id: str = "",
     max_retries: int = 3
-) -> bytes:
+) -> Tuple[str, int]:
     """
-    使用JWT认证下载图片（带超时和重试机制）
+    使用JWT认证流式下载生成的图片/视频到临时文件（带超时和重试机制）
+
+    内容按 MEDIA_CHUNK_SIZE 分块写入 dest_dir 下的隐藏临时文件，内存占用与文件大小无关；
+    调用方处理完成后用 finalize_media_file 移入内容寻址存储，或自行删除。
 
     Args:
         account_mgr: 账户管理器
@@ -263,77 +390,97 @@ async def download_image_with_jwt(
         file_id: 文件ID
         http_client: httpx客户端
         user_agent: User-Agent字符串
+        dest_dir: 临时文件所在目录（与最终目录相同，保证重命名是原子的）
         request_id: 请求ID
         max_retries: 最大重试次数（默认3次）
 
     Returns:
-        图片字节数据
+        (临时文件路径, 字节数)
 
     Raises:
         HTTPException: 下载失败
-        asyncio.TimeoutError: 超时
     """
     url = build_image_download_url(session_name, file_id)
-    logger.info(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 开始下载图片: {file_id[:8]}...")
+    temp_path = os.path.join(dest_dir, f".{uuid.uuid4().hex}{TEMP_FILE_SUFFIX}")
+    logger.info(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 开始下载媒体: {file_id[:8]}...")
 
     for attempt in range(max_retries):
         try:
             # 3分钟超时（180秒）- 使用 wait_for 兼容 Python 3.10
-            resp = await asyncio.wait_for(
-                make_request_with_jwt_retry(
-                    account_mgr,
-                    "GET",
-                    url,
-                    http_client,
-                    user_agent,
-                    request_id,
-                    follow_redirects=True
-                ),
+            size = await asyncio.wait_for(
+                _stream_download_to_file(account_mgr, url, http_client, user_agent, temp_path, request_id),
                 timeout=180
             )
-
-            resp.raise_for_status()
-            logger.info(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 图片下载成功: {file_id[:8]}... ({len(resp.content)} bytes)")
-            return resp.content
+            logger.info(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 媒体下载成功: {file_id[:8]}... ({size} bytes)")
+            return temp_path, size
 
         except asyncio.TimeoutError:
-            logger.warning(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 图片下载超时 (尝试 {attempt + 1}/{max_retries}): {file_id[:8]}...")
+            logger.warning(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 媒体下载超时 (尝试 {attempt + 1}/{max_retries}): {file_id[:8]}...")
             if attempt == max_retries - 1:
+                await media_executor.run("remove", remove_media_file, temp_path)
                 raise HTTPException(504, f"Image download timeout after {max_retries} attempts")
             await asyncio.sleep(2 ** attempt)  # 指数退避：2s, 4s, 8s
 
         except httpx.HTTPError as e:
-            logger.warning(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 图片下载失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}")
+            logger.warning(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 媒体下载失败 (尝试 {attempt + 1}/{max_retries}): {type(e).__name__}")
             if attempt == max_retries - 1:
+                await media_executor.run("remove", remove_media_file, temp_path)
                 raise HTTPException(500, f"Image download failed: {str(e)[:100]}")
             await asyncio.sleep(2 ** attempt)  # 指数退避
 
-        except Exception as e:
-            logger.error(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 图片下载异常: {type(e).__name__}: {str(e)[:100]}")
+        except BaseException as e:
+            remove_media_file(temp_path)  # 可能处于取消流程中，直接同步删除
+            if not isinstance(e, asyncio.CancelledError):
+                logger.error(f"[IMAGE] [{account_mgr.config.account_id}] [req_{request_id}] 媒体下载异常: {type(e).__name__}: {str(e)[:100]}")
             raise
 
     # 不应该到达这里
+    await media_executor.run("remove", remove_media_file, temp_path)
     raise HTTPException(500, "Image download failed unexpectedly")
 
 
-def save_image_to_hf(image_data: bytes, chat_id: str, file_id: str, mime_type: str, base_url: str, image_dir: str, url_path: str = "images") -> str:
-    """保存图片到持久化存储,返回完整的公开URL"""
-    ext_map = {
-        "image/png": ".png",
-        "image/jpeg": ".jpg",
-        "image/gif": ".gif",
-        "image/webp": ".webp",
-        "video/mp4": ".mp4",
-        "video/webm": ".webm",
-        "video/quicktime": ".mov"
-    }
-    ext = ext_map.get(mime_type, ".png")
+MEDIA_EXT_MAP = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "video/mp4": ".mp4",
+    "video/webm": ".webm",
+    "video/quicktime": ".mov"
+}
+
+
+def media_filename(chat_id: str, file_id: str, mime_type: str) -> str:
+    return f"{chat_id}_{file_id}{MEDIA_EXT_MAP.get(mime_type, '.png')}"
+
 
-    filename = f"{chat_id}_{file_id}{ext}"
-    save_path = os.path.join(image_dir, filename)
+def save_image_to_hf(image_data: bytes, chat_id: str, file_id: str, mime_type: str, base_url: str, url_path: str = "images") -> str:
+    """保存图片到持久化存储（内容寻址，相同内容只存一份）,返回完整的公开URL（阻塞调用，需在媒体线程池中执行）"""
+    filename = media_filename(chat_id, file_id, mime_type)
+    media_store.put_bytes(image_data, filename, url_path)
+    return f"{base_url}/{url_path}/{filename}"
 
-    # 目录已在启动时创建,无需重复创建
-    with open(save_path, "wb") as f:
-        f.write(image_data)
 
+def finalize_media_file(temp_path: str, chat_id: str, file_id: str, mime_type: str, base_url: str, url_path: str = "images") -> str:
+    """将下载完成的临时文件移入内容寻址存储,返回完整的公开URL（阻塞调用，需在媒体线程池中执行）"""
+    filename = media_filename(chat_id, file_id, mime_type)
+    media_store.put(temp_path, filename, url_path)
     return f"{base_url}/{url_path}/{filename}"
+
+
+def _read_base64_chunk(f, chunk_size: int) -> str:
+    return base64.b64encode(f.read(chunk_size)).decode()
+
+
+async def iter_file_base64(path: str, chunk_size: int = MEDIA_CHUNK_SIZE) -> AsyncIterator[str]:
+    """按块读取文件并增量 base64 编码（在媒体线程池中执行；块大小为 3 的倍数，拼接结果与整体编码一致）"""
+    chunk_size -= chunk_size % 3
+    f = await media_executor.run("file", open, path, "rb")
+    try:
+        while True:
+            b64_chunk = await media_executor.run("encode", _read_base64_chunk, f, chunk_size)
+            if not b64_chunk:
+                break
+            yield b64_chunk
+    finally:
+        await media_executor.run("file", f.close)
@@ -0,0 +1,206 @@
+"""
+对数分桶延迟直方图
+
+桶宽按 2^(1/4) 递增（相邻桶约 19%），覆盖 1ms ~ 数十分钟；
+同一分桶规则用于数据库汇总表和内存统计，两者可以直接合并。
+LatencyHistogram 为固定大小数组（HDR 风格），按模型/账户累计。
+
+KeyedLatencyStats 额外记录上次落盘以来的增量：落盘时把增量合并进已持久化的直方图
+（而不是用本进程的完整视图覆盖），多个 worker 的记录因此可以累加，不会互相覆盖。
+"""
+
+import math
+from array import array
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+# 每翻倍 4 个桶
+BUCKETS_PER_DOUBLING = 4
+_LOG_BASE = math.log(2) / BUCKETS_PER_DOUBLING
+MAX_BUCKET_INDEX = 100  # 2^(100/4) ms ≈ 9.3 小时，更大的值归入最后一个桶
+
+
+def bucket_index(value_ms: float) -> int:
+    """延迟值 -> 桶序号（桶 i 覆盖 (upper(i-1), upper(i)]）"""
+    if value_ms <= 1:
+        return 0
+    index = math.ceil(math.log(value_ms) / _LOG_BASE - 1e-9)
+    return min(index, MAX_BUCKET_INDEX)
+
+
+def bucket_upper_bound(index: int) -> float:
+    """桶序号 -> 桶上界（毫秒）"""
+    return 2 ** (index / BUCKETS_PER_DOUBLING)
+
+
+def percentiles_from_buckets(
+    buckets: Dict[int, int], quantiles: Iterable[float] = (0.5, 0.9, 0.99)
+) -> Dict[str, Optional[float]]:
+    """根据 {桶序号: 计数} 估算分位数（取桶上界），返回 {"p50": ..., "p90": ..., "p99": ...}"""
+    quantiles = tuple(quantiles)
+    result: Dict[str, Optional[float]] = {_quantile_label(q): None for q in quantiles}
+    total = sum(buckets.values())
+    if total <= 0:
+        return result
+
+    ordered: Tuple[Tuple[int, int], ...] = tuple(sorted(buckets.items()))
+    for q in quantiles:
+        target = max(1, math.ceil(q * total))
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen >= target:
+                result[_quantile_label(q)] = round(bucket_upper_bound(index), 1)
+                break
+    return result
+
+
+def _quantile_label(q: float) -> str:
+    return f"p{q * 100:g}"
+
+
+class LatencyHistogram:
+    """固定大小的对数分桶直方图"""
+
+    __slots__ = ("counts", "count", "sum_ms")
+
+    def __init__(self):
+        self.counts = array("L", [0]) * (MAX_BUCKET_INDEX + 1)
+        self.count = 0
+        self.sum_ms = 0
+
+    def record(self, value_ms: float) -> None:
+        self.counts[bucket_index(value_ms)] += 1
+        self.count += 1
+        self.sum_ms += int(value_ms)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """按桶累加另一个直方图"""
+        for index, value in enumerate(other.counts):
+            if value:
+                self.counts[index] += value
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+
+    def percentiles(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[str, Optional[float]]:
+        buckets = {index: value for index, value in enumerate(self.counts) if value}
+        result = percentiles_from_buckets(buckets, quantiles)
+        result["mean"] = round(self.sum_ms / self.count, 1) if self.count else None
+        result["count"] = self.count
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "b": {str(index): value for index, value in enumerate(self.counts) if value},
+            "n": self.count,
+            "s": self.sum_ms,
+        }
+
+    @classmethod
+    def from_data(cls, data) -> "LatencyHistogram":
+        hist = cls()
+        if isinstance(data, dict):
+            for index, value in (data.get("b") or {}).items():
+                index = int(index)
+                if 0 <= index <= MAX_BUCKET_INDEX:
+                    hist.counts[index] += int(value)
+            hist.count = int(data.get("n") or sum(hist.counts))
+            hist.sum_ms = int(data.get("s") or 0)
+        return hist
+
+
+class KeyedLatencyStats:
+    """按键（模型/账户）分组的首响(ttfb)与完成(total)延迟直方图
+
+    _stats 为本进程看到的完整数据；_pending / _discarded 为上次落盘以来新增的记录和被移除的键，
+    由 take_pending 取出后与持久化数据合并（见 StatsAggregator.flush）。
+    """
+
+    __slots__ = ("_stats", "_pending", "_discarded")
+
+    METRICS = ("ttfb", "total")
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._pending: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._discarded: Set[str] = set()
+
+    @classmethod
+    def _entry(cls, stats: Dict[str, Dict[str, LatencyHistogram]], key: str) -> Dict[str, LatencyHistogram]:
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = {metric: LatencyHistogram() for metric in cls.METRICS}
+        return entry
+
+    def record(self, key: str, ttfb_ms: float, total_ms: float) -> None:
+        for stats in (self._stats, self._pending):
+            entry = self._entry(stats, key)
+            entry["ttfb"].record(ttfb_ms)
+            entry["total"].record(total_ms)
+
+    def discard(self, key: str) -> None:
+        self._stats.pop(key, None)
+        self._pending.pop(key, None)
+        self._discarded.add(key)
+
+    def keys(self):
+        return self._stats.keys()
+
+    def merge(self, other: "KeyedLatencyStats") -> None:
+        """先移除 other 中被删除的键，再按键累加 other 的直方图"""
+        for key in other._discarded:
+            self._stats.pop(key, None)
+        for key, entry in other._stats.items():
+            target = self._entry(self._stats, key)
+            for metric in self.METRICS:
+                target[metric].merge(entry[metric])
+
+    def take_pending(self) -> "KeyedLatencyStats":
+        """取出上次落盘以来的增量（需在持有 stats_lock 时调用）"""
+        delta = KeyedLatencyStats()
+        delta._stats, delta._discarded = self._pending, self._discarded
+        self._pending, self._discarded = {}, set()
+        return delta
+
+    def restore_pending(self, delta: "KeyedLatencyStats") -> None:
+        """落盘失败：把取出的增量放回，下次落盘时重新合并"""
+        for key, entry in delta._stats.items():
+            if key in self._discarded:
+                continue  # 取出后又被移除
+            target = self._entry(self._pending, key)
+            for metric in self.METRICS:
+                target[metric].merge(entry[metric])
+        self._discarded |= delta._discarded
+
+    def rebase(self, merged: "KeyedLatencyStats") -> None:
+        """落盘成功：以合并后的持久化数据为基础，叠加取出增量之后的新记录"""
+        stats = merged._stats
+        for key in self._discarded:
+            stats.pop(key, None)
+        for key, entry in self._pending.items():
+            target = self._entry(stats, key)
+            for metric in self.METRICS:
+                target[metric].merge(entry[metric])
+        self._stats = stats
+
+    def percentiles(self) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        return {
+            key: {metric: hist.percentiles() for metric, hist in entry.items()}
+            for key, entry in self._stats.items()
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            key: {metric: hist.to_dict() for metric, hist in entry.items()}
+            for key, entry in self._stats.items()
+        }
+
+    @classmethod
+    def from_data(cls, data) -> "KeyedLatencyStats":
+        stats = cls()
+        if isinstance(data, dict):
+            for key, entry in data.items():
+                if isinstance(entry, dict):
+                    stats._stats[key] = {
+                        metric: LatencyHistogram.from_data(entry.get(metric)) for metric in cls.METRICS
+                    }
+        return stats
@@ -9,7 +9,7 @@ import hmac
 import json
 import logging
 import time
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 import httpx
 from fastapi import HTTPException
@@ -52,26 +52,120 @@ def create_jwt(key_bytes: bytes, key_id: str, csesidx: str) -> str:
     return f"{message}.{urlsafe_b64encode(sig)}"
 
 
+# token 签名有效期 300 秒；270 秒后视为"待刷新"，剩余 30 秒内仍可直接使用
+JWT_SOFT_TTL_SECONDS = 270
+JWT_HARD_TTL_SECONDS = 295  # 预留 5 秒余量，避免发出即将过期的 token
+REFRESH_TIMEOUT_SECONDS = 10.0  # 单次 getoxsrf 超时（独立于全局 http 超时）
+REFRESH_STUCK_SECONDS = 5.0  # 无可用 token 且刷新超过此时间，视为账户降级
+REFRESH_BACKOFF_BASE_SECONDS = 2.0
+REFRESH_BACKOFF_MAX_SECONDS = 60.0
+
+
 class JWTManager:
     """JWT token管理器
 
-    负责JWT的获取、刷新和缓存
+    负责JWT的获取、刷新和缓存。刷新为单飞（single-flight）：同一时刻只有一个刷新任务，
+    token 仍在签名有效期内时立即返回旧 token，刷新在后台进行（stale-while-revalidate）。
     """
     def __init__(self, config: "AccountConfig", http_client: httpx.AsyncClient, user_agent: str) -> None:
         self.config = config
         self.http_client = http_client
         self.user_agent = user_agent
         self.jwt: str = ""
-        self.expires: float = 0
-        self._lock = asyncio.Lock()
+        self.expires: float = 0  # 软过期：超过后触发刷新
+        self.hard_expires: float = 0  # 硬过期：超过后 token 不可再用
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_started_at = 0.0
+        self._consecutive_failures = 0
+        self._backoff_until = 0.0
+        self._last_error: Optional[BaseException] = None
+        # 指标：请求路径上触发的刷新次数 / 后台预刷新次数 / 过期窗口内直接返回旧 token 次数
+        self.request_refreshes = 0
+        self.background_refreshes = 0
+        self.stale_hits = 0
+        self.refresh_failures = 0
 
     async def get(self, request_id: str = "") -> str:
         """获取JWT token（自动刷新）"""
-        async with self._lock:
-            if time.time() > self.expires:
-                await self._refresh(request_id)
+        now = time.time()
+        if self.jwt and now <= self.expires:
+            return self.jwt
+
+        if self.jwt and now < self.hard_expires:
+            # 软过期但仍在签名有效期内：返回旧 token，后台刷新
+            self.stale_hits += 1
+            if now >= self._backoff_until:
+                self._start_refresh(request_id, background=False)
             return self.jwt
 
+        # 没有可用 token：等待刷新结果（退避期间直接抛出上次的错误）
+        if now < self._backoff_until and self._refresh_task is None and self._last_error is not None:
+            raise self._last_error
+        task = self._start_refresh(request_id, background=False)
+        await asyncio.shield(task)
+        return self.jwt
+
+    def needs_refresh(self, lead_seconds: float = 0) -> bool:
+        """token 是否将在 lead_seconds 秒内过期"""
+        return time.time() + lead_seconds >= self.expires
+
+    def is_degraded(self) -> bool:
+        """没有可用 token，且刷新卡住或处于失败退避中"""
+        now = time.time()
+        if self.jwt and now < self.hard_expires:
+            return False
+        if self._refresh_task is not None and now - self._refresh_started_at > REFRESH_STUCK_SECONDS:
+            return True
+        return now < self._backoff_until
+
+    async def refresh_ahead(self, lead_seconds: float) -> bool:
+        """后台预刷新（与请求路径共享同一个刷新任务），返回是否实际刷新"""
+        if not self.needs_refresh(lead_seconds) or time.time() < self._backoff_until:
+            return False
+        joined = self._refresh_task is not None
+        await asyncio.shield(self._start_refresh("", background=True))
+        return not joined
+
+    def _start_refresh(self, request_id: str, background: bool) -> asyncio.Task:
+        """启动（或复用正在进行的）刷新任务"""
+        if self._refresh_task is None:
+            if background:
+                self.background_refreshes += 1
+            else:
+                self.request_refreshes += 1
+            self._refresh_started_at = time.time()
+            self._refresh_task = asyncio.create_task(self._run_refresh(request_id))
+            # 后台刷新可能无人等待结果，这里取走异常避免 "never retrieved" 警告（错误已记录在 _last_error）
+            self._refresh_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return self._refresh_task
+
+    async def _run_refresh(self, request_id: str) -> None:
+        try:
+            await asyncio.wait_for(self._refresh(request_id), timeout=REFRESH_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.refresh_failures += 1
+            self._consecutive_failures += 1
+            backoff = min(
+                REFRESH_BACKOFF_BASE_SECONDS * (2 ** (self._consecutive_failures - 1)),
+                REFRESH_BACKOFF_MAX_SECONDS,
+            )
+            self._backoff_until = time.time() + backoff
+            self._last_error = e
+            if isinstance(e, asyncio.TimeoutError):
+                logger.warning(
+                    f"[AUTH] [{self.config.account_id}] JWT 刷新超时（{REFRESH_TIMEOUT_SECONDS:.0f}秒），"
+                    f"{backoff:.0f}秒后重试"
+                )
+            raise
+        else:
+            self._consecutive_failures = 0
+            self._backoff_until = 0.0
+            self._last_error = None
+        finally:
+            self._refresh_task = None
+
     async def _refresh(self, request_id: str = "") -> None:
         """刷新JWT token"""
         cookie = f"__Secure-C_SES={self.config.secure_c_ses}"
@@ -98,5 +192,7 @@ class JWTManager:
 
         key_bytes = base64.urlsafe_b64decode(data["xsrfToken"] + "==")
         self.jwt      = create_jwt(key_bytes, data["keyId"], self.config.csesidx)
-        self.expires = time.time() + 270
+        now = time.time()
+        self.expires = now + JWT_SOFT_TTL_SECONDS
+        self.hard_expires = now + JWT_HARD_TTL_SECONDS
         logger.info(f"[AUTH] [{self.config.account_id}] {req_tag}JWT 刷新成功")
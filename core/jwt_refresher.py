@@ -0,0 +1,180 @@
+"""
+JWT 后台预刷新
+
+JWT 有效期 270 秒，过期后由第一个请求在请求路径上同步刷新（getoxsrf 往返），
+导致周期性的首响尖刺。本模块在后台为"热点"账户提前约 30 秒续期：
+- 热点账户：最近 HOT_WINDOW_SECONDS 秒内被分配过，或调度策略接下来可能选中
+- 提前量带随机抖动，避免大量账户在同一时刻集中刷新
+- 并发刷新数有上限（信号量），不会突发打满上游
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+if TYPE_CHECKING:
+    from core.account import AccountManager, MultiAccountManager
+
+logger = logging.getLogger("gemini.jwt")
+
+CHECK_INTERVAL_SECONDS = 5.0
+REFRESH_LEAD_SECONDS = 30.0
+REFRESH_JITTER_SECONDS = 10.0
+HOT_WINDOW_SECONDS = 300.0
+UPCOMING_ACCOUNTS = 3
+MAX_CONCURRENT_REFRESHES = 4
+
+
+class JWTPreRefresher:
+    """为热点账户提前刷新 JWT"""
+
+    def __init__(
+        self,
+        get_manager: Callable[[], "MultiAccountManager"],
+        interval_seconds: float = CHECK_INTERVAL_SECONDS,
+        lead_seconds: float = REFRESH_LEAD_SECONDS,
+        jitter_seconds: float = REFRESH_JITTER_SECONDS,
+        max_concurrency: int = MAX_CONCURRENT_REFRESHES,
+    ):
+        self._get_manager = get_manager
+        self.interval_seconds = interval_seconds
+        self.lead_seconds = lead_seconds
+        self.jitter_seconds = jitter_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._pending: Dict[str, asyncio.Task] = {}
+        # 每个账户的随机提前量（每次刷新后重新抽取）
+        self._leads: Dict[str, float] = {}
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 指标
+        self._refreshes = 0
+        self._failures = 0
+        self._skipped = 0
+        self._last_refresh_ms = 0.0
+        self._max_refresh_ms = 0.0
+
+    def _lead_for(self, account_id: str) -> float:
+        lead = self._leads.get(account_id)
+        if lead is None:
+            lead = self._leads[account_id] = self.lead_seconds + random.uniform(0, self.jitter_seconds)
+        return lead
+
+    def _hot_accounts(self, manager: "MultiAccountManager") -> Dict[str, "AccountManager"]:
+        now = time.time()
+        hot = {
+            account_id: account
+            for account_id, account in manager.accounts.items()
+            if account.last_used_at and now - account.last_used_at <= HOT_WINDOW_SECONDS
+        }
+        for account in manager.get_upcoming_accounts(UPCOMING_ACCOUNTS):
+            hot.setdefault(account.config.account_id, account)
+        return hot
+
+    def schedule_due(self) -> int:
+        """检查热点账户，为即将过期的 JWT 启动刷新任务，返回新启动的任务数"""
+        manager = self._get_manager()
+        started = 0
+        for account_id, account in self._hot_accounts(manager).items():
+            if account_id in self._pending:
+                continue
+            if account.config.disabled or account.config.is_expired():
+                continue
+            jwt_manager = account.ensure_jwt_manager()
+            if not jwt_manager.needs_refresh(self._lead_for(account_id)):
+                continue
+            task = asyncio.create_task(self._refresh(account_id, account))
+            self._pending[account_id] = task
+            task.add_done_callback(lambda _t, key=account_id: self._pending.pop(key, None))
+            started += 1
+        return started
+
+    async def _refresh(self, account_id: str, account: "AccountManager") -> None:
+        async with self._semaphore:
+            lead = self._lead_for(account_id)
+            start = time.perf_counter()
+            try:
+                refreshed = await account.ensure_jwt_manager().refresh_ahead(lead)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failures += 1
+                logger.warning(f"[JWT-PREFETCH] [{account_id}] 预刷新失败: {type(e).__name__}: {str(e)[:100]}")
+                return
+            finally:
+                self._leads.pop(account_id, None)
+
+            if not refreshed:
+                self._skipped += 1
+                return
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._refreshes += 1
+            self._last_refresh_ms = elapsed_ms
+            self._max_refresh_ms = max(self._max_refresh_ms, elapsed_ms)
+            logger.debug(f"[JWT-PREFETCH] [{account_id}] 预刷新完成，耗时 {elapsed_ms:.0f}ms")
+
+    async def run(self) -> None:
+        """后台检查循环"""
+        self._stop_event = asyncio.Event()
+        while not self._stop_event.is_set():
+            try:
+                self.schedule_due()
+            except Exception as e:
+                logger.error(f"[JWT-PREFETCH] 检查异常: {type(e).__name__}: {str(e)[:100]}")
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        for task in list(self._pending.values()):
+            task.cancel()
+        self._pending.clear()
+
+    def get_metrics(self) -> dict:
+        manager = self._get_manager()
+        request_refreshes = 0
+        background_refreshes = 0
+        stale_hits = 0
+        refresh_failures = 0
+        degraded = 0
+        for account in manager.accounts.values():
+            jwt_manager = account.jwt_manager
+            if jwt_manager is not None:
+                request_refreshes += jwt_manager.request_refreshes
+                background_refreshes += jwt_manager.background_refreshes
+                stale_hits += jwt_manager.stale_hits
+                refresh_failures += jwt_manager.refresh_failures
+                degraded += jwt_manager.is_degraded()
+        return {
+            "lead_seconds": self.lead_seconds,
+            "jitter_seconds": self.jitter_seconds,
+            "max_concurrency": self._max_concurrency,
+            "pending": len(self._pending),
+            "refreshes": self._refreshes,
+            "failures": self._failures,
+            "skipped": self._skipped,
+            "last_refresh_ms": round(self._last_refresh_ms, 2),
+            "max_refresh_ms": round(self._max_refresh_ms, 2),
+            # 按当前账户汇总（账户重载后清零）
+            "request_path_refreshes": request_refreshes,
+            "background_refreshes": background_refreshes,
+            "stale_hits": stale_hits,
+            "refresh_failures": refresh_failures,
+            "degraded_accounts": degraded,
+        }
@@ -175,6 +175,7 @@ class LoginService(BaseTaskService[LoginTask]):
                             mgr = self.multi_account_mgr.accounts[account_id]
                             mgr.config.disabled = True
                             mgr.disabled_reason = "403 Access Restricted"
+                            self.multi_account_mgr.refresh_account_availability(account_id)
                         self._append_log(task, "error", f"⛔ 已自动禁用账户: {account_id}")
                     except Exception as e:
                         self._append_log(task, "warning", f"⚠️ 自动禁用失败: {e}")
@@ -346,6 +347,7 @@ class LoginService(BaseTaskService[LoginTask]):
             account_mgr = self.multi_account_mgr.accounts[account_id]
             account_mgr.quota_cooldowns.clear()  # 清除配额冷却
             account_mgr.is_available = True  # 恢复可用状态
+            self.multi_account_mgr.refresh_account_availability(account_id)
             log_cb("info", "✅ 已清除账户冷却状态")
 
         log_cb("info", "✅ 配置已保存到数据库")
@@ -0,0 +1,315 @@
+"""
+媒体文件淘汰
+
+过期清理原本每 30 分钟扫描一次全部文件，期间突发的视频生成可能把数据卷写满。
+本模块由媒体索引驱动，在内存中维护按创建时间排序的最小堆：
+- 所有文件的过期时间 = 创建时间 + image_expire_hours，偏移量相同，因此堆顶始终是最先过期的文件；
+  修改过期时间后堆仍然有效，无需重建
+- 过期淘汰只弹出堆顶已过期的条目，不扫描目录；后台任务睡眠到下一个文件过期为止
+- 空间上限模式：images + videos 总大小超过 media_max_disk_gb 时，从最旧的文件开始删除，
+  直到回到上限以内（新文件写入后立即检查）；QUOTA_GRACE_SECONDS 内写入的文件不会被删除，
+  避免刚生成、链接还没返回给客户端的文件被立即淘汰
+- 删除记录采用惰性失效：画廊手动删除只移除 _live，堆中的旧条目在弹出时跳过
+- 淘汰按 DELETE_BATCH_SIZE 分批删除，删除成功后才从 _live 移除；删除失败的条目放回堆中，下一轮重试
+- 文件通过 MediaStore 删除；多个文件名共享同一 blob 时，只有最后一个引用被删除才计入释放的空间
+- 启动后第一轮及此后每隔 TEMP_SWEEP_INTERVAL 清理一次崩溃残留的 .part 临时文件
+"""
+
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.media_executor import media_executor
+from core.media_index import MediaIndex
+from core.media_store import MediaStore
+
+logger = logging.getLogger("gemini.media")
+
+MAX_SLEEP_SECONDS = 3600.0
+ERROR_RETRY_SECONDS = 60.0
+TEMP_SWEEP_INTERVAL = 3600.0
+QUOTA_GRACE_SECONDS = 60.0
+# 每次交给 MediaStore.delete 的文件数
+DELETE_BATCH_SIZE = 500
+
+
+class MediaEvictor:
+    """按过期时间/空间上限淘汰媒体文件（监听 MediaIndex 的增删）"""
+
+    def __init__(
+        self,
+        index: MediaIndex,
+        store: MediaStore,
+        get_expire_hours: Callable[[], int],
+        get_max_bytes: Callable[[], int],
+    ):
+        self._index = index
+        self._store = store
+        self._get_expire_hours = get_expire_hours
+        self._get_max_bytes = get_max_bytes
+        self._lock = threading.Lock()
+        # (mtime, filename)，可能包含已失效条目
+        self._heap: List[Tuple[float, str]] = []
+        # filename -> (mtime, size, url_prefix, type, blob)
+        self._live: Dict[str, Tuple[float, int, str, str, Optional[str]]] = {}
+        # blob -> 引用数（实际占用只按 blob 计一次）
+        self._blob_refs: Dict[str, int] = {}
+        self._bytes = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake_event: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+        # 指标
+        self._expired_files = 0
+        self._expired_bytes = 0
+        self._quota_files = 0
+        self._quota_bytes = 0
+        self._last_run_at = 0.0
+        self._last_sweep_at = 0.0
+
+        index.add_listener(self)
+
+    # ---------- 索引回调（在媒体线程池中调用） ----------
+
+    def on_media_added(self, entry: dict) -> None:
+        with self._lock:
+            self._discard(entry["filename"])
+            self._track(entry)
+            heapq.heappush(self._heap, (entry["mtime"], entry["filename"]))
+            over_budget = self._over_budget()
+        if over_budget:
+            self.wake()
+
+    def on_media_removed(self, filenames: Iterable[str]) -> None:
+        with self._lock:
+            for filename in filenames:
+                self._discard(filename)
+
+    def on_media_reloaded(self) -> None:
+        self.load()
+
+    def load(self) -> None:
+        """从索引重新加载全部条目"""
+        rows = self._index.query()
+        with self._lock:
+            self._live = {}
+            self._blob_refs = {}
+            self._bytes = 0
+            for row in rows:
+                self._track(row)
+            self._heap = [(row["mtime"], row["filename"]) for row in rows]
+            heapq.heapify(self._heap)
+        self.wake()
+
+    # ---------- 淘汰 ----------
+
+    def _track(self, entry: dict) -> None:
+        blob = entry.get("blob")
+        self._live[entry["filename"]] = (entry["mtime"], entry["size"], entry["url_prefix"], entry["type"], blob)
+        if blob is None:
+            self._bytes += entry["size"]
+            return
+        refs = self._blob_refs.get(blob, 0)
+        if refs == 0:
+            self._bytes += entry["size"]
+        self._blob_refs[blob] = refs + 1
+
+    def _discard(self, filename: str) -> int:
+        """移除条目，返回释放的实际字节数"""
+        entry = self._live.pop(filename, None)
+        if entry is None:
+            return 0
+        blob = entry[4]
+        if blob is not None:
+            refs = self._blob_refs.get(blob, 1) - 1
+            if refs > 0:
+                self._blob_refs[blob] = refs
+                return 0
+            self._blob_refs.pop(blob, None)
+        self._bytes -= entry[1]
+        return entry[1]
+
+    def _over_budget(self) -> bool:
+        max_bytes = self._get_max_bytes()
+        return max_bytes > 0 and self._bytes > max_bytes
+
+    def _next_batch(self, cutoff: float, quota: bool) -> List[Tuple[float, str, dict]]:
+        """从堆顶取出一批 mtime < cutoff 的有效条目（最多 DELETE_BATCH_SIZE 个），需持有锁
+
+        条目仍保留在 _live 中，删除成功后由 on_media_removed 移除；quota 为 True 时
+        按预计释放的空间（blob 最后一个引用才计入）只取到回到空间上限以内为止。
+        返回 [(mtime, 文件名, 条目)]，条目含预计释放的字节数。
+        """
+        batch = []
+        seen = set()
+        pending_refs: Dict[str, int] = {}
+        freed = 0
+        max_bytes = self._get_max_bytes()
+        while self._heap and len(batch) < DELETE_BATCH_SIZE:
+            if quota and not (max_bytes > 0 and self._bytes - freed > max_bytes):
+                break
+            mtime, filename = self._heap[0]
+            entry = self._live.get(filename)
+            if entry is None or entry[0] != mtime or filename in seen:
+                heapq.heappop(self._heap)  # 已删除或已被覆盖
+                continue
+            if mtime >= cutoff:
+                break
+            heapq.heappop(self._heap)
+            seen.add(filename)
+            size, blob = entry[1], entry[4]
+            if blob is not None:
+                pending_refs[blob] = pending_refs.get(blob, 0) + 1
+                if pending_refs[blob] < self._blob_refs.get(blob, 1):
+                    size = 0  # 仍有其他文件名引用该 blob
+            freed += size
+            batch.append((mtime, filename, {"filename": filename, "size": size, "type": entry[3]}))
+        return batch
+
+    def _evict(self, cutoff: float, quota: bool) -> List[dict]:
+        """分批淘汰 mtime < cutoff 的文件；quota 为 True 时只淘汰到回到空间上限以内"""
+        evicted = []
+        while True:
+            with self._lock:
+                batch = self._next_batch(cutoff, quota)
+            if not batch:
+                break
+            try:
+                self._store.delete(filename for _, filename, _ in batch)
+            except Exception:
+                # 删除失败：条目仍在 _live 中，放回堆里等下一轮重试
+                with self._lock:
+                    for mtime, filename, _ in batch:
+                        heapq.heappush(self._heap, (mtime, filename))
+                raise
+            with self._lock:
+                # 索引未启用时不会触发 on_media_removed，这里兜底移除（跳过期间被重新写入的同名文件）
+                for mtime, filename, _ in batch:
+                    entry = self._live.get(filename)
+                    if entry is not None and entry[0] == mtime:
+                        self._discard(filename)
+            evicted.extend(item for _, _, item in batch)
+        return evicted
+
+    def evict_expired(self) -> List[dict]:
+        """删除已过期文件（阻塞调用），返回被删除的条目"""
+        expire_hours = self._get_expire_hours()
+        if expire_hours < 0:
+            return []
+        evicted = self._evict(time.time() - expire_hours * 3600, quota=False)
+        self._expired_files += len(evicted)
+        self._expired_bytes += sum(item["size"] for item in evicted)
+        return evicted
+
+    def evict_over_budget(self) -> List[dict]:
+        """超出空间上限时从最旧的文件开始删除（阻塞调用，跳过宽限期内的新文件），返回被删除的条目"""
+        evicted = self._evict(time.time() - QUOTA_GRACE_SECONDS, quota=True)
+        self._quota_files += len(evicted)
+        self._quota_bytes += sum(item["size"] for item in evicted)
+        return evicted
+
+    def sweep_temp_files(self) -> int:
+        """距上次清理超过 TEMP_SWEEP_INTERVAL 时删除残留的临时文件（阻塞调用）"""
+        now = time.time()
+        if now - self._last_sweep_at < TEMP_SWEEP_INTERVAL:
+            return 0
+        self._last_sweep_at = now
+        return self._store.sweep_temp_files()
+
+    def enforce(self) -> Tuple[List[dict], List[dict]]:
+        self._last_run_at = time.time()
+        return self.evict_expired(), self.evict_over_budget()
+
+    def seconds_until_next_expiry(self) -> Optional[float]:
+        expire_hours = self._get_expire_hours()
+        if expire_hours < 0:
+            return None
+        with self._lock:
+            while self._heap:
+                mtime, filename = self._heap[0]
+                entry = self._live.get(filename)
+                if entry is not None and entry[0] == mtime:
+                    return max(0.0, mtime + expire_hours * 3600 - time.time())
+                heapq.heappop(self._heap)
+        return None
+
+    # ---------- 后台任务 ----------
+
+    def wake(self) -> None:
+        """立即执行一轮淘汰（可在任意线程调用，例如修改设置或写入新文件后）"""
+        if self._loop is not None and self._wake_event is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake_event.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        while not self._stopping:
+            self._wake_event.clear()
+            timeout = MAX_SLEEP_SECONDS
+            try:
+                swept = await media_executor.run("evict", self.sweep_temp_files)
+                if swept:
+                    logger.info(f"[GALLERY] 清理了 {swept} 个残留的临时文件")
+                expired, over_budget = await media_executor.run("evict", self.enforce)
+                if expired:
+                    logger.info(f"[GALLERY] 清理了 {len(expired)} 个过期媒体文件（过期时间: {self._get_expire_hours()}小时）")
+                if over_budget:
+                    freed_mb = sum(item["size"] for item in over_budget) / 1024 / 1024
+                    logger.info(f"[GALLERY] 媒体占用超出上限，已删除 {len(over_budget)} 个最旧文件（释放 {freed_mb:.1f}MB）")
+                next_expiry = self.seconds_until_next_expiry()
+                if next_expiry is not None:
+                    timeout = min(timeout, next_expiry + 1)
+                with self._lock:
+                    still_over_budget = self._over_budget()
+                if still_over_budget:
+                    # 剩余的都是宽限期内的新文件，宽限期过后再检查
+                    timeout = min(timeout, QUOTA_GRACE_SECONDS)
+            except Exception as e:
+                logger.error(f"[GALLERY] 清理过期文件失败: {e}")
+                timeout = ERROR_RETRY_SECONDS
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self.wake()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            files = len(self._live)
+            bytes_on_disk = self._bytes
+            heap_size = len(self._heap)
+        next_expiry = self.seconds_until_next_expiry()
+        return {
+            "files": files,
+            "bytes_on_disk": bytes_on_disk,
+            "max_bytes": self._get_max_bytes(),
+            "heap_size": heap_size,
+            "next_expiry_in_seconds": round(next_expiry, 1) if next_expiry is not None else None,
+            "expired_files": self._expired_files,
+            "expired_bytes": self._expired_bytes,
+            "quota_files": self._quota_files,
+            "quota_bytes": self._quota_bytes,
+            "bytes_evicted": self._expired_bytes + self._quota_bytes,
+            "last_run_at": self._last_run_at,
+        }
@@ -0,0 +1,120 @@
+"""
+媒体处理线程池
+
+生成图片/视频的落盘、base64 编解码都是 CPU 或阻塞 IO 操作，直接在事件循环里执行
+会让同一进程内的其他流式响应一起卡顿。这里统一交给一个有界线程池：
+- 工作线程数有上限，突发的多图请求只会排队，不会抢占事件循环
+- 按操作类型（write / encode / decode）记录耗时，并暴露排队深度
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger("gemini.media")
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class MediaExecutor:
+    """有界媒体线程池（async API）"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._max_queued = 0
+        self._completed = 0
+        self._failed = 0
+        # kind -> [count, total_ms, max_ms, total_wait_ms]
+        self._timings: Dict[str, list] = {}
+
+    def resize(self, max_workers: int) -> None:
+        """调整工作线程数（新任务进入新线程池，旧线程池处理完已提交的任务后退出）"""
+        if max_workers == self.max_workers:
+            return
+        old_executor = self._executor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media")
+        self.max_workers = max_workers
+        old_executor.shutdown(wait=False)
+        logger.info(f"[MEDIA] 媒体线程池已调整为 {max_workers} 个线程")
+
+    async def run(self, kind: str, fn: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行 fn(*args)，kind 用于分类统计耗时"""
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+
+        def call():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            ok = False
+            try:
+                result = fn(*args)
+                ok = True
+                return result
+            finally:
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self._active -= 1
+                    if ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+                    stats = self._timings.setdefault(kind, [0, 0.0, 0.0, 0.0])
+                    elapsed_ms = (finished_at - started_at) * 1000
+                    stats[0] += 1
+                    stats[1] += elapsed_ms
+                    stats[2] = max(stats[2], elapsed_ms)
+                    stats[3] += (started_at - submitted_at) * 1000
+
+        def on_done(future: Future) -> None:
+            # 排队中被取消（请求断开、线程池关闭）时 call 不会执行，需在这里归还排队计数
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        try:
+            future = self._executor.submit(call)
+        except RuntimeError:
+            # 线程池已关闭
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(on_done)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            timings = {
+                kind: {
+                    "count": stats[0],
+                    "avg_ms": round(stats[1] / stats[0], 2) if stats[0] else 0.0,
+                    "max_ms": round(stats[2], 2),
+                    "avg_wait_ms": round(stats[3] / stats[0], 2) if stats[0] else 0.0,
+                }
+                for kind, stats in self._timings.items()
+            }
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "active": self._active,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timings": timings,
+            }
+
+
+media_executor = MediaExecutor()
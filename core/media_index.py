@@ -0,0 +1,269 @@
+"""
+媒体文件索引
+
+生成的图片/视频保存在 data/images、data/videos。画廊和过期清理原本每次都要 listdir + 逐个 stat，
+文件数上万时很慢。这里用本地 SQLite 表 media_files 维护索引：
+- 写入媒体（MediaStore.put）时登记，删除时移除
+- 启动时与目录对账一次（补登旧版本留下的文件，移除已不存在的记录）
+- 画廊分页、按类型/日期筛选、统计总数和总大小都直接查询索引
+- 监听者（如 MediaEvictor）通过 add_listener 订阅增删事件
+- blob 列是 MediaStore 的引用表（公开文件名 -> 内容寻址 blob），为空表示旧版本直接落盘的文件
+
+媒体文件只存在于本机磁盘，因此索引总是使用本地 SQLite（与账户/统计用的数据库后端无关）。
+所有方法都是阻塞调用，请通过 media_executor 在线程池中执行。
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov")
+# IN (?, ...) 查询每批的参数个数（旧版 SQLite 默认上限 999）
+SQL_BATCH_SIZE = 500
+
+
+def media_type_for(filename: str, url_prefix: str) -> str:
+    """按扩展名判断类型，未知扩展名按所在目录判断"""
+    if os.path.splitext(filename)[1].lower() in VIDEO_EXTENSIONS:
+        return "video"
+    return "video" if url_prefix == "videos" else "image"
+
+
+class MediaIndex:
+    """media_files 表：filename -> (type, url_prefix, size, mtime, blob)"""
+
+    def __init__(self):
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._listeners: list = []
+        self.path = ""
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def open(self, db_path: str) -> None:
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS media_files (
+                filename TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                url_prefix TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                blob TEXT
+            )
+            """
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(media_files)")}
+        if "blob" not in columns:
+            conn.execute("ALTER TABLE media_files ADD COLUMN blob TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS media_files_blob_idx ON media_files(blob)")
+        conn.execute("CREATE INDEX IF NOT EXISTS media_files_mtime_idx ON media_files(mtime)")
+        conn.execute("CREATE INDEX IF NOT EXISTS media_files_type_mtime_idx ON media_files(type, mtime)")
+        conn.commit()
+        self._conn = conn
+        self.path = db_path
+
+    def add_listener(self, listener) -> None:
+        """listener 需实现 on_media_added(entry) / on_media_removed(filenames) / on_media_reloaded()"""
+        self._listeners.append(listener)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, filename: str, url_prefix: str, size: int, mtime: float, blob: Optional[str] = None) -> None:
+        if self._conn is None:
+            return
+        entry = {
+            "filename": filename,
+            "type": media_type_for(filename, url_prefix),
+            "url_prefix": url_prefix,
+            "size": size,
+            "mtime": mtime,
+            "blob": blob,
+        }
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media_files (filename, type, url_prefix, size, mtime, blob) VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, entry["type"], url_prefix, size, mtime, blob),
+            )
+            self._conn.commit()
+        for listener in self._listeners:
+            listener.on_media_added(entry)
+
+    def remove(self, filenames: Iterable[str]) -> int:
+        if self._conn is None:
+            return 0
+        names = list(filenames)
+        if not names:
+            return 0
+        with self._lock:
+            cursor = self._conn.executemany("DELETE FROM media_files WHERE filename = ?", [(name,) for name in names])
+            self._conn.commit()
+        for listener in self._listeners:
+            listener.on_media_removed(names)
+        return cursor.rowcount
+
+    def get(self, filename: str) -> Optional[dict]:
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM media_files WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def get_many(self, filenames: List[str]) -> List[dict]:
+        if self._conn is None or not filenames:
+            return []
+        rows = []
+        with self._lock:
+            for i in range(0, len(filenames), SQL_BATCH_SIZE):
+                batch = filenames[i:i + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows += self._conn.execute(f"SELECT * FROM media_files WHERE filename IN ({placeholders})", batch).fetchall()
+        return [dict(row) for row in rows]
+
+    def referenced_blobs(self, blobs: List[str]) -> Set[str]:
+        """返回仍被至少一个文件名引用的 blob"""
+        if self._conn is None or not blobs:
+            return set()
+        unique = list(set(blobs))
+        referenced = set()
+        with self._lock:
+            for i in range(0, len(unique), SQL_BATCH_SIZE):
+                batch = unique[i:i + SQL_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                referenced.update(row[0] for row in self._conn.execute(
+                    f"SELECT DISTINCT blob FROM media_files WHERE blob IN ({placeholders})", batch
+                ))
+        return referenced
+
+    def blob_stats(self) -> Dict[str, int]:
+        """逻辑大小（按文件名累计）与实际占用（blob 去重后）"""
+        if self._conn is None:
+            return {}
+        with self._lock:
+            logical, legacy = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0), COALESCE(SUM(CASE WHEN blob IS NULL THEN size ELSE 0 END), 0) FROM media_files"
+            ).fetchone()
+            blobs, blob_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM (SELECT blob, MAX(size) AS size FROM media_files WHERE blob IS NOT NULL GROUP BY blob)"
+            ).fetchone()
+        return {"blobs": blobs, "logical_bytes": logical, "physical_bytes": legacy + blob_bytes}
+
+    def rebuild(self, directories: List[Tuple[str, str]]) -> Tuple[int, int]:
+        """与旧文件目录对账：directories 为 [(目录, url_prefix)]，返回 (新增, 移除) 数量
+
+        只处理直接落盘的旧文件，blob 存储中的条目由 MediaStore 维护。
+        """
+        if self._conn is None:
+            return 0, 0
+        with self._lock:
+            known = {
+                row["filename"]: row["url_prefix"] if row["blob"] is None else None
+                for row in self._conn.execute("SELECT filename, url_prefix, blob FROM media_files")
+            }
+        on_disk = set()
+        added = []
+        for directory, url_prefix in directories:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue  # 下载中的临时文件
+                    on_disk.add(entry.name)
+                    if entry.name in known and known[entry.name] in (url_prefix, None):
+                        continue  # 已登记（或已迁移到 blob 存储）
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    added.append((entry.name, media_type_for(entry.name, url_prefix), url_prefix, stat.st_size, stat.st_mtime))
+        removed = [(name,) for name, prefix in known.items() if prefix is not None and name not in on_disk]
+        with self._lock:
+            if added:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO media_files (filename, type, url_prefix, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                    added,
+                )
+            if removed:
+                self._conn.executemany("DELETE FROM media_files WHERE filename = ?", removed)
+            self._conn.commit()
+        for listener in self._listeners:
+            listener.on_media_reloaded()
+        return len(added), len(removed)
+
+    @staticmethod
+    def _where(media_type: Optional[str], since: Optional[float], until: Optional[float]) -> Tuple[str, list]:
+        clauses, params = [], []
+        if media_type:
+            clauses.append("type = ?")
+            params.append(media_type)
+        if since is not None:
+            clauses.append("mtime >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("mtime < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        media_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """按创建时间倒序查询"""
+        if self._conn is None:
+            return []
+        where, params = self._where(media_type, since, until)
+        sql = f"SELECT * FROM media_files{where} ORDER BY mtime DESC, filename"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def summary(
+        self,
+        media_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """筛选条件下的总数和总大小"""
+        if self._conn is None:
+            return {"total": 0, "total_size": 0}
+        where, params = self._where(media_type, since, until)
+        with self._lock:
+            row = self._conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM media_files{where}", params).fetchone()
+        return {"total": row[0], "total_size": row[1]}
+
+    def counts_by_type(self) -> Dict[str, int]:
+        if self._conn is None:
+            return {}
+        with self._lock:
+            return {row[0]: row[1] for row in self._conn.execute("SELECT type, COUNT(*) FROM media_files GROUP BY type")}
+
+    def get_metrics(self) -> dict:
+        summary = self.summary()
+        return {
+            "enabled": self.enabled,
+            "entries": summary["total"],
+            "total_size": summary["total_size"],
+            "by_type": self.counts_by_type(),
+        }
+
+
+media_index = MediaIndex()
@@ -0,0 +1,221 @@
+"""
+内容寻址媒体存储
+
+生成的文件原本按 {chat_id}_{file_id}{ext} 直接落盘，图片 base64 回退保存、重试生成时
+相同内容会被反复存储。这里改为按内容寻址：
+- 实际内容保存在 data/blobs/ab/cd/<sha256><ext>（两级扇出目录，避免单目录文件过多）
+- 媒体索引 media_files 的 blob 列记录 公开文件名 -> blob，多个文件名可以引用同一个 blob
+- 删除文件名时只移除引用，最后一个引用被删除时才删除 blob
+- /images、/videos 静态服务按文件名查引用表定位 blob；没有 blob 的旧文件仍从原目录读取
+
+画廊、过期/空间淘汰都基于文件名（逻辑条目）工作，与 blob 布局无关。
+下载/写入中的临时文件命名为 .<uuid>.part，进程崩溃时会残留；sweep_temp_files 删除
+超过 TEMP_FILE_MAX_AGE_SECONDS 的临时文件（由 MediaEvictor 在启动时和每轮淘汰时调用）。
+所有方法都是阻塞调用，请通过 media_executor 在线程池中执行。
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from starlette.staticfiles import StaticFiles
+
+from core.media_index import MediaIndex, media_index
+
+logger = logging.getLogger("gemini.media")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+TEMP_FILE_SUFFIX = ".part"
+# 媒体下载最长约 3 次 x 180 秒，超过 1 小时的临时文件一定是崩溃残留
+TEMP_FILE_MAX_AGE_SECONDS = 3600
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """blob 存储 + 引用计数（引用关系保存在 MediaIndex 中）"""
+
+    def __init__(self, index: MediaIndex):
+        self._index = index
+        self._lock = threading.Lock()
+        self.blob_dir = ""
+        # url_prefix -> 旧文件目录
+        self._directories: Dict[str, str] = {}
+
+        # 指标
+        self._stored = 0
+        self._deduplicated = 0
+        self._bytes_saved = 0
+        self._blobs_deleted = 0
+        self._temp_files_removed = 0
+
+    def configure(self, blob_dir: str, directories: Dict[str, str]) -> None:
+        os.makedirs(blob_dir, exist_ok=True)
+        self.blob_dir = blob_dir
+        self._directories = directories
+
+    def blob_path(self, blob: str) -> str:
+        return os.path.join(self.blob_dir, blob[:2], blob[2:4], blob)
+
+    def put(self, temp_path: str, filename: str, url_prefix: str) -> str:
+        """将临时文件存入 blob 存储并登记 filename，返回 blob 名称（内容已存在时丢弃临时文件）"""
+        blob = _file_sha256(temp_path) + os.path.splitext(filename)[1].lower()
+        return self._commit(blob, temp_path, os.path.getsize(temp_path), filename, url_prefix)
+
+    def put_bytes(self, data: bytes, filename: str, url_prefix: str) -> str:
+        """将内存中的内容存入 blob 存储并登记 filename，内容已存在时不写盘"""
+        blob = hashlib.sha256(data).hexdigest() + os.path.splitext(filename)[1].lower()
+        temp_path = None
+        if not os.path.exists(self.blob_path(blob)):
+            temp_path = os.path.join(self.blob_dir, f".{uuid.uuid4().hex}{TEMP_FILE_SUFFIX}")
+            with open(temp_path, "wb") as f:
+                f.write(data)
+        return self._commit(blob, temp_path, len(data), filename, url_prefix, data)
+
+    def _commit(
+        self,
+        blob: str,
+        temp_path: Optional[str],
+        size: int,
+        filename: str,
+        url_prefix: str,
+        data: Optional[bytes] = None,
+    ) -> str:
+        path = self.blob_path(blob)
+        # 写入 blob 与登记引用在同一把锁内完成，避免与 delete 交错时误删刚被引用的 blob
+        with self._lock:
+            if os.path.exists(path):
+                if temp_path is not None:
+                    os.remove(temp_path)
+                self._deduplicated += 1
+                self._bytes_saved += size
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if temp_path is not None:
+                    os.replace(temp_path, path)
+                else:
+                    # 检查之后 blob 恰好被删除
+                    with open(path, "wb") as f:
+                        f.write(data)
+                self._stored += 1
+            old_entry = self._index.get(filename)
+            self._index.add(filename, url_prefix, size, time.time(), blob=blob)
+            if old_entry is not None:
+                # 同名文件被覆盖：释放旧 blob 或删除旧文件
+                if not old_entry["blob"]:
+                    self._remove_legacy_file(old_entry)
+                elif old_entry["blob"] != blob:
+                    self._release_blobs([old_entry["blob"]])
+        return blob
+
+    def delete(self, filenames: Iterable[str]) -> List[dict]:
+        """删除文件名（逻辑条目），返回被删除的索引条目"""
+        names = list(filenames)
+        if not names:
+            return []
+        with self._lock:
+            entries = self._index.get_many(names)
+            self._index.remove(names)
+            blobs = []
+            for entry in entries:
+                if entry["blob"]:
+                    blobs.append(entry["blob"])
+                else:
+                    self._remove_legacy_file(entry)
+            self._release_blobs(blobs)
+        return entries
+
+    def _remove_legacy_file(self, entry: dict) -> None:
+        """删除未迁移到 blob 存储的旧文件"""
+        directory = self._directories.get(entry["url_prefix"])
+        if directory is None:
+            return
+        try:
+            os.remove(os.path.join(directory, entry["filename"]))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"[MEDIA] 删除媒体文件失败: {entry['filename']}: {e}")
+
+    def _release_blobs(self, blobs: List[str]) -> None:
+        """删除已无引用的 blob，需持有锁"""
+        for blob in set(blobs) - self._index.referenced_blobs(blobs):
+            try:
+                os.remove(self.blob_path(blob))
+                self._blobs_deleted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"[MEDIA] 删除 blob 失败: {blob}: {e}")
+
+    def sweep_temp_files(self, max_age: float = TEMP_FILE_MAX_AGE_SECONDS) -> int:
+        """删除 blob 目录和旧文件目录中超过 max_age 秒的 .*.part 临时文件，返回删除数量"""
+        cutoff = time.time() - max_age
+        removed = 0
+        for directory in [self.blob_dir, *self._directories.values()]:
+            if not directory or not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not (entry.name.startswith(".") and entry.name.endswith(TEMP_FILE_SUFFIX)):
+                        continue
+                    try:
+                        if not entry.is_file() or entry.stat().st_mtime >= cutoff:
+                            continue
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.warning(f"[MEDIA] 删除临时文件失败: {entry.name}: {e}")
+        self._temp_files_removed += removed
+        return removed
+
+    def resolve(self, filename: str) -> Optional[str]:
+        """文件名 -> blob 路径（旧文件返回 None）"""
+        entry = self._index.get(filename)
+        if entry and entry.get("blob"):
+            return self.blob_path(entry["blob"])
+        return None
+
+    def get_metrics(self) -> dict:
+        return {
+            "stored_blobs": self._stored,
+            "deduplicated": self._deduplicated,
+            "bytes_saved": self._bytes_saved,
+            "blobs_deleted": self._blobs_deleted,
+            "temp_files_removed": self._temp_files_removed,
+            **self._index.blob_stats(),
+        }
+
+
+class MediaStaticFiles(StaticFiles):
+    """按引用表把 /images/<filename>、/videos/<filename> 映射到 blob，未登记的旧文件回退到原目录"""
+
+    def __init__(self, *, directory: str, store: MediaStore, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self._store = store
+
+    def lookup_path(self, path: str):
+        filename = os.path.basename(path)
+        if filename == path:
+            blob_path = self._store.resolve(filename)
+            if blob_path is not None:
+                try:
+                    return blob_path, os.stat(blob_path)
+                except FileNotFoundError:
+                    pass
+        return super().lookup_path(path)
+
+
+media_store = MediaStore(media_index)
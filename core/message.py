@@ -7,9 +7,11 @@ import base64
 import hashlib
 import logging
 import re
-from typing import List, TYPE_CHECKING
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, TYPE_CHECKING, Union
 
 import httpx
+from fastapi import HTTPException
 
 if TYPE_CHECKING:
     from main import Message
@@ -17,7 +19,43 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
-def get_conversation_key(messages: List[dict], client_identifier: str = "") -> str:
+# 指纹只取前几条消息，每条最多参与哈希的字符数（超长文本/多模态内容只读前缀）
+FINGERPRINT_MESSAGES = 3
+FINGERPRINT_MAX_CHARS = 4096
+
+# 标准 base64 字母表（Data URI 内容会原样拼接进上传请求体，必须先校验）
+BASE64_PATTERN = re.compile(rb"[A-Za-z0-9+/]*={0,2}")
+BASE64_WHITESPACE = b" \t\r\n"
+
+
+def is_valid_base64(data: bytes) -> bool:
+    """data 是否只包含标准 base64 字符且长度合法"""
+    return len(data) % 4 == 0 and BASE64_PATTERN.fullmatch(data) is not None
+
+
+def _fingerprint_text(content) -> str:
+    """提取消息内容用于指纹的文本前缀（不拼接完整内容）"""
+    if isinstance(content, list):
+        # 多模态消息：只提取文本部分，凑够上限即停止
+        parts = []
+        remaining = FINGERPRINT_MAX_CHARS
+        for part in content:
+            if remaining <= 0:
+                break
+            if isinstance(part, dict) and part.get("type") == "text":
+                piece = str(part.get("text", ""))
+                if not parts:
+                    piece = piece.lstrip()
+                piece = piece[:remaining]
+                parts.append(piece)
+                remaining -= len(piece)
+        text = "".join(parts)
+    else:
+        text = str(content).lstrip()[:FINGERPRINT_MAX_CHARS]
+    return text.rstrip().lower()
+
+
+def get_conversation_key(messages: Sequence[Union["Message", dict]], client_identifier: str = "") -> str:
     """
     生成对话指纹（使用前3条消息+客户端标识，确保唯一性）
 
@@ -25,39 +63,79 @@ def get_conversation_key(messages: List[dict], client_identifier: str = "") -> s
     1. 使用前3条消息生成指纹（而非仅第1条）
     2. 加入客户端标识（IP或request_id）避免不同用户冲突
     3. 保持Session复用能力（同一用户的后续消息仍能找到同一Session）
+    4. 直接读取 Message 模型（无需 model_dump 整个历史），每条消息最多哈希 FINGERPRINT_MAX_CHARS 个字符
 
     Args:
-        messages: 消息列表
+        messages: 消息列表（Message 模型或字典）
         client_identifier: 客户端标识（如IP地址或request_id），用于区分不同用户
     """
     if not messages:
         return f"{client_identifier}:empty" if client_identifier else "empty"
 
-    # 提取前3条消息的关键信息（角色+内容）
-    message_fingerprints = []
-    for msg in messages[:3]:  # 只取前3条
-        role = msg.get("role", "")
-        content = msg.get("content", "")
-
-        # 统一处理内容格式（字符串或数组）
-        if isinstance(content, list):
-            # 多模态消息：只提取文本部分
-            text = extract_text_from_content(content)
+    digest = hashlib.blake2b(digest_size=16)
+    if client_identifier:
+        digest.update(client_identifier.encode())
+        digest.update(b"\x00")
+    for msg in messages[:FINGERPRINT_MESSAGES]:
+        if isinstance(msg, dict):
+            role, content = msg.get("role", ""), msg.get("content", "")
         else:
-            text = str(content)
+            role, content = msg.role, msg.content
+        digest.update(f"{role}:".encode())
+        digest.update(_fingerprint_text(content).encode("utf-8", "surrogatepass"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
 
-        # 标准化：去除首尾空白，转小写
-        text = text.strip().lower()
 
-        # 组合角色和内容
-        message_fingerprints.append(f"{role}:{text}")
+@dataclass(slots=True)
+class Attachment:
+    """请求附件（图片、PDF、文档等）
 
-    # 使用前3条消息+客户端标识生成指纹
-    conversation_prefix = "|".join(message_fingerprints)
-    if client_identifier:
-        conversation_prefix = f"{client_identifier}|{conversation_prefix}"
+    raw 为原始字节（URL 下载、表单上传），b64 为 base64 文本（已校验的 Data URI 或 b64encode 的结果）。
+    两者至少有一个；上传时才按需编码一次，结果缓存在对象上。
+    """
+    mime: str
+    raw: Optional[Union[bytes, memoryview]] = None
+    b64: Optional[bytes] = None
+    _digest: Optional[str] = field(default=None, init=False, repr=False, compare=False)
 
-    return hashlib.md5(conversation_prefix.encode()).hexdigest()
+    @classmethod
+    def from_data_uri(cls, url: str) -> Optional["Attachment"]:
+        """解析 data:mime/type;base64,xxxxxx（不支持的格式返回 None，内容不是合法 base64 时返回 400）"""
+        header, sep, payload = url.partition(",")
+        if not sep or not header.startswith("data:") or not header.endswith(";base64"):
+            return None
+        mime = header[5:-7].split(";", 1)[0]
+        if not mime or not payload:
+            return None
+        try:
+            b64 = payload.encode("ascii").translate(None, BASE64_WHITESPACE)
+        except UnicodeEncodeError:
+            b64 = None
+        if b64 is None or not is_valid_base64(b64):
+            raise HTTPException(400, f"Invalid base64 content in data URI ({mime})")
+        return cls(mime=mime, b64=b64)
+
+    def base64_bytes(self) -> bytes:
+        """base64 编码后的内容（ASCII 字节，只编码一次）"""
+        if self.b64 is None:
+            self.b64 = base64.b64encode(self.raw)
+            self.raw = None  # 编码后释放原始字节
+        return self.b64
+
+    @property
+    def size(self) -> int:
+        """base64 编码后的字节数（未编码时按原始大小估算）"""
+        if self.b64 is not None:
+            return len(self.b64)
+        return (len(self.raw) + 2) // 3 * 4
+
+    @property
+    def digest(self) -> str:
+        """内容哈希（用于上传去重）"""
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.base64_bytes(), digest_size=16).hexdigest()
+        return self._digest
 
 
 def extract_text_from_content(content) -> str:
@@ -83,7 +161,7 @@ async def parse_last_message(messages: List['Message'], http_client: httpx.Async
     content = last_msg.content
 
     text_content = ""
-    images = [] # List of {"mime": str, "data": str_base64} - 兼容变量名，实际支持所有文件
+    images: List[Attachment] = []  # 兼容变量名，实际支持所有文件
     image_urls = []  # 需要下载的 URL - 兼容变量名，实际支持所有文件
 
     if isinstance(content, str):
@@ -95,9 +173,9 @@ async def parse_last_message(messages: List['Message'], http_client: httpx.Async
             elif part.get("type") == "image_url":
                 url = part.get("image_url", {}).get("url", "")
                 # 解析 Data URI: data:mime/type;base64,xxxxxx (支持所有 MIME 类型)
-                match = re.match(r"data:([^;]+);base64,(.+)", url)
-                if match:
-                    images.append({"mime": match.group(1), "data": match.group(2)})
+                attachment = Attachment.from_data_uri(url) if url.startswith("data:") else None
+                if attachment is not None:
+                    images.append(attachment)
                 elif url.startswith(("http://", "https://")):
                     image_urls.append(url)
                 else:
@@ -113,10 +191,9 @@ async def parse_last_message(messages: List['Message'], http_client: httpx.Async
                     return None
                 resp.raise_for_status()
                 content_type = resp.headers.get("content-type", "application/octet-stream").split(";")[0]
-                # 移除图片类型限制，支持所有文件类型
-                b64 = base64.b64encode(resp.content).decode()
+                # 移除图片类型限制，支持所有文件类型（保留原始字节，上传时再编码）
                 logger.info(f"[FILE] [req_{request_id}] URL文件下载成功: {url[:50]}... ({len(resp.content)} bytes, {content_type})")
-                return {"mime": content_type, "data": b64}
+                return Attachment(mime=content_type, raw=resp.content)
             except httpx.HTTPStatusError as e:
                 status_code = e.response.status_code if e.response else "unknown"
                 logger.warning(f"[FILE] [req_{request_id}] URL文件下载失败({status_code}): {url[:50]}... - {e}")
@@ -137,18 +214,114 @@ async def parse_last_message(messages: List['Message'], http_client: httpx.Async
     return text_content, images
 
 
-def build_full_context_text(messages: List['Message']) -> str:
-    """仅拼接历史文本，图片只处理当次请求的"""
-    prompt = ""
-    for msg in messages:
-        role = "User" if msg.role in ["user", "system"] else "Assistant"
-        content_str = extract_text_from_content(msg.content)
+class ContextReplayStats:
+    """上下文重放（新 Session 发送完整历史）的大小统计"""
+
+    def __init__(self):
+        self.replays = 0
+        self.compacted = 0
+        self.elided_messages = 0
+        self.original_chars_total = 0
+        self.sent_chars_total = 0
+        self.last_chars = 0
+        self.max_chars = 0
+
+    def record(self, original_chars: int, sent_chars: int, elided_messages: int) -> None:
+        self.replays += 1
+        if sent_chars < original_chars:
+            self.compacted += 1
+        self.elided_messages += elided_messages
+        self.original_chars_total += original_chars
+        self.sent_chars_total += sent_chars
+        self.last_chars = sent_chars
+        self.max_chars = max(self.max_chars, sent_chars)
+
+    def get_metrics(self) -> dict:
+        return {
+            "replays": self.replays,
+            "compacted": self.compacted,
+            "elided_messages": self.elided_messages,
+            "avg_original_chars": round(self.original_chars_total / self.replays) if self.replays else 0,
+            "avg_sent_chars": round(self.sent_chars_total / self.replays) if self.replays else 0,
+            "last_chars": self.last_chars,
+            "max_chars": self.max_chars,
+        }
+
+
+replay_stats = ContextReplayStats()
+
+
+def _render_context_message(msg: 'Message') -> str:
+    role = "User" if msg.role in ["user", "system"] else "Assistant"
+    content_str = extract_text_from_content(msg.content)
+
+    # 为多模态消息添加图片标记
+    if isinstance(msg.content, list):
+        image_count = sum(1 for part in msg.content if part.get("type") == "image_url")
+        if image_count > 0:
+            content_str += "[图片]" * image_count
+
+    return f"{role}: {content_str}\n\n"
+
+
+def _truncate_segment(segment: str, limit: int) -> str:
+    if len(segment) <= limit:
+        return segment
+    marker = f"…[已截断 {len(segment) - limit} 字符]\n\n"
+    if limit < len(marker):
+        return ""  # 预算连省略标记都放不下
+    return segment[:limit - len(marker)] + marker
+
+
+def build_full_context_text(messages: List['Message'], max_chars: int = 0, keep_last_messages: int = 10) -> str:
+    """仅拼接历史文本，图片只处理当次请求的
+
+    max_chars > 0 时按预算压缩：保留开头的 system 消息和最后 keep_last_messages 条消息，
+    剩余预算从后往前补充较新的历史，更早的部分替换为省略标记；
+    仍超出预算时截断保留段中过长的消息（最后一条消息始终完整保留）。
+    """
+    segments = [_render_context_message(msg) for msg in messages]
+    original_chars = sum(len(segment) for segment in segments)
+    if max_chars <= 0 or original_chars <= max_chars or len(segments) <= 1:
+        prompt = "".join(segments)
+        replay_stats.record(original_chars, len(prompt), 0)
+        return prompt
+
+    head_count = 0
+    while head_count < len(messages) - 1 and messages[head_count].role == "system":
+        head_count += 1
+    tail_start = max(head_count, len(segments) - max(1, keep_last_messages))
+    head = segments[:head_count]
+    middle = segments[head_count:tail_start]
+    tail = segments[tail_start:]
+
+    # 预留省略标记的长度，从最近的历史往前补充，直到预算用完
+    if middle:
+        max_chars = max(0, max_chars - len(f"[已省略中间 {len(middle)} 条历史消息]\n\n"))
+    used = sum(len(segment) for segment in head) + sum(len(segment) for segment in tail)
+    kept_middle: List[str] = []
+    for segment in reversed(middle):
+        if used + len(segment) > max_chars:
+            break
+        kept_middle.append(segment)
+        used += len(segment)
+    kept_middle.reverse()
+    elided = len(middle) - len(kept_middle)
 
-        # 为多模态消息添加图片标记
-        if isinstance(msg.content, list):
-            image_count = sum(1 for part in msg.content if part.get("type") == "image_url")
-            if image_count > 0:
-                content_str += "[图片]" * image_count
+    if used > max_chars:
+        # system + 最近消息本身超出预算：平均截断除最后一条外的保留消息
+        protected = head + tail[:-1]
+        if protected:
+            limit = max(0, max_chars - len(tail[-1])) // len(protected)
+            head = [_truncate_segment(segment, limit) for segment in head]
+            tail = [_truncate_segment(segment, limit) for segment in tail[:-1]] + tail[-1:]
 
-        prompt += f"{role}: {content_str}\n\n"
+    parts = head
+    if elided:
+        parts.append(f"[已省略中间 {elided} 条历史消息]\n\n")
+    parts.extend(kept_middle)
+    parts.extend(tail)
+    prompt = "".join(parts)
+    replay_stats.record(original_chars, len(prompt), elided)
+    logger.info(f"[CONTEXT] 重放上下文已压缩: {original_chars} -> {len(prompt)} 字符，省略 {elided} 条历史消息")
     return prompt
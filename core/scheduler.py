@@ -0,0 +1,139 @@
+"""
+账户调度策略
+
+MultiAccountManager 从可用性索引取得候选池后，由调度策略决定使用哪个账户：
+- round_robin：轮询（默认）
+- least_in_flight：当前进行中请求最少
+- most_remaining_quota：当日剩余配额最多
+- latency_ewma：首响延迟（EWMA）× 负载最低
+
+除轮询外的策略采用"随机采样 K 个候选取最优"（power of K choices），
+账户数量很大时选号成本仍为 O(1)，且不会让所有请求同时涌向同一个"最优"账户。
+"""
+
+import logging
+import random
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence
+
+if TYPE_CHECKING:
+    from core.account import AccountManager
+
+logger = logging.getLogger("gemini.scheduler")
+
+DEFAULT_POLICY = "round_robin"
+SAMPLE_SIZE = 4
+DEGRADED_PENALTY = 1e9  # JWT 刷新降级的账户排在最后
+
+
+class SchedulingPolicy:
+    """调度策略基类"""
+
+    name = ""
+
+    def select(
+        self,
+        pool: Sequence[str],
+        accounts: Dict[str, "AccountManager"],
+        quota_types: Optional[Iterable[str]] = None,
+    ) -> int:
+        """从候选池中选出一个账户，返回其在 pool 中的下标（pool 非空）"""
+        raise NotImplementedError
+
+    def upcoming(self, pool: Sequence[str], count: int) -> Sequence[int]:
+        """预测接下来可能选中的下标（用于预热，无法预测时返回空）"""
+        return ()
+
+
+class RoundRobinPolicy(SchedulingPolicy):
+    """轮询：计数器单调递增，池大小变化时不重置，避免负载偏斜"""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 随机起点：多实例部署时错开各实例的轮询位置
+        self._counter = random.randint(0, 999999)
+
+    def select(self, pool, accounts, quota_types=None) -> int:
+        with self._lock:
+            index = self._counter % len(pool)
+            self._counter += 1
+        return index
+
+    def upcoming(self, pool, count: int) -> Sequence[int]:
+        if not pool:
+            return ()
+        start = self._counter
+        return [(start + offset) % len(pool) for offset in range(min(count, len(pool)))]
+
+
+class SampledPolicy(SchedulingPolicy):
+    """随机采样 SAMPLE_SIZE 个候选，取 score 最小者"""
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self.sample_size = sample_size
+
+    def score(self, account: "AccountManager", quota_types: Optional[Iterable[str]]) -> float:
+        raise NotImplementedError
+
+    def select(self, pool, accounts, quota_types=None) -> int:
+        size = len(pool)
+        if size <= self.sample_size:
+            indices = range(size)
+        else:
+            indices = random.sample(range(size), self.sample_size)
+        best_index = -1
+        best_score = 0.0
+        for index in indices:
+            account = accounts[pool[index]]
+            score = self.score(account, quota_types)
+            if account.is_degraded():
+                score += DEGRADED_PENALTY
+            if best_index < 0 or score < best_score:
+                best_index, best_score = index, score
+        return best_index
+
+
+class LeastInFlightPolicy(SampledPolicy):
+    """进行中请求最少优先（同负载时优先本次启动后使用较少的账户）"""
+
+    name = "least_in_flight"
+
+    def score(self, account, quota_types) -> float:
+        return account.in_flight + account.session_usage_count * 1e-6
+
+
+class MostRemainingQuotaPolicy(SampledPolicy):
+    """当日剩余配额最多优先（未启用配额上限时按当日已用次数）"""
+
+    name = "most_remaining_quota"
+
+    def score(self, account, quota_types) -> float:
+        return -account.get_remaining_daily_quota(quota_types) + account.in_flight
+
+
+class LatencyEwmaPolicy(SampledPolicy):
+    """首响延迟 EWMA × (进行中请求 + 1) 最低优先；尚无延迟数据的账户优先探测"""
+
+    name = "latency_ewma"
+
+    def score(self, account, quota_types) -> float:
+        if account.ttfb_ewma_ms is None:
+            return float(account.in_flight)
+        return account.ttfb_ewma_ms * (account.in_flight + 1)
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (RoundRobinPolicy, LeastInFlightPolicy, MostRemainingQuotaPolicy, LatencyEwmaPolicy)
+}
+
+
+def create_policy(name: Optional[str]) -> SchedulingPolicy:
+    """按名称创建调度策略，未知名称回退到轮询"""
+    policy_cls = POLICIES.get(name or DEFAULT_POLICY)
+    if policy_cls is None:
+        logger.warning(f"[SCHEDULER] 未知调度策略 {name}，使用 {DEFAULT_POLICY}")
+        policy_cls = POLICIES[DEFAULT_POLICY]
+    return policy_cls()
@@ -0,0 +1,296 @@
+"""
+对话 -> Google Session 绑定缓存
+
+继续对话时需要找回上一轮使用的账户和 Session，否则只能重建 Session 并重发完整上下文。
+后端可替换：
+- MemorySessionCache：进程内 LRU（OrderedDict，插入/续期/淘汰均为 O(1)，未启用数据库时使用）
+- DatabaseSessionCache：SQLite / PostgreSQL 表 session_bindings，
+  服务重启、账户重载后仍然有效，多个 worker 共享；前面带一层进程内 LRU，
+  读取先查本地，只有本地未命中才访问数据库；写入/删除直接写库，续期只记在本地，
+  清理时批量回写
+
+同一对话的并发请求由进程内的对话锁串行化，锁随缓存条目一起回收
+（数据库后端清理时按被删除的对话键回收对应的锁）。
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from core import storage
+
+logger = logging.getLogger("gemini.session_cache")
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class SessionCacheBackend:
+    """会话绑定缓存接口
+
+    条目格式：{"account_id": str, "session_id": str, "updated_at": float}
+    超过 TTL 未使用的条目视为不存在；ttl_seconds 为 0 时禁用缓存。
+    """
+
+    name = ""
+
+    def __init__(self, ttl_seconds: int, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # 对话锁：按最近使用排序，条目删除/淘汰时一并回收空闲的锁
+        self._locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def _is_expired(self, entry: dict, now: float) -> bool:
+        return now - entry["updated_at"] > self.ttl_seconds
+
+    def lock_for(self, conv_key: str) -> asyncio.Lock:
+        """获取对话锁（防止同一对话的并发请求冲突）"""
+        lock = self._locks.get(conv_key)
+        if lock is None:
+            lock = self._locks[conv_key] = asyncio.Lock()
+            self._trim_locks()
+        else:
+            self._locks.move_to_end(conv_key)
+        return lock
+
+    @staticmethod
+    def _lock_in_use(lock: asyncio.Lock) -> bool:
+        # 释放后、等待者被唤醒前 locked() 为 False，需同时检查等待队列
+        return lock.locked() or bool(getattr(lock, "_waiters", None))
+
+    def _release_lock(self, conv_key: str) -> None:
+        lock = self._locks.get(conv_key)
+        if lock is not None and not self._lock_in_use(lock):
+            del self._locks[conv_key]
+
+    def _trim_locks(self) -> None:
+        """锁数量超过上限时回收最久未用的空闲锁（被持有的锁移到队尾）"""
+        for _ in range(len(self._locks) - self.max_entries):
+            conv_key, lock = self._locks.popitem(last=False)
+            if self._lock_in_use(lock):
+                self._locks[conv_key] = lock
+
+    async def get(self, conv_key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    async def set(self, conv_key: str, account_id: str, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def touch(self, conv_key: str) -> None:
+        raise NotImplementedError
+
+    async def delete(self, conv_key: str) -> None:
+        raise NotImplementedError
+
+    async def cleanup(self) -> int:
+        """清理过期条目并控制条目数，返回删除数量"""
+        raise NotImplementedError
+
+    async def size(self) -> int:
+        raise NotImplementedError
+
+    async def get_metrics(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "backend": self.name,
+            "entries": await self.size(),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._evictions,
+            "locks": len(self._locks),
+        }
+
+
+class MemorySessionCache(SessionCacheBackend):
+    """进程内 LRU 会话缓存
+
+    OrderedDict 按 updated_at 升序排列（写入/续期时移到队尾），
+    因此过期清理只需从队首弹出，容量淘汰每次弹出一个最旧条目。
+    所有操作都在事件循环内同步完成，无需额外加锁。
+    """
+
+    name = "memory"
+
+    def __init__(self, ttl_seconds: int, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl_seconds, max_entries)
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+
+    async def get(self, conv_key: str) -> Optional[dict]:
+        entry = self._entries.get(conv_key) if self.enabled else None
+        if entry is not None and self._is_expired(entry, time.time()):
+            self._remove(conv_key)
+            self._evictions += 1
+            entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return entry
+
+    async def set(self, conv_key: str, account_id: str, session_id: str) -> None:
+        if not self.enabled:
+            return
+        self._entries[conv_key] = {
+            "account_id": account_id,
+            "session_id": session_id,
+            "updated_at": time.time(),
+        }
+        self._entries.move_to_end(conv_key)
+        self._ensure_size()
+
+    async def touch(self, conv_key: str) -> None:
+        entry = self._entries.get(conv_key)
+        if entry is not None:
+            entry["updated_at"] = time.time()
+            self._entries.move_to_end(conv_key)
+
+    async def delete(self, conv_key: str) -> None:
+        self._remove(conv_key)
+
+    def _remove(self, conv_key: str) -> None:
+        self._entries.pop(conv_key, None)
+        self._release_lock(conv_key)
+
+    def _ensure_size(self) -> int:
+        """超过上限时淘汰最久未使用的条目"""
+        removed = 0
+        while len(self._entries) > self.max_entries:
+            conv_key, _ = self._entries.popitem(last=False)
+            self._release_lock(conv_key)
+            removed += 1
+        self._on_local_evicted(removed)
+        return removed
+
+    def _on_local_evicted(self, count: int) -> None:
+        self._evictions += count
+
+    def _prune_local(self) -> Tuple[int, int]:
+        """清理本地过期条目并控制条目数，返回 (过期数, 淘汰数)"""
+        now = time.time()
+        expired = 0
+        while self._entries:
+            conv_key, entry = next(iter(self._entries.items()))
+            if not self._is_expired(entry, now):
+                break
+            self._remove(conv_key)
+            expired += 1
+        return expired, self._ensure_size()
+
+    async def cleanup(self) -> int:
+        expired, evicted = self._prune_local()
+        if expired:
+            self._evictions += expired
+            logger.info(f"[CACHE] 清理 {expired} 个过期会话缓存")
+        if evicted:
+            logger.info(f"[CACHE] LRU清理 {evicted} 个最旧会话缓存")
+        return expired + evicted
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+
+class DatabaseSessionCache(MemorySessionCache):
+    """数据库会话缓存（SQLite / PostgreSQL），前面带一层进程内 LRU
+
+    写入/删除同时写本地 LRU 和数据库（write-through），读取先查本地，
+    未命中才查数据库并回填，常见的"同一 worker 继续对话"不产生数据库读取。
+    续期（每轮对话都会发生）只更新本地并记下时间戳，在定期清理前批量回写，
+    保证数据库按 updated_at 清理时不会删掉仍在使用的绑定。
+    其他 worker 的改动只在本地条目过期或被淘汰后可见；同一对话的并发请求
+    本来就只在进程内串行化，因此不会引入新的不一致。
+    """
+
+    name = "database"
+
+    def __init__(self, ttl_seconds: int, max_entries: int = DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl_seconds, max_entries)
+        self._touched: Dict[str, float] = {}  # 待回写数据库的续期时间
+
+    async def get(self, conv_key: str) -> Optional[dict]:
+        if not self.enabled:
+            self._misses += 1
+            return None
+        entry = self._entries.get(conv_key)
+        now = time.time()
+        if entry is None or self._is_expired(entry, now):
+            entry = await asyncio.to_thread(storage.get_session_binding_sync, conv_key)
+            if entry is None or self._is_expired(entry, now):
+                self._remove(conv_key)
+                self._misses += 1
+                return None
+            self._entries[conv_key] = entry
+            self._entries.move_to_end(conv_key)
+            self._ensure_size()
+        self._hits += 1
+        return entry
+
+    async def set(self, conv_key: str, account_id: str, session_id: str) -> None:
+        if not self.enabled:
+            return
+        await super().set(conv_key, account_id, session_id)
+        self._touched.pop(conv_key, None)
+        await asyncio.to_thread(storage.set_session_binding_sync, conv_key, account_id, session_id, time.time())
+
+    async def touch(self, conv_key: str) -> None:
+        await super().touch(conv_key)
+        if self.enabled:
+            self._touched[conv_key] = time.time()
+
+    async def delete(self, conv_key: str) -> None:
+        self._remove(conv_key)
+        self._touched.pop(conv_key, None)
+        await asyncio.to_thread(storage.delete_session_binding_sync, conv_key)
+
+    async def _flush_touched(self) -> None:
+        """批量回写续期时间（失败时保留，下次清理重试）"""
+        if not self._touched:
+            return
+        items = list(self._touched.items())
+        self._touched.clear()
+        if not await asyncio.to_thread(storage.touch_session_bindings_sync, items):
+            for conv_key, updated_at in items:
+                self._touched.setdefault(conv_key, updated_at)
+
+    async def cleanup(self) -> int:
+        # 本地 LRU 只是数据库的子集：先回写续期并清理本地，再清理数据库并回收被删除对话的锁
+        await self._flush_touched()
+        self._prune_local()
+        cutoff = time.time() - max(self.ttl_seconds, 0)
+        pruned = await asyncio.to_thread(storage.prune_session_bindings_sync, cutoff, self.max_entries)
+        for conv_key in pruned:
+            self._remove(conv_key)
+            self._touched.pop(conv_key, None)
+        if pruned:
+            self._evictions += len(pruned)
+            logger.info(f"[CACHE] 清理 {len(pruned)} 个过期会话缓存")
+        return len(pruned)
+
+    def _on_local_evicted(self, count: int) -> None:
+        pass  # 本地 LRU 淘汰不删除数据库中的绑定，不计入淘汰数
+
+    async def size(self) -> int:
+        return await asyncio.to_thread(storage.count_session_bindings_sync)
+
+    async def get_metrics(self) -> dict:
+        metrics = await super().get_metrics()
+        metrics["local_entries"] = len(self._entries)
+        metrics["pending_touches"] = len(self._touched)
+        return metrics
+
+
+def create_session_cache(ttl_seconds: int, max_entries: int = DEFAULT_MAX_ENTRIES) -> SessionCacheBackend:
+    """启用数据库时使用数据库后端，否则使用进程内缓存"""
+    if storage.is_database_enabled():
+        return DatabaseSessionCache(ttl_seconds, max_entries)
+    return MemorySessionCache(ttl_seconds, max_entries)
@@ -0,0 +1,192 @@
+"""
+Google Session 预创建池
+
+新对话和账户切换都需要先调用 widgetCreateSession，首响要多一次上游往返。
+本模块为活跃账户预先创建少量未使用的 Session：
+- 取用时直接弹出池中 Session（命中），池空时现场创建（未命中）
+- 后台按间隔补充到配置的数量，超过 TTL 的 Session 丢弃
+- 池大小为 0 时关闭，行为与直接调用 create_google_session 一致
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from core.account import AccountManager, MultiAccountManager
+
+logger = logging.getLogger("gemini.session_pool")
+
+REFILL_INTERVAL_SECONDS = 10.0
+ACTIVE_WINDOW_SECONDS = 600.0  # 最近被分配过的账户才预热
+MAX_CONCURRENT_CREATES = 2
+REFILL_FAILURE_BACKOFF_SECONDS = 60.0
+
+
+class SessionPool:
+    """按账户维护预创建的 Google Session"""
+
+    def __init__(
+        self,
+        get_manager: Callable[[], "MultiAccountManager"],
+        create_session: Callable[["AccountManager", str], Awaitable[str]],
+        size: int = 0,
+        ttl_seconds: float = 900,
+        interval_seconds: float = REFILL_INTERVAL_SECONDS,
+    ):
+        self._get_manager = get_manager
+        self._create_session = create_session
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.interval_seconds = interval_seconds
+        self._pools: Dict[str, Deque[Tuple[str, float]]] = {}
+        self._backoff_until: Dict[str, float] = {}
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_CREATES)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 指标
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._refills = 0
+        self._refill_failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _take(self, account_id: str) -> Optional[str]:
+        pool = self._pools.get(account_id)
+        if not pool:
+            return None
+        now = time.time()
+        while pool:
+            session_name, created_at = pool.popleft()
+            if now - created_at <= self.ttl_seconds:
+                return session_name
+            self._expired += 1
+        return None
+
+    async def acquire(self, account: "AccountManager", request_id: str = "") -> str:
+        """获取一个未使用的 Session（优先取池中预创建的）"""
+        if not self.enabled:
+            return await self._create_session(account, request_id)
+
+        account_id = account.config.account_id
+        session_name = self._take(account_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if session_name is not None:
+            self._hits += 1
+            req_tag = f"[req_{request_id}] " if request_id else ""
+            logger.info(f"[SESSION] [{account_id}] {req_tag}使用预创建 Session: {session_name[-12:]}")
+            return session_name
+
+        self._misses += 1
+        return await self._create_session(account, request_id)
+
+    def _is_active(self, account: "AccountManager", now: float) -> bool:
+        return (
+            account.last_used_at > 0
+            and now - account.last_used_at <= ACTIVE_WINDOW_SECONDS
+            and not account.config.disabled
+            and not account.config.is_expired()
+            and account.are_quotas_available(["text"])
+        )
+
+    async def _refill_one(self, account: "AccountManager") -> None:
+        account_id = account.config.account_id
+        async with self._semaphore:
+            try:
+                session_name = await self._create_session(account, "")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._refill_failures += 1
+                self._backoff_until[account_id] = time.time() + REFILL_FAILURE_BACKOFF_SECONDS
+                logger.warning(f"[SESSION-POOL] [{account_id}] 预创建失败: {type(e).__name__}: {str(e)[:100]}")
+                return
+        self._pools.setdefault(account_id, deque()).append((session_name, time.time()))
+        self._refills += 1
+
+    async def refill(self) -> int:
+        """清理过期/失效的池，并为活跃账户补充 Session，返回本轮创建数"""
+        manager = self._get_manager()
+        now = time.time()
+
+        for account_id in list(self._pools):
+            account = manager.accounts.get(account_id)
+            if account is None or not self._is_active(account, now):
+                self._pools.pop(account_id, None)
+                continue
+            pool = self._pools[account_id]
+            while pool and now - pool[0][1] > self.ttl_seconds:
+                pool.popleft()
+                self._expired += 1
+
+        if not self.enabled:
+            self._pools.clear()
+            return 0
+
+        jobs = []
+        for account_id, account in manager.accounts.items():
+            if not self._is_active(account, now) or self._backoff_until.get(account_id, 0) > now:
+                continue
+            missing = self.size - len(self._pools.get(account_id, ()))
+            jobs.extend(self._refill_one(account) for _ in range(max(0, missing)))
+        if jobs:
+            await asyncio.gather(*jobs)
+        return len(jobs)
+
+    async def run(self) -> None:
+        """后台补充循环（取用后会被提前唤醒）"""
+        self._stop_event = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        while not self._stop_event.is_set():
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[SESSION-POOL] 补充异常: {type(e).__name__}: {str(e)[:100]}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def get_metrics(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "size": self.size,
+            "ttl_seconds": self.ttl_seconds,
+            "pooled_sessions": sum(len(pool) for pool in self._pools.values()),
+            "accounts": len(self._pools),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "expired": self._expired,
+            "refills": self._refills,
+            "refill_failures": self._refill_failures,
+        }
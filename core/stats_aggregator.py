@@ -0,0 +1,188 @@
+"""
+统计数据写回聚合器（write-behind）
+
+请求路径只修改内存中的 global_stats 并调用 mark_dirty()（O(1)），
+后台任务按固定间隔把脏数据一次性落盘，关闭时强制刷新一次。
+
+延迟直方图（KeyedLatencyStats）不直接覆盖：提供 load_persisted 时，落盘前读取已持久化的数据，
+把本进程上次落盘以来的增量合并进去再写回，多个 worker 的直方图因此可以累加。
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from core.histogram import KeyedLatencyStats
+from core.timeseries import KeyedTimeSeries, TimeSeries
+
+logger = logging.getLogger("gemini.stats")
+
+DEFAULT_FLUSH_INTERVAL_SECONDS = 5.0
+
+
+def snapshot_stats(obj):
+    """递归复制统计数据，deque 转为 list，时间序列/直方图导出为分桶数据（需在持有 stats_lock 时调用）"""
+    if isinstance(obj, (TimeSeries, KeyedTimeSeries, KeyedLatencyStats)):
+        return obj.to_dict()
+    if isinstance(obj, deque):
+        return list(obj)
+    if isinstance(obj, dict):
+        return {k: snapshot_stats(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [snapshot_stats(item) for item in obj]
+    return obj
+
+
+class StatsAggregator:
+    """统计数据写回聚合器：标记脏数据，按间隔批量持久化"""
+
+    def __init__(
+        self,
+        get_stats: Callable[[], dict],
+        lock: asyncio.Lock,
+        save_payload: Callable[[str], Awaitable[bool]],
+        interval_seconds: float = DEFAULT_FLUSH_INTERVAL_SECONDS,
+        load_persisted: Optional[Callable[[], Awaitable[Optional[dict]]]] = None,
+    ):
+        self._get_stats = get_stats
+        self._lock = lock
+        self._save_payload = save_payload
+        self._load_persisted = load_persisted
+        self.interval_seconds = interval_seconds
+        self._dirty = False
+        self._pending_marks = 0
+        self._flush_lock = asyncio.Lock()
+        self._stop_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # 指标
+        self._flush_count = 0
+        self._flush_failures = 0
+        self._last_flush_at = 0.0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._last_payload_bytes = 0
+        self._max_payload_bytes = 0
+
+    def mark_dirty(self) -> None:
+        """标记统计数据已变更（请求路径调用，O(1)）"""
+        self._dirty = True
+        self._pending_marks += 1
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    async def flush(self, force: bool = False) -> bool:
+        """把当前统计数据写入存储；无变更且非强制时直接返回"""
+        async with self._flush_lock:
+            if not self._dirty and not force:
+                return True
+
+            start = time.perf_counter()
+            async with self._lock:
+                stats = self._get_stats()
+                snapshot = snapshot_stats(stats)
+                deltas: Dict[str, KeyedLatencyStats] = {}
+                if self._load_persisted is not None:
+                    deltas = {
+                        key: value.take_pending()
+                        for key, value in stats.items()
+                        if isinstance(value, KeyedLatencyStats)
+                    }
+                self._dirty = False
+                marks = self._pending_marks
+                self._pending_marks = 0
+
+            merged: Dict[str, KeyedLatencyStats] = {}
+            try:
+                if deltas:
+                    persisted = await self._load_persisted()
+                    if persisted is not None:
+                        # 已持久化的直方图 + 本进程增量（尚无持久化数据时直接写本进程视图）
+                        for key, delta in deltas.items():
+                            merged[key] = KeyedLatencyStats.from_data(persisted.get(key))
+                            merged[key].merge(delta)
+                            snapshot[key] = merged[key].to_dict()
+                payload = await asyncio.to_thread(json.dumps, snapshot, ensure_ascii=False)
+                saved = await self._save_payload(payload)
+            except Exception as e:
+                saved = False
+                logger.error(f"[STATS] 统计数据落盘失败: {str(e)[:100]}")
+
+            if not saved:
+                # 写入失败：恢复脏标记和直方图增量，下个周期重试
+                async with self._lock:
+                    for key, delta in deltas.items():
+                        stats[key].restore_pending(delta)
+                self._dirty = True
+                self._pending_marks += marks
+                self._flush_failures += 1
+                return False
+
+            if merged:
+                async with self._lock:
+                    for key, value in merged.items():
+                        stats[key].rebase(value)
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            payload_bytes = len(payload.encode("utf-8"))
+            self._flush_count += 1
+            self._last_flush_at = time.time()
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            self._last_payload_bytes = payload_bytes
+            self._max_payload_bytes = max(self._max_payload_bytes, payload_bytes)
+            logger.debug(f"[STATS] 统计数据已落盘: {marks} 次变更, {payload_bytes} 字节, 耗时 {elapsed_ms:.1f}ms")
+            return True
+
+    async def run(self) -> None:
+        """后台刷新循环"""
+        self._stop_event = asyncio.Event()
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=max(self.interval_seconds, 0.5))
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[STATS] 定期落盘异常: {type(e).__name__}: {str(e)[:100]}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """停止后台任务并落盘剩余变更"""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=10)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def get_metrics(self) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "dirty": self._dirty,
+            "pending_marks": self._pending_marks,
+            "flush_count": self._flush_count,
+            "flush_failures": self._flush_failures,
+            "last_flush_at": self._last_flush_at,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self._flush_count, 2) if self._flush_count else 0.0,
+            "last_payload_bytes": self._last_payload_bytes,
+            "max_payload_bytes": self._max_payload_bytes,
+        }
@@ -14,7 +14,7 @@ import os
 import sqlite3
 import threading
 import time
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
 from dotenv import load_dotenv
 
@@ -33,6 +33,12 @@ _db_loop_lock = threading.Lock()
 _sqlite_conn = None
 _sqlite_lock = threading.Lock()
 
+# Request rollup tables by granularity ("hour" / "day").
+_ROLLUP_TABLES = {
+    "hour": "request_rollups_hourly",
+    "day": "request_rollups_daily",
+}
+
 
 def _get_database_url() -> str:
     return os.environ.get("DATABASE_URL", "").strip()
@@ -313,6 +319,78 @@ async def _init_tables(pool) -> None:
             ON task_history(created_at DESC)
             """
         )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS request_logs (
+                id BIGSERIAL PRIMARY KEY,
+                timestamp BIGINT NOT NULL,
+                model TEXT NOT NULL,
+                ttfb_ms INTEGER,
+                total_ms INTEGER,
+                status TEXT NOT NULL,
+                status_code INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS request_logs_timestamp_idx
+            ON request_logs(timestamp)
+            """
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS request_logs_status_idx
+            ON request_logs(status)
+            """
+        )
+        for table_name in _ROLLUP_TABLES.values():
+            await conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table_name} (
+                    bucket_start BIGINT NOT NULL,
+                    model TEXT NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    rate_limited INTEGER NOT NULL DEFAULT 0,
+                    ttfb_sum BIGINT NOT NULL DEFAULT 0,
+                    ttfb_count INTEGER NOT NULL DEFAULT 0,
+                    total_sum BIGINT NOT NULL DEFAULT 0,
+                    total_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket_start, model)
+                )
+                """
+            )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS request_latency_histograms (
+                granularity TEXT NOT NULL,
+                bucket_start BIGINT NOT NULL,
+                model TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket_start, model, metric, bucket)
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_bindings (
+                conv_key TEXT PRIMARY KEY,
+                account_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                updated_at DOUBLE PRECISION NOT NULL
+            )
+            """
+        )
+        await conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS session_bindings_updated_at_idx
+            ON session_bindings(updated_at)
+            """
+        )
         logger.info("[STORAGE] Database tables initialized")
 
 def _init_sqlite_tables(conn: sqlite3.Connection) -> None:
@@ -399,6 +477,52 @@ def _init_sqlite_tables(conn: sqlite3.Connection) -> None:
             ON request_logs(status)
             """
         )
+        for table_name in _ROLLUP_TABLES.values():
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table_name} (
+                    bucket_start INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    failed INTEGER NOT NULL DEFAULT 0,
+                    rate_limited INTEGER NOT NULL DEFAULT 0,
+                    ttfb_sum INTEGER NOT NULL DEFAULT 0,
+                    ttfb_count INTEGER NOT NULL DEFAULT 0,
+                    total_sum INTEGER NOT NULL DEFAULT 0,
+                    total_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bucket_start, model)
+                )
+                """
+            )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS request_latency_histograms (
+                granularity TEXT NOT NULL,
+                bucket_start INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket_start, model, metric, bucket)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS session_bindings (
+                conv_key TEXT PRIMARY KEY,
+                account_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS session_bindings_updated_at_idx
+            ON session_bindings(updated_at)
+            """
+        )
 
 
 # ==================== Accounts storage ====================
@@ -913,9 +1037,10 @@ async def _load_kv(table_name: str, key: str) -> Optional[dict]:
     return None
 
 
-async def _save_kv(table_name: str, key: str, value: dict) -> bool:
+async def _save_kv(table_name: str, key: str, value: Union[dict, str]) -> bool:
     backend = _get_backend()
-    payload = json.dumps(value, ensure_ascii=False)
+    # 允许调用方传入已序列化的 JSON 字符串，避免重复序列化
+    payload = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
     if backend == "postgres":
         async with _pg_acquire() as conn:
             await conn.execute(
@@ -981,7 +1106,7 @@ async def load_stats() -> Optional[dict]:
     return None
 
 
-async def save_stats(stats: dict) -> bool:
+async def save_stats(stats: Union[dict, str]) -> bool:
     if not is_database_enabled():
         return False
     try:
@@ -1003,7 +1128,7 @@ def load_stats_sync() -> Optional[dict]:
     return _run_in_db_loop(load_stats())
 
 
-def save_stats_sync(stats: dict) -> bool:
+def save_stats_sync(stats: Union[dict, str]) -> bool:
     return _run_in_db_loop(save_stats(stats))
 
 
@@ -1143,3 +1268,534 @@ def load_task_history_sync(limit: int = 100) -> Optional[list]:
 
 def clear_task_history_sync() -> int:
     return _run_in_db_loop(clear_task_history())
+
+
+# ==================== Request logs storage ====================
+
+# Row layout: (timestamp, model, ttfb_ms, total_ms, status, status_code)
+
+def _rollup_upsert_sql(table_name: str, placeholders: list[str]) -> str:
+    return f"""
+        INSERT INTO {table_name}
+        (bucket_start, model, total, failed, rate_limited, ttfb_sum, ttfb_count, total_sum, total_count)
+        VALUES ({", ".join(placeholders)})
+        ON CONFLICT (bucket_start, model) DO UPDATE SET
+            total = {table_name}.total + excluded.total,
+            failed = {table_name}.failed + excluded.failed,
+            rate_limited = {table_name}.rate_limited + excluded.rate_limited,
+            ttfb_sum = {table_name}.ttfb_sum + excluded.ttfb_sum,
+            ttfb_count = {table_name}.ttfb_count + excluded.ttfb_count,
+            total_sum = {table_name}.total_sum + excluded.total_sum,
+            total_count = {table_name}.total_count + excluded.total_count
+    """
+
+
+def _histogram_upsert_sql(placeholders: list[str]) -> str:
+    return f"""
+        INSERT INTO request_latency_histograms
+        (granularity, bucket_start, model, metric, bucket, count)
+        VALUES ({", ".join(placeholders)})
+        ON CONFLICT (granularity, bucket_start, model, metric, bucket) DO UPDATE SET
+            count = request_latency_histograms.count + excluded.count
+    """
+
+
+async def _pg_apply_rollups(conn, rollups: dict) -> None:
+    for granularity, table_name in _ROLLUP_TABLES.items():
+        rows = rollups.get(granularity) or []
+        if rows:
+            await conn.executemany(
+                _rollup_upsert_sql(table_name, [f"${i}" for i in range(1, 10)]),
+                rows,
+            )
+    hist_rows = rollups.get("hist") or []
+    if hist_rows:
+        await conn.executemany(
+            _histogram_upsert_sql([f"${i}" for i in range(1, 7)]),
+            hist_rows,
+        )
+
+
+def _sqlite_apply_rollups(conn: sqlite3.Connection, rollups: dict) -> None:
+    for granularity, table_name in _ROLLUP_TABLES.items():
+        rows = rollups.get(granularity) or []
+        if rows:
+            conn.executemany(_rollup_upsert_sql(table_name, ["?"] * 9), rows)
+    hist_rows = rollups.get("hist") or []
+    if hist_rows:
+        conn.executemany(_histogram_upsert_sql(["?"] * 6), hist_rows)
+
+
+async def insert_request_logs(rows: list[tuple], rollups: Optional[dict] = None) -> bool:
+    """Insert a batch of request log rows (and their rollup deltas) in one transaction.
+
+    rollups: {"hour": [...], "day": [...], "hist": [...]} as built by
+    core.database.build_rollup_deltas.
+    """
+    if not rows or not is_database_enabled():
+        return False
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(
+                        """
+                        INSERT INTO request_logs
+                        (timestamp, model, ttfb_ms, total_ms, status, status_code)
+                        VALUES ($1, $2, $3, $4, $5, $6)
+                        """,
+                        rows,
+                    )
+                    if rollups:
+                        await _pg_apply_rollups(conn, rollups)
+            return True
+        if backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock, conn:
+                conn.executemany(
+                    """
+                    INSERT INTO request_logs
+                    (timestamp, model, ttfb_ms, total_ms, status, status_code)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+                if rollups:
+                    _sqlite_apply_rollups(conn, rollups)
+            return True
+    except Exception as e:
+        logger.error(f"[STORAGE] Request logs write failed: {e}")
+    return False
+
+
+async def apply_request_rollups(rollups: dict) -> bool:
+    """Apply rollup deltas without inserting raw rows (used by backfill)."""
+    if not is_database_enabled():
+        return False
+    backend = _get_backend()
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            async with conn.transaction():
+                await _pg_apply_rollups(conn, rollups)
+        return True
+    if backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock, conn:
+            _sqlite_apply_rollups(conn, rollups)
+        return True
+    return False
+
+
+async def clear_request_rollups() -> None:
+    """Delete all rollup and histogram rows (used by backfill)."""
+    if not is_database_enabled():
+        return
+    tables = list(_ROLLUP_TABLES.values()) + ["request_latency_histograms"]
+    backend = _get_backend()
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            async with conn.transaction():
+                for table_name in tables:
+                    await conn.execute(f"DELETE FROM {table_name}")
+        return
+    if backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock, conn:
+            for table_name in tables:
+                conn.execute(f"DELETE FROM {table_name}")
+
+
+async def load_request_rollups(granularity: str, start_time: int) -> list[tuple]:
+    """Load rollup rows since start_time:
+    (bucket_start, model, total, failed, rate_limited, ttfb_sum, ttfb_count, total_sum, total_count)
+    """
+    if not is_database_enabled():
+        return []
+    table_name = _ROLLUP_TABLES[granularity]
+    backend = _get_backend()
+    columns = "bucket_start, model, total, failed, rate_limited, ttfb_sum, ttfb_count, total_sum, total_count"
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            rows = await conn.fetch(
+                f"SELECT {columns} FROM {table_name} WHERE bucket_start >= $1 ORDER BY bucket_start",
+                start_time,
+            )
+        return [tuple(row) for row in rows]
+    if backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock:
+            rows = conn.execute(
+                f"SELECT {columns} FROM {table_name} WHERE bucket_start >= ? ORDER BY bucket_start",
+                (start_time,),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+    return []
+
+
+async def load_request_histograms(granularity: str, start_time: int) -> list[tuple]:
+    """Load merged histogram rows since start_time: (model, metric, bucket, count)."""
+    if not is_database_enabled():
+        return []
+    backend = _get_backend()
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT model, metric, bucket, SUM(count)
+                FROM request_latency_histograms
+                WHERE granularity = $1 AND bucket_start >= $2
+                GROUP BY model, metric, bucket
+                """,
+                granularity,
+                start_time,
+            )
+        return [tuple(row) for row in rows]
+    if backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock:
+            rows = conn.execute(
+                """
+                SELECT model, metric, bucket, SUM(count)
+                FROM request_latency_histograms
+                WHERE granularity = ? AND bucket_start >= ?
+                GROUP BY model, metric, bucket
+                """,
+                (granularity, start_time),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+    return []
+
+
+async def load_request_logs_after_id(after_id: int, limit: int) -> list[tuple]:
+    """Page through raw request logs by id: (id, timestamp, model, ttfb_ms, total_ms, status, status_code)."""
+    if not is_database_enabled():
+        return []
+    backend = _get_backend()
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, timestamp, model, ttfb_ms, total_ms, status, status_code
+                FROM request_logs
+                WHERE id > $1
+                ORDER BY id
+                LIMIT $2
+                """,
+                after_id,
+                limit,
+            )
+        return [tuple(row) for row in rows]
+    if backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock:
+            rows = conn.execute(
+                """
+                SELECT id, timestamp, model, ttfb_ms, total_ms, status, status_code
+                FROM request_logs
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (after_id, limit),
+            ).fetchall()
+        return [tuple(row) for row in rows]
+    return []
+
+
+async def count_request_rollups() -> tuple[int, int]:
+    """Return (success, failed) request counts from the daily rollups."""
+    if not is_database_enabled():
+        return 0, 0
+    backend = _get_backend()
+    query = """
+        SELECT COALESCE(SUM(total), 0), COALESCE(SUM(failed), 0)
+        FROM request_rollups_daily
+    """
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            row = await conn.fetchrow(query)
+    elif backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock:
+            row = conn.execute(query).fetchone()
+    else:
+        return 0, 0
+    total, failed = int(row[0]), int(row[1])
+    return total - failed, failed
+
+
+async def delete_request_logs_before(cutoff_time: int) -> int:
+    """Delete request log rows (and rollups) older than cutoff_time."""
+    if not is_database_enabled():
+        return 0
+    backend = _get_backend()
+    if backend == "postgres":
+        async with _pg_acquire() as conn:
+            async with conn.transaction():
+                result = await conn.execute(
+                    "DELETE FROM request_logs WHERE timestamp < $1",
+                    cutoff_time,
+                )
+                for table_name in list(_ROLLUP_TABLES.values()) + ["request_latency_histograms"]:
+                    await conn.execute(
+                        f"DELETE FROM {table_name} WHERE bucket_start < $1",
+                        cutoff_time,
+                    )
+        if result.startswith("DELETE"):
+            parts = result.split()
+            return int(parts[-1]) if parts else 0
+        return 0
+    if backend == "sqlite":
+        conn = _get_sqlite_conn()
+        with _sqlite_lock, conn:
+            cur = conn.execute(
+                "DELETE FROM request_logs WHERE timestamp < ?",
+                (cutoff_time,),
+            )
+            for table_name in list(_ROLLUP_TABLES.values()) + ["request_latency_histograms"]:
+                conn.execute(
+                    f"DELETE FROM {table_name} WHERE bucket_start < ?",
+                    (cutoff_time,),
+                )
+            return cur.rowcount or 0
+    return 0
+
+
+def insert_request_logs_sync(rows: list[tuple], rollups: Optional[dict] = None) -> bool:
+    return _run_in_db_loop(insert_request_logs(rows, rollups))
+
+
+def apply_request_rollups_sync(rollups: dict) -> bool:
+    return _run_in_db_loop(apply_request_rollups(rollups))
+
+
+def clear_request_rollups_sync() -> None:
+    return _run_in_db_loop(clear_request_rollups())
+
+
+def load_request_rollups_sync(granularity: str, start_time: int) -> list[tuple]:
+    return _run_in_db_loop(load_request_rollups(granularity, start_time))
+
+
+def load_request_histograms_sync(granularity: str, start_time: int) -> list[tuple]:
+    return _run_in_db_loop(load_request_histograms(granularity, start_time))
+
+
+def load_request_logs_after_id_sync(after_id: int, limit: int) -> list[tuple]:
+    return _run_in_db_loop(load_request_logs_after_id(after_id, limit))
+
+
+def count_request_rollups_sync() -> tuple[int, int]:
+    return _run_in_db_loop(count_request_rollups())
+
+
+def delete_request_logs_before_sync(cutoff_time: int) -> int:
+    return _run_in_db_loop(delete_request_logs_before(cutoff_time))
+
+
+# ==================== Session bindings (conversation -> Google session) ====================
+
+async def get_session_binding(conv_key: str) -> Optional[dict]:
+    """Load one conversation binding: {"account_id", "session_id", "updated_at"}."""
+    if not is_database_enabled():
+        return None
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                row = await conn.fetchrow(
+                    "SELECT account_id, session_id, updated_at FROM session_bindings WHERE conv_key = $1",
+                    conv_key,
+                )
+        elif backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock:
+                row = conn.execute(
+                    "SELECT account_id, session_id, updated_at FROM session_bindings WHERE conv_key = ?",
+                    (conv_key,),
+                ).fetchone()
+        else:
+            return None
+    except Exception as e:
+        logger.error(f"[STORAGE] Session binding load failed: {e}")
+        return None
+    if not row:
+        return None
+    return {"account_id": row[0], "session_id": row[1], "updated_at": float(row[2])}
+
+
+async def set_session_binding(conv_key: str, account_id: str, session_id: str, updated_at: float) -> bool:
+    """Insert or replace one conversation binding."""
+    if not is_database_enabled():
+        return False
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                await conn.execute(
+                    """
+                    INSERT INTO session_bindings (conv_key, account_id, session_id, updated_at)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (conv_key) DO UPDATE SET
+                        account_id = EXCLUDED.account_id,
+                        session_id = EXCLUDED.session_id,
+                        updated_at = EXCLUDED.updated_at
+                    """,
+                    conv_key, account_id, session_id, updated_at,
+                )
+            return True
+        if backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock, conn:
+                conn.execute(
+                    """
+                    INSERT INTO session_bindings (conv_key, account_id, session_id, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(conv_key) DO UPDATE SET
+                        account_id = excluded.account_id,
+                        session_id = excluded.session_id,
+                        updated_at = excluded.updated_at
+                    """,
+                    (conv_key, account_id, session_id, updated_at),
+                )
+            return True
+    except Exception as e:
+        logger.error(f"[STORAGE] Session binding save failed: {e}")
+    return False
+
+
+async def touch_session_bindings(items: list[tuple[str, float]]) -> bool:
+    """Refresh the updated_at of many bindings in one batch."""
+    if not is_database_enabled():
+        return False
+    if not items:
+        return True
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                await conn.executemany(
+                    "UPDATE session_bindings SET updated_at = GREATEST(updated_at, $2) WHERE conv_key = $1",
+                    items,
+                )
+            return True
+        if backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock, conn:
+                conn.executemany(
+                    "UPDATE session_bindings SET updated_at = MAX(updated_at, ?) WHERE conv_key = ?",
+                    [(updated_at, conv_key) for conv_key, updated_at in items],
+                )
+            return True
+    except Exception as e:
+        logger.error(f"[STORAGE] Session binding touch failed: {e}")
+    return False
+
+
+async def delete_session_binding(conv_key: str) -> bool:
+    """Delete one conversation binding."""
+    if not is_database_enabled():
+        return False
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                await conn.execute("DELETE FROM session_bindings WHERE conv_key = $1", conv_key)
+            return True
+        if backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock, conn:
+                conn.execute("DELETE FROM session_bindings WHERE conv_key = ?", (conv_key,))
+            return True
+    except Exception as e:
+        logger.error(f"[STORAGE] Session binding delete failed: {e}")
+    return False
+
+
+async def prune_session_bindings(cutoff_time: float, max_entries: int) -> list[str]:
+    """Delete bindings not used since cutoff_time, then keep only the newest max_entries.
+
+    Returns the deleted conversation keys.
+    """
+    if not is_database_enabled():
+        return []
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                async with conn.transaction():
+                    expired = await conn.fetch(
+                        "DELETE FROM session_bindings WHERE updated_at < $1 RETURNING conv_key",
+                        cutoff_time,
+                    )
+                    overflow = await conn.fetch(
+                        """
+                        DELETE FROM session_bindings WHERE conv_key IN (
+                            SELECT conv_key FROM session_bindings
+                            ORDER BY updated_at DESC OFFSET $1
+                        )
+                        RETURNING conv_key
+                        """,
+                        max_entries,
+                    )
+            return [row["conv_key"] for row in expired] + [row["conv_key"] for row in overflow]
+        if backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock, conn:
+                # SELECT + DELETE in one locked transaction (RETURNING needs SQLite 3.35+)
+                expired = [row[0] for row in conn.execute(
+                    "SELECT conv_key FROM session_bindings WHERE updated_at < ?",
+                    (cutoff_time,),
+                )]
+                conn.execute("DELETE FROM session_bindings WHERE updated_at < ?", (cutoff_time,))
+                overflow = [row[0] for row in conn.execute(
+                    "SELECT conv_key FROM session_bindings ORDER BY updated_at DESC LIMIT -1 OFFSET ?",
+                    (max_entries,),
+                )]
+                conn.executemany("DELETE FROM session_bindings WHERE conv_key = ?", [(key,) for key in overflow])
+            return expired + overflow
+    except Exception as e:
+        logger.error(f"[STORAGE] Session binding prune failed: {e}")
+    return []
+
+
+async def count_session_bindings() -> int:
+    if not is_database_enabled():
+        return 0
+    backend = _get_backend()
+    try:
+        if backend == "postgres":
+            async with _pg_acquire() as conn:
+                return int(await conn.fetchval("SELECT COUNT(*) FROM session_bindings"))
+        if backend == "sqlite":
+            conn = _get_sqlite_conn()
+            with _sqlite_lock:
+                return int(conn.execute("SELECT COUNT(*) FROM session_bindings").fetchone()[0])
+    except Exception as e:
+        logger.error(f"[STORAGE] Session binding count failed: {e}")
+    return 0
+
+
+def get_session_binding_sync(conv_key: str) -> Optional[dict]:
+    return _run_in_db_loop(get_session_binding(conv_key))
+
+
+def set_session_binding_sync(conv_key: str, account_id: str, session_id: str, updated_at: float) -> bool:
+    return _run_in_db_loop(set_session_binding(conv_key, account_id, session_id, updated_at))
+
+
+def touch_session_bindings_sync(items: list[tuple[str, float]]) -> bool:
+    return _run_in_db_loop(touch_session_bindings(items))
+
+
+def delete_session_binding_sync(conv_key: str) -> bool:
+    return _run_in_db_loop(delete_session_binding(conv_key))
+
+
+def prune_session_bindings_sync(cutoff_time: float, max_entries: int) -> list[str]:
+    return _run_in_db_loop(prune_session_bindings(cutoff_time, max_entries))
+
+
+def count_session_bindings_sync() -> int:
+    return _run_in_db_loop(count_session_bindings())
@@ -0,0 +1,163 @@
+"""
+固定内存的时间序列计数器
+
+用环形数组按秒/分钟分桶计数，替代保存原始时间戳的 deque：
+- 内存占用固定（与请求量无关）
+- "最近 N 秒请求数" 查询为 O(桶数)
+- 持久化时只输出非零桶，JSON 体积很小
+"""
+
+import time
+from array import array
+from typing import Dict, Iterable, Optional
+
+# 秒级分辨率保留 10 分钟，分钟级分辨率保留 24 小时
+SECOND_BUCKETS = 600
+MINUTE_BUCKETS = 1440
+
+# 按模型统计的序列数上限（含 __other__；model 来自客户端请求，需防止无限增长）
+MAX_MODEL_SERIES = 32
+OTHER_MODEL_KEY = "__other__"
+
+
+class BucketedCounter:
+    """环形数组分桶计数器"""
+
+    __slots__ = ("bucket_seconds", "size", "_ids", "_counts")
+
+    def __init__(self, bucket_seconds: int, size: int):
+        self.bucket_seconds = bucket_seconds
+        self.size = size
+        self._ids = array("q", [-1]) * size
+        self._counts = array("L", [0]) * size
+
+    def add(self, ts: float, n: int = 1) -> None:
+        bucket_id = int(ts // self.bucket_seconds)
+        slot = bucket_id % self.size
+        if self._ids[slot] != bucket_id:
+            if self._ids[slot] > bucket_id:
+                # 比环内数据更旧，已超出保留窗口
+                return
+            self._ids[slot] = bucket_id
+            self._counts[slot] = 0
+        self._counts[slot] += n
+
+    def count_since(self, seconds: float, now: float) -> int:
+        """统计最近 seconds 秒内（含当前桶）的计数"""
+        current = int(now // self.bucket_seconds)
+        span = min(self.size, max(1, -(-int(seconds) // self.bucket_seconds)))
+        total = 0
+        ids = self._ids
+        counts = self._counts
+        for bucket_id in range(current - span + 1, current + 1):
+            slot = bucket_id % self.size
+            if ids[slot] == bucket_id:
+                total += counts[slot]
+        return total
+
+    def to_pairs(self) -> list:
+        """导出非零桶 [[bucket_id, count], ...]，按时间排序"""
+        pairs = [
+            [self._ids[slot], self._counts[slot]]
+            for slot in range(self.size)
+            if self._ids[slot] >= 0 and self._counts[slot]
+        ]
+        pairs.sort()
+        return pairs
+
+    def load_pairs(self, pairs: Iterable) -> None:
+        for bucket_id, count in pairs:
+            self.add(int(bucket_id) * self.bucket_seconds, int(count))
+
+
+class TimeSeries:
+    """秒级 + 分钟级双分辨率请求计数"""
+
+    __slots__ = ("_seconds", "_minutes")
+
+    def __init__(self):
+        self._seconds = BucketedCounter(1, SECOND_BUCKETS)
+        self._minutes = BucketedCounter(60, MINUTE_BUCKETS)
+
+    def add(self, ts: Optional[float] = None, n: int = 1) -> None:
+        ts = time.time() if ts is None else ts
+        self._seconds.add(ts, n)
+        self._minutes.add(ts, n)
+
+    def count_last(self, seconds: float, now: Optional[float] = None) -> int:
+        """最近 seconds 秒内的计数（超出秒级窗口时按分钟精度统计）"""
+        now = time.time() if now is None else now
+        if seconds <= SECOND_BUCKETS:
+            return self._seconds.count_since(seconds, now)
+        return self._minutes.count_since(seconds, now)
+
+    def to_dict(self) -> dict:
+        return {"s": self._seconds.to_pairs(), "m": self._minutes.to_pairs()}
+
+    @classmethod
+    def from_data(cls, data) -> "TimeSeries":
+        """从持久化数据恢复；兼容旧版的原始时间戳列表"""
+        series = cls()
+        if isinstance(data, dict):
+            series._seconds.load_pairs(data.get("s") or [])
+            series._minutes.load_pairs(data.get("m") or [])
+        elif isinstance(data, (list, tuple)):
+            for ts in data:
+                if isinstance(ts, (int, float)):
+                    series.add(float(ts))
+        return series
+
+
+class KeyedTimeSeries:
+    """按键（模型）分组的时间序列，键数量有上限，超出部分归入 __other__
+
+    上限包含 __other__：普通键最多 max_keys - 1 个，为 __other__ 预留一个位置。
+    """
+
+    __slots__ = ("max_keys", "_series")
+
+    def __init__(self, max_keys: int = MAX_MODEL_SERIES):
+        self.max_keys = max_keys
+        self._series: Dict[str, TimeSeries] = {}
+
+    def add(self, key: str, ts: Optional[float] = None, n: int = 1) -> None:
+        series = self._series.get(key)
+        if series is None:
+            if not self._has_room(key):
+                key = OTHER_MODEL_KEY
+                series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = TimeSeries()
+        series.add(ts, n)
+
+    def _has_room(self, key: str) -> bool:
+        """能否为 key 新建序列（__other__ 总有预留位置）"""
+        if key == OTHER_MODEL_KEY:
+            return True
+        named = len(self._series) - (OTHER_MODEL_KEY in self._series)
+        return named < self.max_keys - 1
+
+    def get(self, key: str) -> Optional[TimeSeries]:
+        return self._series.get(key)
+
+    def keys(self):
+        return self._series.keys()
+
+    def to_dict(self) -> dict:
+        return {key: series.to_dict() for key, series in self._series.items()}
+
+    @classmethod
+    def from_data(cls, data, max_keys: int = MAX_MODEL_SERIES) -> "KeyedTimeSeries":
+        keyed = cls(max_keys)
+        if isinstance(data, dict):
+            for key, value in data.items():
+                restored = TimeSeries.from_data(value)
+                if key not in keyed._series and not keyed._has_room(key):
+                    key = OTHER_MODEL_KEY  # 超出上限的旧模型合并到 __other__
+                target = keyed._series.get(key)
+                if target is None:
+                    keyed._series[key] = restored
+                else:
+                    target._seconds.load_pairs(restored._seconds.to_pairs())
+                    target._minutes.load_pairs(restored._minutes.to_pairs())
+        return keyed
@@ -0,0 +1,103 @@
+"""
+附件上传去重缓存
+
+OpenAI 客户端每轮都会重发历史中的图片，账户切换后的重试也会再次上传相同的 base64 内容。
+本模块按 (Session, 内容哈希) 记录 widgetAddContextFile 返回的 fileId：
+- 同一 Session 内再次出现相同内容时直接复用 fileId，跳过上传
+- 有效期与对话 Session 缓存的 TTL 一致（命中即续期）；Session 绑定失效时一并清除
+- 按最近使用淘汰（OrderedDict），写入时顺带清理过期条目，容量达到上限时移除最旧条目
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class UploadCache:
+    """(session_name, digest) -> fileId（digest 见 Attachment.digest）"""
+
+    def __init__(self, ttl_seconds: int, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (file_id, last_used_at, size)，按 last_used_at 升序排列
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float, int]]" = OrderedDict()
+        self._by_session: Dict[str, Set[Tuple[str, str]]] = {}
+
+        # 指标
+        self._hits = 0
+        self._misses = 0
+        self._bytes_saved = 0
+        self._evictions = 0
+
+    def get(self, session_name: str, digest: str, size: int = 0) -> Optional[str]:
+        key = (session_name, digest)
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[1] > self.ttl_seconds:
+            self._remove(key)
+            self._evictions += 1
+            entry = None
+        if entry is None:
+            self._misses += 1
+            return None
+        self._entries[key] = (entry[0], time.time(), entry[2])
+        self._entries.move_to_end(key)
+        self._hits += 1
+        self._bytes_saved += size or entry[2]
+        return entry[0]
+
+    def put(self, session_name: str, digest: str, file_id: str, size: int = 0) -> None:
+        if not file_id or self.ttl_seconds <= 0:
+            return
+        self.cleanup()
+        key = (session_name, digest)
+        self._entries[key] = (file_id, time.time(), size)
+        self._entries.move_to_end(key)
+        self._by_session.setdefault(session_name, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            oldest, _ = next(iter(self._entries.items()))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def invalidate_session(self, session_name: str) -> int:
+        """Session 不再使用时清除其全部条目，返回清除数量"""
+        keys = self._by_session.pop(session_name, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        return len(keys)
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        keys = self._by_session.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_session[key[0]]
+
+    def cleanup(self) -> int:
+        """清理过期条目，返回清理数量"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[1] >= cutoff:
+                break
+            self._remove(key)
+            expired += 1
+        self._evictions += expired
+        return expired
+
+    def get_metrics(self) -> dict:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "sessions": len(self._by_session),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self._bytes_saved,
+            "evictions": self._evictions,
+        }
@@ -15,13 +15,26 @@ export interface GalleryResponse {
     files: GalleryFile[]
     total: number
     total_size: number
+    filtered_size: number
+    counts: { all: number; image: number; video: number }
+    page: number
+    page_size: number
     expire_hours: number
+    max_disk_gb: number
+}
+
+export interface GalleryQuery {
+    type?: 'all' | 'image' | 'video'
+    start_date?: string
+    end_date?: string
+    page?: number
+    page_size?: number
 }
 
 export const galleryApi = {
     // 获取画廊文件列表
-    getFiles: () =>
-        apiClient.get<never, GalleryResponse>('/admin/gallery'),
+    getFiles: (params?: GalleryQuery) =>
+        apiClient.get<never, GalleryResponse>('/admin/gallery', { params }),
 
     // 删除单个文件
     deleteFile: (filename: string) =>
@@ -33,6 +33,9 @@ export interface AdminAccount {
   cooldown_seconds: number
   cooldown_reason: string | null
   conversation_count: number
+  in_flight?: number
+  jwt_degraded?: boolean
+  ttfb_ewma_ms?: number | null
   quota_status: AccountQuotaStatus
   trial_end?: string | null
   trial_days_remaining?: number | null
@@ -115,6 +118,7 @@ export interface Settings {
     register_default_count?: number
     register_domain?: string
     image_expire_hours?: number
+    media_max_disk_gb?: number
   }
   retry: {
     max_account_switch_tries: number
@@ -148,6 +152,21 @@ export interface Settings {
     images_daily_limit: number
     videos_daily_limit: number
   }
+  performance: {
+    stats_flush_interval_seconds: number
+    request_log_flush_interval_ms: number
+    request_log_batch_size: number
+    max_concurrent_streams_per_account: number
+    account_admission_timeout_seconds: number
+    session_pool_size: number
+    session_pool_ttl_seconds: number
+    session_cache_max_entries: number
+    context_replay_max_chars: number
+    context_replay_keep_last_messages: number
+    upload_concurrency: number
+    media_workers: number
+    account_scheduler: string
+  }
 }
 
 export interface LogEntry {
@@ -248,6 +267,12 @@ export interface AdminStatsTrend {
   model_requests?: Record<string, number[]>
   model_ttfb_times?: Record<string, number[]>
   model_total_times?: Record<string, number[]>
+  model_latency_percentiles?: Record<string, LatencyPercentiles>
+}
+
+export interface LatencyPercentiles {
+  ttfb: Record<string, number | null>
+  total: Record<string, number | null>
 }
 
 export interface AdminStats {
@@ -258,6 +283,11 @@ export interface AdminStats {
   idle_accounts: number
   success_count?: number
   failed_count?: number
+  latency_percentiles?: {
+    models: Record<string, LatencyPercentiles>
+    models_since_start: Record<string, LatencyPercentiles>
+    accounts: Record<string, LatencyPercentiles>
+  }
   trend: AdminStatsTrend
 }
 
@@ -1,6 +1,6 @@
 import json, time, os, asyncio, uuid, ssl, re, yaml, base64
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Union, Dict, Any
+from typing import AsyncIterator, List, Optional, Union, Dict, Any
 from pathlib import Path
 import logging
 from dotenv import load_dotenv
@@ -11,11 +11,22 @@ from fastapi import FastAPI, HTTPException, Header, Request, Body, Form, UploadF
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from util.streaming_parser import parse_json_array_stream_async
+from util.streaming_parser import parse_json_array_stream_async, parse_json_array_stream_chunks_async
 from collections import deque
 from threading import Lock
 from core.database import stats_db
+from core.stats_aggregator import StatsAggregator
+from core.jwt_refresher import JWTPreRefresher
+from core.session_pool import SessionPool
+from core.upload_cache import UploadCache
+from core.media_executor import media_executor
+from core.media_index import media_index
+from core.media_store import media_store, MediaStaticFiles
+from core.media_eviction import MediaEvictor
+from core.timeseries import TimeSeries, KeyedTimeSeries
+from core.histogram import KeyedLatencyStats
 
 # ---------- 数据目录配置 ----------
 DATA_DIR = "./data"
@@ -33,6 +44,10 @@ VIDEO_DIR = os.path.join(DATA_DIR, "videos")
 os.makedirs(IMAGE_DIR, exist_ok=True)
 os.makedirs(VIDEO_DIR, exist_ok=True)
 
+# 媒体文件索引（画廊分页/过期清理无需扫描目录）+ 内容寻址存储
+media_index.open(os.path.join(DATA_DIR, "media_index.db"))
+media_store.configure(os.path.join(DATA_DIR, "blobs"), {"images": IMAGE_DIR, "videos": VIDEO_DIR})
+
 # 导入认证模块
 from core.auth import verify_api_key
 from core.session_auth import is_logged_in, login_user, logout_user, require_login, generate_session_secret
@@ -41,15 +56,20 @@ from core.session_auth import is_logged_in, login_user, logout_user, require_log
 from core.message import (
     get_conversation_key,
     parse_last_message,
-    build_full_context_text
+    build_full_context_text,
+    replay_stats,
+    Attachment
 )
 from core.google_api import (
     get_common_headers,
     create_google_session,
-    upload_context_file,
+    upload_context_files,
     get_session_file_metadata,
-    download_image_with_jwt,
+    download_media_to_file,
     save_image_to_hf,
+    finalize_media_file,
+    iter_file_base64,
+    remove_media_file,
 )
 from core.account import (
     AccountManager,
@@ -64,7 +84,8 @@ from core.account import (
     delete_account as _delete_account,
     update_account_disabled_status as _update_account_disabled_status,
     bulk_update_account_disabled_status as _bulk_update_account_disabled_status,
-    bulk_delete_accounts as _bulk_delete_accounts
+    bulk_delete_accounts as _bulk_delete_accounts,
+    prune_account_latency,
 )
 from core.proxy_utils import parse_proxy_setting
 from core.version import get_update_status, get_version_info
@@ -112,47 +133,49 @@ async def load_stats():
             "total_requests": 0,
             "success_count": 0,
             "failed_count": 0,
-            "request_timestamps": [],
-            "model_request_timestamps": {},
-            "failure_timestamps": [],
-            "rate_limit_timestamps": [],
             "visitor_ips": {},
             "account_conversations": {},
             "account_failures": {},
             "recent_conversations": []
         }
 
-    if isinstance(data.get("request_timestamps"), list):
-        data["request_timestamps"] = deque(data["request_timestamps"], maxlen=20000)
-    if isinstance(data.get("failure_timestamps"), list):
-        data["failure_timestamps"] = deque(data["failure_timestamps"], maxlen=10000)
-    if isinstance(data.get("rate_limit_timestamps"), list):
-        data["rate_limit_timestamps"] = deque(data["rate_limit_timestamps"], maxlen=10000)
+    # 时间序列：优先读取分桶数据，兼容旧版原始时间戳列表
+    data["request_series"] = TimeSeries.from_data(
+        data.get("request_series", data.pop("request_timestamps", None))
+    )
+    data["failure_series"] = TimeSeries.from_data(
+        data.get("failure_series", data.pop("failure_timestamps", None))
+    )
+    data["rate_limit_series"] = TimeSeries.from_data(
+        data.get("rate_limit_series", data.pop("rate_limit_timestamps", None))
+    )
+    data["model_request_series"] = KeyedTimeSeries.from_data(
+        data.get("model_request_series", data.pop("model_request_timestamps", None))
+    )
 
-    return data
+    # 延迟直方图（旧版 response_times 明细列表不再保留）
+    data.pop("response_times", None)
+    data["model_latency"] = KeyedLatencyStats.from_data(data.get("model_latency"))
+    data["account_latency"] = KeyedLatencyStats.from_data(data.get("account_latency"))
 
-async def save_stats(stats):
-    """保存统计数据(异步)。数据库不可用时不落盘。"""
-    def convert_deques(obj):
-        """递归转换所有 deque 对象为 list"""
-        if isinstance(obj, deque):
-            return list(obj)
-        elif isinstance(obj, dict):
-            return {k: convert_deques(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_deques(item) for item in obj]
-        return obj
+    return data
 
-    stats_to_save = convert_deques(stats)
+async def save_stats_payload(payload: str) -> bool:
+    """保存已序列化的统计数据(异步)。数据库不可用时不落盘。"""
+    if not storage.is_database_enabled():
+        return True
+    try:
+        return bool(await asyncio.to_thread(storage.save_stats_sync, payload))
+    except Exception as e:
+        logger.error(f"[STATS] 数据库保存失败: {str(e)[:50]}")
+    return False
 
-    if storage.is_database_enabled():
-        try:
-            saved = await asyncio.to_thread(storage.save_stats_sync, stats_to_save)
-            if saved:
-                return
-        except Exception as e:
-            logger.error(f"[STATS] 数据库保存失败: {str(e)[:50]}")
-    return
+async def load_persisted_stats() -> Optional[dict]:
+    """读取已持久化的统计数据（落盘时用于合并延迟直方图），数据库不可用或无数据时返回 None"""
+    if not storage.is_database_enabled():
+        return None
+    data = await asyncio.to_thread(storage.load_stats_sync)
+    return data if isinstance(data, dict) else None
 
 # 初始化统计数据（需要在启动时异步加载）
 global_stats = {
@@ -160,16 +183,27 @@ global_stats = {
     "total_requests": 0,
     "success_count": 0,
     "failed_count": 0,
-    "request_timestamps": deque(maxlen=20000),
-    "model_request_timestamps": {},
-    "failure_timestamps": deque(maxlen=10000),
-    "rate_limit_timestamps": deque(maxlen=10000),
+    "request_series": TimeSeries(),
+    "model_request_series": KeyedTimeSeries(),
+    "failure_series": TimeSeries(),
+    "rate_limit_series": TimeSeries(),
+    "model_latency": KeyedLatencyStats(),
+    "account_latency": KeyedLatencyStats(),
     "visitor_ips": {},
     "account_conversations": {},
     "account_failures": {},
     "recent_conversations": []
 }
 
+# 统计数据写回聚合器：请求路径只标记变更，后台按间隔落盘
+stats_aggregator = StatsAggregator(
+    lambda: global_stats,
+    stats_lock,
+    save_stats_payload,
+    interval_seconds=config.performance.stats_flush_interval_seconds,
+    load_persisted=load_persisted_stats,
+)
+
 # 任务历史记录（内存存储，容器重启后清空）
 task_history = deque(maxlen=100)  # 最多保留100条历史记录
 task_history_lock = Lock()
@@ -511,6 +545,8 @@ def get_base_url(request: Request) -> str:
 
 
 # ---------- 常量定义 ----------
+# 上游流解析引擎：chunk（块级增量解析，默认）/ legacy（逐字符解析，兜底）
+STREAM_PARSER_ENGINE = os.getenv("STREAM_PARSER", "chunk").strip().lower()
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36"
 
 # ---------- 多账户支持 ----------
@@ -528,6 +564,31 @@ multi_account_mgr = load_multi_account_config(
     global_stats
 )
 
+# JWT 后台预刷新（按需读取当前的 multi_account_mgr，账户重载后自动生效）
+jwt_pre_refresher = JWTPreRefresher(lambda: multi_account_mgr)
+
+# Google Session 预创建池（http_client 可能因代理变更重建，调用时再读取）
+session_pool = SessionPool(
+    lambda: multi_account_mgr,
+    lambda account_mgr, request_id: create_google_session(account_mgr, http_client, USER_AGENT, request_id),
+    size=config.performance.session_pool_size,
+    ttl_seconds=config.performance.session_pool_ttl_seconds,
+)
+
+# 附件上传去重缓存（有效期与对话 Session 缓存一致）
+upload_cache = UploadCache(SESSION_CACHE_TTL_SECONDS)
+
+# 媒体落盘 / base64 编解码线程池
+media_executor.resize(config.performance.media_workers)
+
+# 媒体文件淘汰（过期时间最小堆 + 空间上限）
+media_evictor = MediaEvictor(
+    media_index,
+    media_store,
+    get_expire_hours=lambda: config.basic.image_expire_hours,
+    get_max_bytes=lambda: int(config.basic.media_max_disk_gb * 1024 ** 3),
+)
+
 # ---------- 自动注册/刷新服务 ----------
 register_service = None
 login_service = None
@@ -592,40 +653,63 @@ logger.info("[SYSTEM] 系统初始化完成")
 # (消息处理函数已移至 core/message.py)
 
 # ---------- 媒体处理函数 ----------
-def process_image(data: bytes, mime: str, chat_id: str, file_id: str, base_url: str, idx: int, request_id: str, account_id: str) -> str:
-    """处理图片：根据配置返回 base64 或 URL"""
+async def process_image(path: str, mime: str, chat_id: str, file_id: str, base_url: str, idx: int, request_id: str, account_id: str) -> AsyncIterator[str]:
+    """处理图片：根据配置返回 base64 或 URL（base64 按块读取编码，分多个片段输出）"""
     output_format = config_manager.image_output_format
 
     if output_format == "base64":
-        b64 = base64.b64encode(data).decode()
-        logger.info(f"[IMAGE] [{account_id}] [req_{request_id}] 图片{idx}已编码为base64")
-        return f"\n\n![生成的图片](data:{mime};base64,{b64})\n\n"
+        try:
+            # 先编码第一块再输出前缀：打开/读取文件失败时不会留下半截图片标记
+            b64_chunks = iter_file_base64(path)
+            try:
+                try:
+                    first_chunk = await b64_chunks.__anext__()
+                except StopAsyncIteration:
+                    first_chunk = ""
+                yield f"\n\n![生成的图片](data:{mime};base64,{first_chunk}"
+                try:
+                    async for b64_chunk in b64_chunks:
+                        yield b64_chunk
+                except Exception:
+                    # 中途出错：先闭合图片标记，后续的错误提示才不会落在 data URI 里
+                    yield ")\n\n"
+                    raise
+                yield ")\n\n"
+            finally:
+                await b64_chunks.aclose()
+            logger.info(f"[IMAGE] [{account_id}] [req_{request_id}] 图片{idx}已编码为base64")
+        finally:
+            await media_executor.run("remove", remove_media_file, path)
     else:
-        url = save_image_to_hf(data, chat_id, file_id, mime, base_url, IMAGE_DIR)
+        url = await media_executor.run("write", finalize_media_file, path, chat_id, file_id, mime, base_url)
         logger.info(f"[IMAGE] [{account_id}] [req_{request_id}] 图片{idx}已保存: {url}")
-        return f"\n\n![生成的图片]({url})\n\n"
+        yield f"\n\n![生成的图片]({url})\n\n"
 
-def process_video(data: bytes, mime: str, chat_id: str, file_id: str, base_url: str, idx: int, request_id: str, account_id: str) -> str:
+async def process_video(path: str, mime: str, chat_id: str, file_id: str, base_url: str, idx: int, request_id: str, account_id: str) -> AsyncIterator[str]:
     """处理视频：根据配置返回不同格式"""
-    url = save_image_to_hf(data, chat_id, file_id, mime, base_url, VIDEO_DIR, "videos")
+    url = await media_executor.run("write", finalize_media_file, path, chat_id, file_id, mime, base_url, "videos")
     logger.info(f"[VIDEO] [{account_id}] [req_{request_id}] 视频{idx}已保存: {url}")
 
     output_format = config_manager.video_output_format
 
     if output_format == "html":
-        return f'\n\n<video controls width="100%" style="max-width: 640px;"><source src="{url}" type="{mime}">您的浏览器不支持视频播放</video>\n\n'
+        yield f'\n\n<video controls width="100%" style="max-width: 640px;"><source src="{url}" type="{mime}">您的浏览器不支持视频播放</video>\n\n'
     elif output_format == "markdown":
-        return f"\n\n![生成的视频]({url})\n\n"
+        yield f"\n\n![生成的视频]({url})\n\n"
     else:  # url
-        return f"\n\n{url}\n\n"
+        yield f"\n\n{url}\n\n"
+
+def media_dir_for(mime: str) -> str:
+    """下载临时文件所在目录（与最终保存目录一致，重命名才是原子的）"""
+    return VIDEO_DIR if mime.startswith("video/") else IMAGE_DIR
 
-def process_media(data: bytes, mime: str, chat_id: str, file_id: str, base_url: str, idx: int, request_id: str, account_id: str) -> str:
-    """统一媒体处理入口：根据 MIME 类型分发到对应处理器"""
+def process_media(path: str, mime: str, chat_id: str, file_id: str, base_url: str, idx: int, request_id: str, account_id: str) -> AsyncIterator[str]:
+    """统一媒体处理入口：根据 MIME 类型分发到对应处理器（path 为已下载的临时文件）"""
     logger.info(f"[MEDIA] [{account_id}] [req_{request_id}] 处理媒体{idx}: MIME={mime}")
     if mime.startswith("video/"):
-        return process_video(data, mime, chat_id, file_id, base_url, idx, request_id, account_id)
+        return process_video(path, mime, chat_id, file_id, base_url, idx, request_id, account_id)
     else:
-        return process_image(data, mime, chat_id, file_id, base_url, idx, request_id, account_id)
+        return process_image(path, mime, chat_id, file_id, base_url, idx, request_id, account_id)
 
 # ---------- OpenAI 兼容接口 ----------
 app = FastAPI(title="Gemini-Business OpenAI Gateway")
@@ -718,8 +802,8 @@ async def track_uptime_middleware(request: Request, call_next):
 # ---------- 图片和视频静态服务初始化 ----------
 os.makedirs(IMAGE_DIR, exist_ok=True)
 os.makedirs(VIDEO_DIR, exist_ok=True)
-app.mount("/images", StaticFiles(directory=IMAGE_DIR), name="images")
-app.mount("/videos", StaticFiles(directory=VIDEO_DIR), name="videos")
+app.mount("/images", MediaStaticFiles(directory=IMAGE_DIR, store=media_store), name="images")
+app.mount("/videos", MediaStaticFiles(directory=VIDEO_DIR, store=media_store), name="videos")
 logger.info(f"[SYSTEM] 图片静态服务已启用: /images/ -> {IMAGE_DIR}")
 logger.info(f"[SYSTEM] 视频静态服务已启用: /videos/ -> {VIDEO_DIR}")
 
@@ -784,6 +868,7 @@ async def auto_refresh_accounts_task():
                         if not acc_mgr.quota_cooldowns:
                             acc_mgr.is_available = True
                             logger.info(f"[AUTO-REFRESH] 账号 {acc_id} 状态已修正为可用")
+                multi_account_mgr.rebuild_availability_index()
 
                 _last_known_accounts_version = db_version
                 logger.info(f"[AUTO-REFRESH] 账号刷新完成，当前账号数: {len(multi_account_mgr.accounts)}")
@@ -803,10 +888,6 @@ async def startup_event():
 
     # 加载统计数据
     global_stats = await load_stats()
-    global_stats.setdefault("request_timestamps", [])
-    global_stats.setdefault("model_request_timestamps", {})
-    global_stats.setdefault("failure_timestamps", [])
-    global_stats.setdefault("rate_limit_timestamps", [])
     global_stats.setdefault("recent_conversations", [])
     global_stats.setdefault("success_count", 0)
     global_stats.setdefault("failed_count", 0)
@@ -818,8 +899,32 @@ async def startup_event():
         account_mgr.conversation_count = global_stats["account_conversations"].get(account_id, 0)
         account_mgr.failure_count = global_stats["account_failures"].get(account_id, 0)
     logger.info("[SYSTEM] 已恢复账户成功/失败统计")
+    multi_account_mgr.stats_listener = stats_aggregator.mark_dirty
+    pruned = prune_account_latency(global_stats, multi_account_mgr.accounts.keys())
+    if pruned:
+        stats_aggregator.mark_dirty()
+        logger.info(f"[SYSTEM] 已清理 {pruned} 个已删除账户的延迟统计")
     logger.info(f"[SYSTEM] 统计数据已加载: {global_stats['total_requests']} 次请求, {global_stats['total_visitors']} 位访客")
 
+    # 启动统计数据写回任务
+    stats_aggregator.start()
+    logger.info(f"[SYSTEM] 统计数据写回任务已启动（间隔: {stats_aggregator.interval_seconds}秒）")
+
+    # 启动请求日志批量写入任务
+    stats_db.log_writer.flush_interval_ms = config.performance.request_log_flush_interval_ms
+    stats_db.log_writer.batch_size = config.performance.request_log_batch_size
+    stats_db.log_writer.start()
+    logger.info(f"[SYSTEM] 请求日志批量写入任务已启动（间隔: {stats_db.log_writer.flush_interval_ms}ms，批量: {stats_db.log_writer.batch_size}条）")
+
+    # 启动 JWT 后台预刷新任务
+    jwt_pre_refresher.start()
+    logger.info(f"[SYSTEM] JWT 预刷新任务已启动（提前 {jwt_pre_refresher.lead_seconds:.0f}秒）")
+
+    # 启动 Session 预创建池（池大小为 0 时只做清理）
+    session_pool.start()
+    if session_pool.enabled:
+        logger.info(f"[SYSTEM] Session 预创建池已启动（每账户 {session_pool.size} 个，TTL {session_pool.ttl_seconds}秒）")
+
     # 启动缓存清理任务
     asyncio.create_task(multi_account_mgr.start_background_cleanup())
     logger.info("[SYSTEM] 后台缓存清理任务已启动（间隔: 5分钟）")
@@ -852,18 +957,43 @@ async def startup_event():
         asyncio.create_task(save_cooldown_states_task())
         logger.info("[SYSTEM] 冷却状态定期保存任务已启动（间隔: 5分钟）")
 
-    # 启动媒体文件过期清理任务
-    asyncio.create_task(cleanup_expired_media_task())
+    # 媒体索引与磁盘对账（补登旧版本留下的文件）
+    try:
+        added, removed = await media_executor.run("index", media_index.rebuild, [(IMAGE_DIR, "images"), (VIDEO_DIR, "videos")])
+        logger.info(f"[SYSTEM] 媒体索引已对账（新增 {added} 条，移除 {removed} 条）")
+    except Exception as e:
+        logger.error(f"[SYSTEM] 媒体索引对账失败: {e}")
+
+    # 启动媒体文件淘汰任务（按过期时间唤醒，新文件超出空间上限时立即执行）
+    media_evictor.start()
     expire_hours = config.basic.image_expire_hours
+    max_disk_gb = config.basic.media_max_disk_gb
+    quota_text = f"空间上限: {max_disk_gb:g}GB" if max_disk_gb > 0 else "空间上限: 不限制"
     if expire_hours < 0:
-        logger.info("[SYSTEM] 媒体文件过期清理已跳过（设置为永不删除）")
+        logger.info(f"[SYSTEM] 媒体文件淘汰任务已启动（过期时间: 永不删除，{quota_text}）")
     else:
-        logger.info(f"[SYSTEM] 媒体文件过期清理任务已启动（过期时间: {expire_hours}小时，检查间隔: 30分钟）")
+        logger.info(f"[SYSTEM] 媒体文件淘汰任务已启动（过期时间: {expire_hours}小时，{quota_text}）")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """应用关闭时保存冷却状态"""
+    """应用关闭时保存统计数据和冷却状态"""
+    await jwt_pre_refresher.stop()
+    await session_pool.stop()
+    await media_evictor.stop()
+
+    try:
+        await stats_aggregator.stop()
+        logger.info("[SYSTEM] 应用关闭，统计数据已落盘")
+    except Exception as e:
+        logger.error(f"[SYSTEM] 关闭时保存统计数据失败: {e}")
+
+    try:
+        await stats_db.log_writer.stop()
+        logger.info("[SYSTEM] 应用关闭，请求日志已写出")
+    except Exception as e:
+        logger.error(f"[SYSTEM] 关闭时写出请求日志失败: {e}")
+
     if storage.is_database_enabled():
         try:
             success_count = await account.save_all_cooldown_states(multi_account_mgr)
@@ -906,70 +1036,102 @@ async def cleanup_database_task():
 
 # ---------- 图片画廊 API ----------
 
-def _scan_media_files() -> list:
-    """扫描 data/images 和 data/videos 目录中的所有媒体文件"""
+def _format_media_entry(entry: dict, now: float, expire_hours: int) -> dict:
     beijing_tz = timezone(timedelta(hours=8))
+    mtime = entry["mtime"]
+    # 计算剩余有效时间
+    if expire_hours > 0:
+        expires_in_seconds = (mtime + expire_hours * 3600) - now
+        expired = expires_in_seconds <= 0
+    else:
+        expires_in_seconds = -1  # 永不过期
+        expired = False
+    return {
+        "filename": entry["filename"],
+        "url": f"/{entry['url_prefix']}/{entry['filename']}",
+        "size": entry["size"],
+        "created_at": datetime.fromtimestamp(mtime, tz=beijing_tz).strftime("%Y-%m-%d %H:%M:%S"),
+        "mtime": mtime,
+        "type": entry["type"],
+        "expired": expired,
+        "expires_in_seconds": int(expires_in_seconds) if expire_hours > 0 else None,
+    }
+
+
+def _parse_gallery_date(value: Optional[str], end_of_day: bool = False) -> Optional[float]:
+    """解析 YYYY-MM-DD（北京时间），end_of_day 时返回次日零点"""
+    if not value:
+        return None
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone(timedelta(hours=8)))
+    except ValueError:
+        raise HTTPException(400, f"日期格式错误: {value}（应为 YYYY-MM-DD）")
+    if end_of_day:
+        day += timedelta(days=1)
+    return day.timestamp()
+
+
+def _query_gallery(media_type: Optional[str], since: Optional[float], until: Optional[float], page: int, page_size: int) -> dict:
+    """从媒体索引查询一页画廊数据（阻塞调用）"""
     now = time.time()
     expire_hours = config.basic.image_expire_hours
-    files = []
+    offset = (page - 1) * page_size if page_size > 0 else 0
+    rows = media_index.query(media_type, since, until, offset, page_size if page_size > 0 else None)
+    filtered = media_index.summary(media_type, since, until)
+    overall = media_index.summary()
+    counts = media_index.counts_by_type()
+    return {
+        "files": [_format_media_entry(row, now, expire_hours) for row in rows],
+        "total": filtered["total"],
+        "filtered_size": filtered["total_size"],
+        "total_size": overall["total_size"],
+        "counts": {
+            "all": overall["total"],
+            "image": counts.get("image", 0),
+            "video": counts.get("video", 0),
+        },
+        "page": page,
+        "page_size": page_size,
+    }
 
-    for directory, url_prefix, media_type in [
-        (IMAGE_DIR, "images", "image"),
-        (VIDEO_DIR, "videos", "video"),
-    ]:
-        if not os.path.isdir(directory):
-            continue
-        for filename in os.listdir(directory):
-            filepath = os.path.join(directory, filename)
-            if not os.path.isfile(filepath):
-                continue
-            try:
-                stat = os.stat(filepath)
-                mtime = stat.st_mtime
-                size = stat.st_size
-                created_at = datetime.fromtimestamp(mtime, tz=beijing_tz).strftime("%Y-%m-%d %H:%M:%S")
-                # 计算剩余有效时间
-                if expire_hours > 0:
-                    expires_in_seconds = (mtime + expire_hours * 3600) - now
-                    expired = expires_in_seconds <= 0
-                else:
-                    expires_in_seconds = -1  # 永不过期
-                    expired = False
-
-                ext = os.path.splitext(filename)[1].lower()
-                file_type = "video" if ext in (".mp4", ".webm", ".mov") else media_type
-
-                files.append({
-                    "filename": filename,
-                    "url": f"/{url_prefix}/{filename}",
-                    "size": size,
-                    "created_at": created_at,
-                    "mtime": mtime,
-                    "type": file_type,
-                    "expired": expired,
-                    "expires_in_seconds": int(expires_in_seconds) if expire_hours > 0 else None,
-                })
-            except Exception:
-                continue
 
-    # 按创建时间倒序
-    files.sort(key=lambda x: x["mtime"], reverse=True)
-    return files
+def _delete_media_file(filename: str) -> bool:
+    """删除单个媒体文件（阻塞调用），文件不存在时返回 False"""
+    if media_store.delete([filename]):
+        return True
+    # 尚未登记到索引的文件
+    for directory in (IMAGE_DIR, VIDEO_DIR):
+        filepath = os.path.join(directory, filename)
+        if os.path.isfile(filepath):
+            os.remove(filepath)
+            return True
+    return False
 
 
 @app.get("/admin/gallery")
 @require_login()
-async def admin_get_gallery(request: Request):
-    """获取图片画廊列表"""
-    files = await asyncio.to_thread(_scan_media_files)
-    total_size = sum(f["size"] for f in files)
-
-    return {
-        "files": files,
-        "total": len(files),
-        "total_size": total_size,
-        "expire_hours": config.basic.image_expire_hours,
-    }
+async def admin_get_gallery(
+    request: Request,
+    type: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    page: int = 1,
+    page_size: int = 0,
+):
+    """获取图片画廊列表（page_size 为 0 时返回全部）"""
+    if type in ("", "all"):
+        type = None
+    if type not in (None, "image", "video"):
+        raise HTTPException(400, "type 仅支持 all / image / video")
+    since = _parse_gallery_date(start_date)
+    until = _parse_gallery_date(end_date, end_of_day=True)
+    page = max(page, 1)
+    page_size = min(max(page_size, 0), 500)
+
+    result = await media_executor.run("index", _query_gallery, type, since, until, page, page_size)
+    result["expire_hours"] = config.basic.image_expire_hours
+    result["max_disk_gb"] = config.basic.media_max_disk_gb
+    return result
 
 
 @app.delete("/admin/gallery/{filename:path}")
@@ -981,18 +1143,15 @@ async def admin_delete_gallery_file(request: Request, filename: str):
     if safe_name != filename or ".." in filename:
         raise HTTPException(400, "非法文件名")
 
-    # 在 images 和 videos 目录中查找
-    for directory in [IMAGE_DIR, VIDEO_DIR]:
-        filepath = os.path.join(directory, safe_name)
-        if os.path.isfile(filepath):
-            try:
-                os.remove(filepath)
-                logger.info(f"[GALLERY] 已删除文件: {safe_name}")
-                return {"success": True, "message": f"已删除 {safe_name}"}
-            except Exception as e:
-                raise HTTPException(500, f"删除失败: {str(e)}")
+    try:
+        deleted = await media_executor.run("remove", _delete_media_file, safe_name)
+    except Exception as e:
+        raise HTTPException(500, f"删除失败: {str(e)}")
+    if not deleted:
+        raise HTTPException(404, "文件不存在")
 
-    raise HTTPException(404, "文件不存在")
+    logger.info(f"[GALLERY] 已删除文件: {safe_name}")
+    return {"success": True, "message": f"已删除 {safe_name}"}
 
 
 @app.post("/admin/gallery/cleanup")
@@ -1003,30 +1162,9 @@ async def admin_cleanup_expired(request: Request):
     if expire_hours < 0:
         return {"success": True, "deleted": 0, "deleted_images": 0, "deleted_videos": 0, "message": "当前设置为永不删除"}
 
-    now = time.time()
-    deleted_images = 0
-    deleted_videos = 0
-    video_exts = (".mp4", ".webm", ".mov")
-
-    for directory, is_video_dir in [(IMAGE_DIR, False), (VIDEO_DIR, True)]:
-        if not os.path.isdir(directory):
-            continue
-        for filename in os.listdir(directory):
-            filepath = os.path.join(directory, filename)
-            if not os.path.isfile(filepath):
-                continue
-            try:
-                mtime = os.path.getmtime(filepath)
-                age_hours = (now - mtime) / 3600
-                if age_hours > expire_hours:
-                    os.remove(filepath)
-                    ext = os.path.splitext(filename)[1].lower()
-                    if is_video_dir or ext in video_exts:
-                        deleted_videos += 1
-                    else:
-                        deleted_images += 1
-            except Exception:
-                continue
+    evicted = await media_executor.run("evict", media_evictor.evict_expired)
+    deleted_videos = sum(1 for item in evicted if item["type"] == "video")
+    deleted_images = len(evicted) - deleted_videos
 
     deleted_count = deleted_images + deleted_videos
     if deleted_count > 0:
@@ -1040,45 +1178,6 @@ async def admin_cleanup_expired(request: Request):
         "message": f"已清理 {deleted_count} 个过期文件" if deleted_count > 0 else "没有过期文件需要清理",
     }
 
-
-async def cleanup_expired_media_task():
-    """定期清理过期的图片和视频文件"""
-    while True:
-        try:
-            await asyncio.sleep(30 * 60)  # 每 30 分钟检查一次
-
-            expire_hours = config.basic.image_expire_hours
-            if expire_hours < 0:
-                # -1 表示永不删除
-                continue
-
-            now = time.time()
-            deleted_count = 0
-
-            for directory in [IMAGE_DIR, VIDEO_DIR]:
-                if not os.path.isdir(directory):
-                    continue
-                for filename in os.listdir(directory):
-                    filepath = os.path.join(directory, filename)
-                    if not os.path.isfile(filepath):
-                        continue
-                    try:
-                        mtime = os.path.getmtime(filepath)
-                        age_hours = (now - mtime) / 3600
-                        if age_hours > expire_hours:
-                            os.remove(filepath)
-                            deleted_count += 1
-                    except Exception:
-                        continue
-
-            if deleted_count > 0:
-                logger.info(f"[GALLERY] 清理了 {deleted_count} 个过期媒体文件（过期时间: {expire_hours}小时）")
-
-        except asyncio.CancelledError:
-            break
-        except Exception as e:
-            logger.error(f"[GALLERY] 清理过期文件失败: {e}")
-
 # ---------- 日志脱敏函数 ----------
 def get_sanitized_logs(limit: int = 100) -> list:
     """获取脱敏后的日志列表，按请求ID分组并提取关键事件"""
@@ -1391,6 +1490,11 @@ async def admin_stats(request: Request, time_range: str = "24h"):
     trend_data = await stats_db.get_stats_by_time_range(time_range)
     success_count, failed_count = await stats_db.get_total_counts()
 
+    # 延迟分位数：模型维度取所选时间范围的汇总直方图，账户维度取内存累计直方图
+    async with stats_lock:
+        account_latency = global_stats["account_latency"].percentiles()
+        live_model_latency = global_stats["model_latency"].percentiles()
+
     return {
         "total_accounts": total_accounts,
         "active_accounts": active_accounts,
@@ -1399,9 +1503,34 @@ async def admin_stats(request: Request, time_range: str = "24h"):
         "idle_accounts": idle_accounts,
         "success_count": success_count,
         "failed_count": failed_count,
+        "latency_percentiles": {
+            "models": trend_data.get("model_latency_percentiles", {}),
+            "models_since_start": live_model_latency,
+            "accounts": account_latency,
+        },
         "trend": trend_data
     }
 
+@app.get("/admin/metrics")
+@require_login()
+async def admin_metrics(request: Request):
+    """获取内部性能指标"""
+    return {
+        "stats_flush": stats_aggregator.get_metrics(),
+        "request_log_writer": stats_db.log_writer.get_metrics(),
+        "account_availability": multi_account_mgr.availability.get_metrics(),
+        "account_admission": multi_account_mgr.get_admission_metrics(),
+        "jwt_refresh": jwt_pre_refresher.get_metrics(),
+        "session_pool": session_pool.get_metrics(),
+        "session_cache": await multi_account_mgr.session_cache.get_metrics(),
+        "context_replay": replay_stats.get_metrics(),
+        "upload_cache": upload_cache.get_metrics(),
+        "media_executor": media_executor.get_metrics(),
+        "media_index": media_index.get_metrics(),
+        "media_store": media_store.get_metrics(),
+        "media_eviction": media_evictor.get_metrics(),
+    }
+
 @app.get("/admin/accounts")
 @require_login()
 async def admin_get_accounts(request: Request):
@@ -1428,6 +1557,9 @@ async def admin_get_accounts(request: Request):
             "cooldown_reason": cooldown_reason,
             "conversation_count": account_manager.conversation_count,
             "session_usage_count": account_manager.session_usage_count,
+            "in_flight": account_manager.in_flight,
+            "jwt_degraded": account_manager.is_degraded(),
+            "ttfb_ewma_ms": round(account_manager.ttfb_ewma_ms, 1) if account_manager.ttfb_ewma_ms is not None else None,
             "quota_status": quota_status,
             "trial_end": config.trial_end,
             "trial_days_remaining": config.get_trial_days_remaining(),
@@ -1632,6 +1764,7 @@ async def admin_enable_account(request: Request, account_id: str):
         if account_id in multi_account_mgr.accounts:
             account_mgr = multi_account_mgr.accounts[account_id]
             account_mgr.quota_cooldowns = {}
+            multi_account_mgr.refresh_account_availability(account_id)
             logger.info(f"[CONFIG] 账户 {account_id} 冷却状态已重置")
 
             # 立即保存清空的冷却状态到数据库，防止后台任务覆盖
@@ -1655,6 +1788,7 @@ async def admin_bulk_enable_accounts(request: Request, account_ids: list[str]):
         if account_id in multi_account_mgr.accounts:
             account_mgr = multi_account_mgr.accounts[account_id]
             account_mgr.quota_cooldowns = {}
+            multi_account_mgr.refresh_account_availability(account_id)
     return {"status": "success", "success_count": success_count, "errors": errors}
 
 @app.put("/admin/accounts/bulk-disable")
@@ -1708,6 +1842,7 @@ async def admin_get_settings(request: Request):
             "register_default_count": config.basic.register_default_count,
             "register_domain": config.basic.register_domain,
             "image_expire_hours": config.basic.image_expire_hours,
+            "media_max_disk_gb": config.basic.media_max_disk_gb,
         },
         "image_generation": {
             "enabled": config.image_generation.enabled,
@@ -1741,6 +1876,21 @@ async def admin_get_settings(request: Request):
         },
         "session": {
             "expire_hours": config.session.expire_hours
+        },
+        "performance": {
+            "stats_flush_interval_seconds": config.performance.stats_flush_interval_seconds,
+            "request_log_flush_interval_ms": config.performance.request_log_flush_interval_ms,
+            "request_log_batch_size": config.performance.request_log_batch_size,
+            "max_concurrent_streams_per_account": config.performance.max_concurrent_streams_per_account,
+            "account_admission_timeout_seconds": config.performance.account_admission_timeout_seconds,
+            "session_pool_size": config.performance.session_pool_size,
+            "session_pool_ttl_seconds": config.performance.session_pool_ttl_seconds,
+            "session_cache_max_entries": config.performance.session_cache_max_entries,
+            "context_replay_max_chars": config.performance.context_replay_max_chars,
+            "context_replay_keep_last_messages": config.performance.context_replay_keep_last_messages,
+            "upload_concurrency": config.performance.upload_concurrency,
+            "media_workers": config.performance.media_workers,
+            "account_scheduler": config.performance.account_scheduler
         }
     }
 
@@ -1786,6 +1936,7 @@ async def admin_update_settings(request: Request, new_settings: dict = Body(...)
         basic.setdefault("register_default_count", config.basic.register_default_count)
         basic.setdefault("register_domain", config.basic.register_domain)
         basic.setdefault("image_expire_hours", config.basic.image_expire_hours)
+        basic.setdefault("media_max_disk_gb", config.basic.media_max_disk_gb)
         if not isinstance(basic.get("register_domain"), str):
             basic["register_domain"] = ""
         browser_mode_raw = basic.get("browser_mode")
@@ -1837,6 +1988,23 @@ async def admin_update_settings(request: Request, new_settings: dict = Body(...)
         quota_limits.setdefault("videos_daily_limit", config.quota_limits.videos_daily_limit)
         new_settings["quota_limits"] = quota_limits
 
+        # 性能配置
+        performance = dict(new_settings.get("performance") or {})
+        performance.setdefault("stats_flush_interval_seconds", config.performance.stats_flush_interval_seconds)
+        performance.setdefault("request_log_flush_interval_ms", config.performance.request_log_flush_interval_ms)
+        performance.setdefault("request_log_batch_size", config.performance.request_log_batch_size)
+        performance.setdefault("max_concurrent_streams_per_account", config.performance.max_concurrent_streams_per_account)
+        performance.setdefault("account_admission_timeout_seconds", config.performance.account_admission_timeout_seconds)
+        performance.setdefault("session_pool_size", config.performance.session_pool_size)
+        performance.setdefault("session_pool_ttl_seconds", config.performance.session_pool_ttl_seconds)
+        performance.setdefault("session_cache_max_entries", config.performance.session_cache_max_entries)
+        performance.setdefault("context_replay_max_chars", config.performance.context_replay_max_chars)
+        performance.setdefault("context_replay_keep_last_messages", config.performance.context_replay_keep_last_messages)
+        performance.setdefault("upload_concurrency", config.performance.upload_concurrency)
+        performance.setdefault("media_workers", config.performance.media_workers)
+        performance.setdefault("account_scheduler", config.performance.account_scheduler)
+        new_settings["performance"] = performance
+
         # 保存旧配置用于对比
         old_proxy_for_auth = PROXY_FOR_AUTH
         old_proxy_for_chat = PROXY_FOR_CHAT
@@ -1874,6 +2042,17 @@ async def admin_update_settings(request: Request, new_settings: dict = Body(...)
         SESSION_CACHE_TTL_SECONDS = config.retry.session_cache_ttl_seconds
         AUTO_REFRESH_ACCOUNTS_SECONDS = config.retry.auto_refresh_accounts_seconds
         SESSION_EXPIRE_HOURS = config.session.expire_hours
+        stats_aggregator.interval_seconds = config.performance.stats_flush_interval_seconds
+        stats_db.log_writer.flush_interval_ms = config.performance.request_log_flush_interval_ms
+        stats_db.log_writer.batch_size = config.performance.request_log_batch_size
+        multi_account_mgr.set_scheduler(config.performance.account_scheduler)
+        multi_account_mgr.max_streams_per_account = config.performance.max_concurrent_streams_per_account
+        multi_account_mgr.admission_timeout_seconds = config.performance.account_admission_timeout_seconds
+        session_pool.size = config.performance.session_pool_size
+        session_pool.ttl_seconds = config.performance.session_pool_ttl_seconds
+        multi_account_mgr.session_cache.max_entries = config.performance.session_cache_max_entries
+        media_executor.resize(config.performance.media_workers)
+        media_evictor.wake()  # 过期时间/空间上限可能已变化
 
         # 检查是否需要重建 HTTP 客户端（代理变化）
         if old_proxy_for_auth != PROXY_FOR_AUTH or old_proxy_for_chat != PROXY_FOR_CHAT:
@@ -1942,7 +2121,8 @@ async def admin_update_settings(request: Request, new_settings: dict = Body(...)
         if retry_changed:
             logger.info(f"[CONFIG] 重试策略已变化，更新账户管理器配置")
             # 更新所有账户管理器的配置
-            multi_account_mgr.cache_ttl = SESSION_CACHE_TTL_SECONDS
+            multi_account_mgr.session_cache.ttl_seconds = SESSION_CACHE_TTL_SECONDS
+            upload_cache.ttl_seconds = SESSION_CACHE_TTL_SECONDS
             for account_id, account_mgr in multi_account_mgr.accounts.items():
                 account_mgr.apply_retry_policy(RETRY_POLICY)
             if register_service:
@@ -1950,6 +2130,9 @@ async def admin_update_settings(request: Request, new_settings: dict = Body(...)
             if login_service:
                 login_service.retry_policy = RETRY_POLICY
 
+        # 配额上限/冷却时长可能变化，重建可用性索引
+        multi_account_mgr.rebuild_availability_index()
+
         logger.info(f"[CONFIG] 系统设置已更新并实时生效")
         return {"status": "success", "message": "设置已保存并实时生效！"}
     except Exception as e:
@@ -2098,10 +2281,50 @@ async def chat(
     return await chat_impl(req, request, authorization)
 
 # chat实现函数
+class AccountSlot:
+    """请求占用的账户并发槽位（release 可重复调用）"""
+
+    __slots__ = ("account",)
+
+    def __init__(self):
+        self.account: Optional[AccountManager] = None
+
+    def hold(self, account: AccountManager) -> None:
+        self.release()
+        self.account = account
+
+    def release(self) -> None:
+        if self.account is not None:
+            multi_account_mgr.release_account(self.account)
+            self.account = None
+
+
 async def chat_impl(
     req: ChatRequest,
     request: Request,
-    authorization: Optional[str]
+    authorization: Optional[str],
+    attachments: Optional[List[Attachment]] = None,
+):
+    slot = AccountSlot()
+    try:
+        response = await _chat_impl(req, request, authorization, attachments, slot)
+    except BaseException:
+        slot.release()
+        raise
+    if isinstance(response, StreamingResponse):
+        # 客户端在生成器启动前断开时 response_wrapper 的 finally 不会执行，由后台任务兜底归还槽位
+        response.background = BackgroundTask(slot.release)
+    else:
+        slot.release()
+    return response
+
+
+async def _chat_impl(
+    req: ChatRequest,
+    request: Request,
+    authorization: Optional[str],
+    attachments: Optional[List[Attachment]],
+    slot: AccountSlot,
 ):
     # 生成请求ID（最优先，用于所有日志追踪）
     request_id = str(uuid.uuid4())[:6]
@@ -2112,6 +2335,8 @@ async def chat_impl(
 
     monitor_recorded = False
     account_manager: Optional[AccountManager] = None
+    hold_account_slot = slot.hold
+    release_account_slot = slot.release
 
     async def finalize_result(
         status: str,
@@ -2119,6 +2344,7 @@ async def chat_impl(
         error_detail: Optional[str] = None
     ) -> None:
         nonlocal monitor_recorded
+        release_account_slot()
         if monitor_recorded:
             return
         monitor_recorded = True
@@ -2143,14 +2369,11 @@ async def chat_impl(
         )
 
         async with stats_lock:
-            global_stats.setdefault("failure_timestamps", [])
-            global_stats.setdefault("rate_limit_timestamps", [])
             global_stats.setdefault("recent_conversations", [])
             global_stats.setdefault("success_count", 0)
             global_stats.setdefault("failed_count", 0)
             global_stats.setdefault("account_conversations", {})
             global_stats.setdefault("account_failures", {})
-            global_stats.setdefault("response_times", deque(maxlen=10000))
 
             # 记录响应时间（只记录成功的请求）
             if status == "success" and latency_ms is not None:
@@ -2159,39 +2382,38 @@ async def chat_impl(
                 total_ms = int((time.time() - start_ts) * 1000)
                 model_name = req.model if req else "unknown"
 
-                global_stats["response_times"].append({
-                    "timestamp": time.time(),
-                    "ttfb_ms": ttfb_ms,  # 首响时间
-                    "total_ms": total_ms,  # 完成时间
-                    "model": model_name  # 模型名称
-                })
+                # 延迟直方图（按模型 / 账户累计，用于 p50/p90/p99）
+                global_stats["model_latency"].record(model_name, ttfb_ms, total_ms)
+                if account_manager:
+                    global_stats["account_latency"].record(account_manager.config.account_id, ttfb_ms, total_ms)
+                    account_manager.record_ttfb(ttfb_ms)
 
-                # 写入数据库
-                asyncio.create_task(stats_db.insert_request_log(
+                # 写入数据库（入队，后台批量写入）
+                stats_db.record_request_log(
                     timestamp=time.time(),
                     model=model_name,
                     ttfb_ms=ttfb_ms,
                     total_ms=total_ms,
                     status=status,
                     status_code=status_code
-                ))
+                )
             elif status != "success":
                 # 失败请求也记录到数据库
                 model_name = req.model if req else "unknown"
-                asyncio.create_task(stats_db.insert_request_log(
+                stats_db.record_request_log(
                     timestamp=time.time(),
                     model=model_name,
                     ttfb_ms=None,
                     total_ms=None,
                     status=status,
                     status_code=status_code
-                ))
+                )
 
             if status != "success":
                 global_stats["failed_count"] += 1
-                global_stats["failure_timestamps"].append(time.time())
+                global_stats["failure_series"].add()
                 if status_code == 429:
-                    global_stats["rate_limit_timestamps"].append(time.time())
+                    global_stats["rate_limit_series"].add()
                 failure_account_id = None
                 if account_manager:
                     account_manager.failure_count += 1
@@ -2213,7 +2435,7 @@ async def chat_impl(
                     global_stats["account_conversations"][account_manager.config.account_id] = account_manager.conversation_count
             global_stats["recent_conversations"].append(entry)
             global_stats["recent_conversations"] = global_stats["recent_conversations"][-60:]
-            await save_stats(global_stats)
+            stats_aggregator.mark_dirty()
 
     def classify_error_status(status_code: Optional[int], error: Exception) -> str:
         if status_code == 504:
@@ -2234,10 +2456,9 @@ async def chat_impl(
     async with stats_lock:
         timestamp = time.time()
         global_stats["total_requests"] += 1
-        global_stats["request_timestamps"].append(timestamp)
-        global_stats.setdefault("model_request_timestamps", {})
-        global_stats["model_request_timestamps"].setdefault(req.model, []).append(timestamp)
-        await save_stats(global_stats)
+        global_stats["request_series"].add(timestamp)
+        global_stats["model_request_series"].add(req.model, timestamp)
+        stats_aggregator.mark_dirty()
 
     # 2. 模型校验
 
@@ -2256,18 +2477,46 @@ async def chat_impl(
     required_quota_types = get_required_quota_types(req.model)
 
     # 3. 生成会话指纹，获取Session锁（防止同一对话的并发请求冲突）
-    conv_key = get_conversation_key([m.model_dump() for m in req.messages], client_ip)
+    conv_key = get_conversation_key(req.messages, client_ip)
     session_lock = await multi_account_mgr.acquire_session_lock(conv_key)
 
-    # 4. 在锁的保护下检查缓存和处理Session（保证同一对话的请求串行化）
+    # 4. 在拿 Session 锁之前先占好账户槽位：排队等待发生在锁外，
+    #    避免同一对话的后续请求堵在锁上、绕开准入队列的 FIFO 顺序
+    peeked_session = await multi_account_mgr.get_session_cache(conv_key)
+    bound_account_id = peeked_session["account_id"] if peeked_session else None
+    bound_error: Optional[HTTPException] = None
+    fresh_error: Optional[HTTPException] = None
+    if bound_account_id is not None:
+        try:
+            hold_account_slot(
+                await multi_account_mgr.get_account(bound_account_id, request_id, required_quota_types)
+            )
+        except HTTPException as e:
+            bound_error = e
+    if slot.account is None:
+        # 新对话，或绑定账户不可用（锁内会解除绑定）：预占一个新账户
+        try:
+            hold_account_slot(await multi_account_mgr.get_account(None, request_id, required_quota_types))
+        except HTTPException as e:
+            fresh_error = e
+
+    # 5. 在锁的保护下检查缓存和处理Session（保证同一对话的请求串行化）
     async with session_lock:
-        cached_session = multi_account_mgr.global_session_cache.get(conv_key)
+        cached_session = await multi_account_mgr.get_session_cache(conv_key)
 
         if cached_session:
             # 使用已绑定的账户
             account_id = cached_session["account_id"]
             try:
-                account_manager = await multi_account_mgr.get_account(account_id, request_id, required_quota_types)
+                if account_id == bound_account_id and bound_error is not None:
+                    raise bound_error
+                if slot.account is not None and slot.account.config.account_id == account_id:
+                    account_manager = slot.account
+                else:
+                    # 锁外预占之后绑定被其他请求改写（少见），按新绑定重新获取
+                    release_account_slot()
+                    account_manager = await multi_account_mgr.get_account(account_id, request_id, required_quota_types)
+                    hold_account_slot(account_manager)
                 google_session = cached_session["session_id"]
                 is_new_conversation = False
                 request.state.last_account_id = account_manager.config.account_id
@@ -2276,19 +2525,28 @@ async def chat_impl(
                 logger.warning(
                     f"[CHAT] [req_{request_id}] 缓存会话账户不可用，切换新账户: {account_id} ({str(e.detail)})"
                 )
-                multi_account_mgr.global_session_cache.pop(conv_key, None)
+                await multi_account_mgr.delete_session_cache(conv_key)
+                upload_cache.invalidate_session(cached_session["session_id"])
                 cached_session = None
 
         if not cached_session:
             # 新对话：尝试创建会话（遇到错误就切换账户）
-            available_accounts = multi_account_mgr.get_available_accounts(required_quota_types)
-            max_retries = min(MAX_ACCOUNT_SWITCH_TRIES, len(available_accounts))
+            available_count = multi_account_mgr.count_available_accounts(required_quota_types)
+            max_retries = min(MAX_ACCOUNT_SWITCH_TRIES, available_count)
             last_error = None
 
             for retry_idx in range(max_retries):
                 try:
-                    account_manager = await multi_account_mgr.get_account(None, request_id, required_quota_types)
-                    google_session = await create_google_session(account_manager, http_client, USER_AGENT, request_id)
+                    if retry_idx == 0 and slot.account is not None:
+                        # 首次尝试直接使用锁外预占的账户
+                        account_manager = slot.account
+                    elif retry_idx == 0 and fresh_error is not None:
+                        raise fresh_error
+                    else:
+                        release_account_slot()
+                        account_manager = await multi_account_mgr.get_account(None, request_id, required_quota_types)
+                        hold_account_slot(account_manager)
+                    google_session = await session_pool.acquire(account_manager, request_id)
                     # 线程安全地绑定账户到此对话
                     await multi_account_mgr.set_session_cache(
                         conv_key,
@@ -2350,6 +2608,9 @@ async def chat_impl(
     # 3. 解析请求内容
     try:
         last_text, current_images = await parse_last_message(req.messages, http_client, request_id)
+        if attachments:
+            # 内部调用直接传入的附件（原始字节，上传时才编码）排在消息内附件之前
+            current_images = list(attachments) + current_images
     except HTTPException as e:
         status = classify_error_status(e.status_code, e)
         await finalize_result(status, e.status_code, f"HTTP {e.status_code}: {e.detail}")
@@ -2378,137 +2639,154 @@ async def chat_impl(
     async def response_wrapper():
         nonlocal account_manager  # 允许修改外层的 account_manager
 
-        # 单层重试循环：遇到错误就切换账户
-        available_accounts = multi_account_mgr.get_available_accounts(required_quota_types)
-        max_retries = min(MAX_ACCOUNT_SWITCH_TRIES, len(available_accounts))
-
-        current_text = text_to_send
-        current_retry_mode = is_retry_mode
-        current_file_ids = []
-
-        for retry_idx in range(max_retries):
-            try:
-                # 获取或创建 Session
-                cached = multi_account_mgr.global_session_cache.get(conv_key)
-                if not cached:
-                    logger.warning(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 缓存已清理，重建Session")
-                    new_sess = await create_google_session(account_manager, http_client, USER_AGENT, request_id)
-                    await multi_account_mgr.set_session_cache(
-                        conv_key,
-                        account_manager.config.account_id,
-                        new_sess
-                    )
-                    current_session = new_sess
-                    current_retry_mode = True
-                    current_file_ids = []
-                else:
-                    current_session = cached["session_id"]
-
-                # 上传图片（如果需要）
-                if current_images and not current_file_ids:
-                    for img in current_images:
-                        fid = await upload_context_file(current_session, img["mime"], img["data"], account_manager, http_client, USER_AGENT, request_id)
-                        current_file_ids.append(fid)
-
-                # 准备文本（重试模式下发全文）
-                if current_retry_mode:
-                    current_text = build_full_context_text(req.messages)
-
-                # 发起对话
-                async for chunk in stream_chat_generator(
-                    current_session,
-                    current_text,
-                    current_file_ids,
-                    req.model,
-                    chat_id,
-                    created_time,
-                    account_manager,
-                    req.stream,
-                    request_id,
-                    request
-                ):
-                    yield chunk
-
-                if getattr(request.state, "first_response_time", None) is None:
-                    # 空响应应该触发重试逻辑
-                    raise HTTPException(status_code=502, detail="Empty response from upstream")
-
-                # 请求成功（conversation_count 已在生成器内统计）
-                uptime_tracker.record_request("account_pool", True)
-                await finalize_result("success", 200, None)
-                break
-
-            except (httpx.HTTPError, ssl.SSLError, HTTPException) as e:
-                # 提取错误信息
-                is_http_exception = isinstance(e, HTTPException)
-                status_code = e.status_code if is_http_exception else None
-                error_detail = (
-                    f"HTTP {e.status_code}: {e.detail}"
-                    if is_http_exception
-                    else f"{type(e).__name__}: {str(e)[:200]}"
-                )
-
-                # 记录账号池状态（请求失败）
-                uptime_tracker.record_request("account_pool", False, status_code=status_code)
+        try:
+            # 单层重试循环：遇到错误就切换账户
+            available_count = multi_account_mgr.count_available_accounts(required_quota_types)
+            max_retries = min(MAX_ACCOUNT_SWITCH_TRIES, available_count)
 
-                # 判断请求类型以传递 quota_type
-                quota_type = get_request_quota_type(req.model)
+            current_text = text_to_send
+            current_retry_mode = is_retry_mode
+            current_file_ids = []
 
-                # 使用统一的错误处理入口
-                # 注意：502 空响应错误不触发冷却，只切换账户重试
-                if is_http_exception:
-                    if status_code == 502:
-                        logger.warning(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 上游 502 错误，切换账户重试（不触发冷却）")
+            for retry_idx in range(max_retries):
+                try:
+                    # 获取或创建 Session
+                    cached = await multi_account_mgr.get_session_cache(conv_key)
+                    if not cached:
+                        logger.warning(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 缓存已清理，重建Session")
+                        new_sess = await session_pool.acquire(account_manager, request_id)
+                        await multi_account_mgr.set_session_cache(
+                            conv_key,
+                            account_manager.config.account_id,
+                            new_sess
+                        )
+                        current_session = new_sess
+                        current_retry_mode = True
+                        current_file_ids = []
                     else:
-                        account_manager.handle_http_error(status_code, str(e.detail) if hasattr(e, 'detail') else "", request_id, quota_type)
-                else:
-                    account_manager.handle_non_http_error("聊天请求", request_id, quota_type)
+                        current_session = cached["session_id"]
+
+                    # 上传图片（如果需要）
+                    if current_images and not current_file_ids:
+                        current_file_ids = await upload_context_files(
+                            current_session,
+                            current_images,
+                            account_manager,
+                            http_client,
+                            USER_AGENT,
+                            request_id,
+                            max_concurrency=config.performance.upload_concurrency,
+                            upload_cache=upload_cache,
+                        )
 
-                # 检查是否还能继续重试
-                if retry_idx < max_retries - 1:
-                    logger.warning(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 切换账户重试 ({retry_idx + 1}/{max_retries})")
+                    # 准备文本（重试模式下发全文）
+                    if current_retry_mode:
+                        current_text = build_full_context_text(
+                            req.messages,
+                            config.performance.context_replay_max_chars,
+                            config.performance.context_replay_keep_last_messages,
+                        )
 
-                    # 尝试切换到其他账户
-                    try:
-                        new_account = await multi_account_mgr.get_account(None, request_id, required_quota_types)
-                        logger.info(f"[CHAT] [req_{request_id}] 切换账户: {account_manager.config.account_id} -> {new_account.config.account_id}")
+                    # 发起对话
+                    async for chunk in stream_chat_generator(
+                        current_session,
+                        current_text,
+                        current_file_ids,
+                        req.model,
+                        chat_id,
+                        created_time,
+                        account_manager,
+                        req.stream,
+                        request_id,
+                        request
+                    ):
+                        yield chunk
+
+                    if getattr(request.state, "first_response_time", None) is None:
+                        # 空响应应该触发重试逻辑
+                        raise HTTPException(status_code=502, detail="Empty response from upstream")
+
+                    # 请求成功（conversation_count 已在生成器内统计）
+                    uptime_tracker.record_request("account_pool", True)
+                    await finalize_result("success", 200, None)
+                    break
 
-                        # 创建新 Session
-                        new_sess = await create_google_session(new_account, http_client, USER_AGENT, request_id)
+                except (httpx.HTTPError, ssl.SSLError, HTTPException) as e:
+                    # 提取错误信息
+                    is_http_exception = isinstance(e, HTTPException)
+                    status_code = e.status_code if is_http_exception else None
+                    error_detail = (
+                        f"HTTP {e.status_code}: {e.detail}"
+                        if is_http_exception
+                        else f"{type(e).__name__}: {str(e)[:200]}"
+                    )
 
-                        # 更新缓存绑定到新账户
-                        await multi_account_mgr.set_session_cache(
-                            conv_key,
-                            new_account.config.account_id,
-                            new_sess
-                        )
+                    # 记录账号池状态（请求失败）
+                    uptime_tracker.record_request("account_pool", False, status_code=status_code)
 
-                        # 更新账户管理器
-                        account_manager = new_account
-                        request.state.last_account_id = account_manager.config.account_id
+                    # 判断请求类型以传递 quota_type
+                    quota_type = get_request_quota_type(req.model)
 
-                        # 设置重试模式（发送完整上下文）
-                        current_retry_mode = True
-                        current_file_ids = []  # 清空 ID，强制重新上传到新 Session
-
-                    except Exception as create_err:
-                        error_type = type(create_err).__name__
-                        logger.error(f"[CHAT] [req_{request_id}] 账户切换失败 ({error_type}): {str(create_err)}")
-                        # 记录账号池状态（账户切换失败）
-                        status_code = create_err.status_code if isinstance(create_err, HTTPException) else None
-                        uptime_tracker.record_request("account_pool", False, status_code=status_code)
-
-                        status = classify_error_status(status_code, create_err)
-                        await finalize_result(status, status_code, f"Account Failover Failed: {str(create_err)[:200]}")
-                        if req.stream: yield f"data: {json.dumps({'error': {'message': 'Account Failover Failed'}})}\n\n"
+                    # 使用统一的错误处理入口
+                    # 注意：502 空响应错误不触发冷却，只切换账户重试
+                    if is_http_exception:
+                        if status_code == 502:
+                            logger.warning(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 上游 502 错误，切换账户重试（不触发冷却）")
+                        else:
+                            account_manager.handle_http_error(status_code, str(e.detail) if hasattr(e, 'detail') else "", request_id, quota_type)
+                    else:
+                        account_manager.handle_non_http_error("聊天请求", request_id, quota_type)
+
+                    # 检查是否还能继续重试
+                    if retry_idx < max_retries - 1:
+                        logger.warning(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 切换账户重试 ({retry_idx + 1}/{max_retries})")
+
+                        # 尝试切换到其他账户（先释放当前账户的并发槽位）
+                        release_account_slot()
+                        try:
+                            new_account = await multi_account_mgr.get_account(None, request_id, required_quota_types)
+                            hold_account_slot(new_account)
+                            logger.info(f"[CHAT] [req_{request_id}] 切换账户: {account_manager.config.account_id} -> {new_account.config.account_id}")
+
+                            # 创建新 Session
+                            new_sess = await session_pool.acquire(new_account, request_id)
+
+                            # 更新缓存绑定到新账户
+                            await multi_account_mgr.set_session_cache(
+                                conv_key,
+                                new_account.config.account_id,
+                                new_sess
+                            )
+
+                            # 更新账户管理器
+                            account_manager = new_account
+                            request.state.last_account_id = account_manager.config.account_id
+
+                            # 设置重试模式（发送完整上下文）
+                            current_retry_mode = True
+                            current_file_ids = []  # 清空 ID，强制重新上传到新 Session
+
+                        except Exception as create_err:
+                            error_type = type(create_err).__name__
+                            logger.error(f"[CHAT] [req_{request_id}] 账户切换失败 ({error_type}): {str(create_err)}")
+                            # 记录账号池状态（账户切换失败）
+                            status_code = create_err.status_code if isinstance(create_err, HTTPException) else None
+                            uptime_tracker.record_request("account_pool", False, status_code=status_code)
+
+                            status = classify_error_status(status_code, create_err)
+                            await finalize_result(status, status_code, f"Account Failover Failed: {str(create_err)[:200]}")
+                            if req.stream: yield f"data: {json.dumps({'error': {'message': 'Account Failover Failed'}})}\n\n"
+                            return
+                    else:
+                        # 已达到最大重试次数
+                        logger.error(f"[CHAT] [req_{request_id}] 已达到最大重试次数 ({max_retries})，请求失败")
+                        status = classify_error_status(status_code, e)
+                        await finalize_result(status, status_code, error_detail)
+                        if req.stream: yield f"data: {json.dumps({'error': {'message': f'Max retries ({max_retries}) exceeded: {error_detail}'}})}\n\n"
                         return
-                else:
-                    # 已达到最大重试次数
-                    logger.error(f"[CHAT] [req_{request_id}] 已达到最大重试次数 ({max_retries})，请求失败")
-                    status = classify_error_status(status_code, e)
-                    await finalize_result(status, status_code, error_detail)
-                    if req.stream: yield f"data: {json.dumps({'error': {'message': f'Max retries ({max_retries}) exceeded: {error_detail}'}})}\n\n"
-                    return
+        finally:
+            # 客户端断开或生成器提前结束时也要归还并发槽位
+            release_account_slot()
 
     if req.stream:
         return StreamingResponse(response_wrapper(), media_type="text/event-stream")
@@ -2529,6 +2807,7 @@ async def chat_impl(
                 logger.error(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] JSON解析失败: {str(e)}")
             except (KeyError, IndexError) as e:
                 logger.error(f"[CHAT] [{account_manager.config.account_id}] [req_{request_id}] 响应格式错误 ({type(e).__name__}): {str(e)}")
+    release_account_slot()
 
     # 构建响应消息
     message = {"role": "assistant", "content": full_content}
@@ -2615,7 +2894,7 @@ async def generate_images(
                     try:
                         resp = await http_client.get(url)
                         if resp.status_code == 200:
-                            b64_data = base64.b64encode(resp.content).decode()
+                            b64_data = await media_executor.run("encode", lambda data=resp.content: base64.b64encode(data).decode())
                             data_list.append({"b64_json": b64_data, "revised_prompt": req.prompt})
                     except Exception as e:
                         logger.error(f"[IMAGE-GEN] [req_{request_id}] 下载图片失败: {url}, {str(e)}")
@@ -2630,9 +2909,9 @@ async def generate_images(
                 chat_id = f"img-{uuid.uuid4()}"
                 for idx, (mime, b64_data) in enumerate(b64_matches[:req.n], 1):
                     try:
-                        img_data = base64.b64decode(b64_data)
+                        img_data = await media_executor.run("decode", base64.b64decode, b64_data)
                         file_id = f"gen-{uuid.uuid4()}"
-                        url = save_image_to_hf(img_data, chat_id, file_id, mime, base_url, IMAGE_DIR)
+                        url = await media_executor.run("write", save_image_to_hf, img_data, chat_id, file_id, mime, base_url)
                         data_list.append({"url": url, "revised_prompt": req.prompt})
                     except Exception as e:
                         logger.error(f"[IMAGE-GEN] [req_{request_id}] 保存图片失败: {str(e)}")
@@ -2670,44 +2949,37 @@ async def edit_images(
     request_id = str(uuid.uuid4())[:6]
 
     try:
-        # 读取上传的图片
+        # 读取上传的图片（保留原始字节，上传到上游时才做一次 base64 编码）
         image_bytes = await image.read()
-        image_b64 = base64.b64encode(image_bytes).decode()
         mime_type = image.content_type or "image/png"
-        data_uri = f"data:{mime_type};base64,{image_b64}"
+        attachments = [Attachment(mime=mime_type, raw=image_bytes)]
 
         logger.info(
             f"[IMAGE-EDIT] [req_{request_id}] 收到图片编辑请求: "
             f"model={model}, image_size={len(image_bytes)} bytes, "
             f"mime={mime_type}, prompt={prompt[:100]}"
         )
+        del image_bytes
 
-        # 构造多模态消息内容（图片 + 文本）
-        content_parts = [
-            {"type": "image_url", "image_url": {"url": data_uri}},
-            {"type": "text", "text": prompt},
-        ]
-
-        # 如果有 mask，也加入消息
+        # 如果有 mask，也作为附件上传
         if mask:
             mask_bytes = await mask.read()
-            mask_b64 = base64.b64encode(mask_bytes).decode()
             mask_mime = mask.content_type or "image/png"
-            mask_uri = f"data:{mask_mime};base64,{mask_b64}"
-            content_parts.insert(1, {"type": "image_url", "image_url": {"url": mask_uri}})
+            attachments.append(Attachment(mime=mask_mime, raw=mask_bytes))
             logger.info(f"[IMAGE-EDIT] [req_{request_id}] 包含遮罩图片: {len(mask_bytes)} bytes")
+            del mask_bytes
 
-        # 构造 ChatRequest
+        # 构造 ChatRequest（图片通过 attachments 传入，不再拼成 Data URI 再解析）
         chat_req = ChatRequest(
             model=model,
             messages=[
-                Message(role="user", content=content_parts)
+                Message(role="user", content=[{"type": "text", "text": prompt}])
             ],
             stream=False  # 图片编辑不支持流式
         )
 
         # 调用 chat_impl 获取响应
-        chat_response = await chat_impl(chat_req, request, authorization)
+        chat_response = await chat_impl(chat_req, request, authorization, attachments=attachments)
 
         # 从响应中提取图片（复用 /v1/images/generations 的逻辑）
         message_content = chat_response["choices"][0]["message"]["content"]
@@ -2736,7 +3008,7 @@ async def edit_images(
                     try:
                         resp = await http_client.get(url)
                         if resp.status_code == 200:
-                            b64_data = base64.b64encode(resp.content).decode()
+                            b64_data = await media_executor.run("encode", lambda data=resp.content: base64.b64encode(data).decode())
                             data_list.append({"b64_json": b64_data, "revised_prompt": prompt})
                     except Exception as e:
                         logger.error(f"[IMAGE-EDIT] [req_{request_id}] 下载图片失败: {url}, {str(e)}")
@@ -2749,9 +3021,9 @@ async def edit_images(
                 chat_id = f"img-edit-{uuid.uuid4()}"
                 for idx, (mime, b64_data) in enumerate(b64_matches[:n], 1):
                     try:
-                        img_data = base64.b64decode(b64_data)
+                        img_data = await media_executor.run("decode", base64.b64decode, b64_data)
                         file_id = f"edit-{uuid.uuid4()}"
-                        url = save_image_to_hf(img_data, chat_id, file_id, mime, base_url, IMAGE_DIR)
+                        url = await media_executor.run("write", save_image_to_hf, img_data, chat_id, file_id, mime, base_url)
                         data_list.append({"url": url, "revised_prompt": prompt})
                     except Exception as e:
                         logger.error(f"[IMAGE-EDIT] [req_{request_id}] 保存图片失败: {str(e)}")
@@ -2874,7 +3146,11 @@ async def stream_chat_generator(session: str, text_content: str, file_ids: List[
         # 使用异步解析器处理 JSON 数组流
         try:
             response_count = 0
-            async for json_obj in parse_json_array_stream_async(r.aiter_lines()):
+            if STREAM_PARSER_ENGINE == "legacy":
+                json_stream = parse_json_array_stream_async(r.aiter_lines())
+            else:
+                json_stream = parse_json_array_stream_chunks_async(r.aiter_bytes())
+            async for json_obj in json_stream:
                 response_count += 1
                 json_objects.append(json_obj)  # 收集响应
 
@@ -3041,46 +3317,55 @@ async def stream_chat_generator(session: str, text_content: str, file_ids: List[
                 # 优先使用 metadata 中的 MIME 类型
                 mime = meta.get("mimeType", mime)
                 correct_session = meta.get("session") or session_name
-                task = download_image_with_jwt(account_manager, correct_session, fid, http_client, USER_AGENT, request_id)
+                task = download_media_to_file(
+                    account_manager, correct_session, fid, http_client, USER_AGENT, media_dir_for(mime), request_id
+                )
                 download_tasks.append((fid, mime, task))
 
             results = await asyncio.gather(*[task for _, _, task in download_tasks], return_exceptions=True)
 
-            # 处理下载结果
-            success_count = 0
-            for idx, ((fid, mime, _), result) in enumerate(zip(download_tasks, results), 1):
-                if isinstance(result, Exception):
-                    logger.error(f"[IMAGE] [{account_manager.config.account_id}] [req_{request_id}] 图片{idx}下载失败: {type(result).__name__}: {str(result)[:100]}")
-                    # 降级处理：返回错误提示而不是静默失败
-                    error_msg = f"\n\n⚠️ 图片 {idx} 下载失败\n\n"
-                    if first_response_time is None:
-                        first_response_time = time.time()
-                        if request is not None:
-                            request.state.first_response_time = first_response_time
-                    chunk = create_chunk(chat_id, created_time, model_name, {"content": error_msg}, None)
-                    yield f"data: {chunk}\n\n"
-                    continue
+            try:
+                # 处理下载结果
+                success_count = 0
+                for idx, ((fid, mime, _), result) in enumerate(zip(download_tasks, results), 1):
+                    if isinstance(result, Exception):
+                        logger.error(f"[IMAGE] [{account_manager.config.account_id}] [req_{request_id}] 图片{idx}下载失败: {type(result).__name__}: {str(result)[:100]}")
+                        # 降级处理：返回错误提示而不是静默失败
+                        error_msg = f"\n\n⚠️ 图片 {idx} 下载失败\n\n"
+                        if first_response_time is None:
+                            first_response_time = time.time()
+                            if request is not None:
+                                request.state.first_response_time = first_response_time
+                        chunk = create_chunk(chat_id, created_time, model_name, {"content": error_msg}, None)
+                        yield f"data: {chunk}\n\n"
+                        continue
 
-                try:
-                    markdown = process_media(result, mime, chat_id, fid, base_url, idx, request_id, account_manager.config.account_id)
-                    success_count += 1
-                    if first_response_time is None:
-                        first_response_time = time.time()
-                        if request is not None:
-                            request.state.first_response_time = first_response_time
-                    chunk = create_chunk(chat_id, created_time, model_name, {"content": markdown}, None)
-                    yield f"data: {chunk}\n\n"
-                except Exception as save_error:
-                    logger.error(f"[MEDIA] [{account_manager.config.account_id}] [req_{request_id}] 媒体{idx}处理失败: {str(save_error)[:100]}")
-                    error_msg = f"\n\n⚠️ 媒体 {idx} 处理失败\n\n"
-                    if first_response_time is None:
-                        first_response_time = time.time()
-                        if request is not None:
-                            request.state.first_response_time = first_response_time
-                    chunk = create_chunk(chat_id, created_time, model_name, {"content": error_msg}, None)
-                    yield f"data: {chunk}\n\n"
+                    temp_path, _ = result
+                    try:
+                        async for markdown in process_media(temp_path, mime, chat_id, fid, base_url, idx, request_id, account_manager.config.account_id):
+                            if first_response_time is None:
+                                first_response_time = time.time()
+                                if request is not None:
+                                    request.state.first_response_time = first_response_time
+                            chunk = create_chunk(chat_id, created_time, model_name, {"content": markdown}, None)
+                            yield f"data: {chunk}\n\n"
+                        success_count += 1
+                    except Exception as save_error:
+                        logger.error(f"[MEDIA] [{account_manager.config.account_id}] [req_{request_id}] 媒体{idx}处理失败: {str(save_error)[:100]}")
+                        error_msg = f"\n\n⚠️ 媒体 {idx} 处理失败\n\n"
+                        if first_response_time is None:
+                            first_response_time = time.time()
+                            if request is not None:
+                                request.state.first_response_time = first_response_time
+                        chunk = create_chunk(chat_id, created_time, model_name, {"content": error_msg}, None)
+                        yield f"data: {chunk}\n\n"
 
-            logger.info(f"[IMAGE] [{account_manager.config.account_id}] [req_{request_id}] 图片处理完成: {success_count}/{len(file_ids)} 成功")
+                logger.info(f"[IMAGE] [{account_manager.config.account_id}] [req_{request_id}] 图片处理完成: {success_count}/{len(file_ids)} 成功")
+            finally:
+                # 客户端断开等情况下，未处理完的临时文件在这里清理（已重命名/已删除的跳过）
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await media_executor.run("remove", remove_media_file, result[0])
 
         except Exception as e:
             logger.error(f"[IMAGE] [{account_manager.config.account_id}] [req_{request_id}] 图片处理失败: {type(e).__name__}: {str(e)[:100]}")
@@ -3132,19 +3417,8 @@ async def get_public_uptime(days: int = 90):
 async def get_public_stats():
     """获取公开统计信息"""
     async with stats_lock:
-        # 清理1小时前的请求时间戳
-        current_time = time.time()
-        recent_requests = [
-            ts for ts in global_stats["request_timestamps"]
-            if current_time - ts < 3600
-        ]
-
-        # 计算每分钟请求数
-        recent_minute = [
-            ts for ts in recent_requests
-            if current_time - ts < 60
-        ]
-        requests_per_minute = len(recent_minute)
+        # 计算每分钟请求数（分桶计数，O(桶数)）
+        requests_per_minute = global_stats["request_series"].count_last(60)
 
         # 计算负载状态
         if requests_per_minute < 10:
@@ -3195,7 +3469,7 @@ async def get_public_logs(request: Request, limit: int = 100):
                 global_stats["total_visitors"] = global_stats.get("total_visitors", 0) + 1
 
             global_stats.setdefault("recent_conversations", [])
-            await save_stats(global_stats)
+            stats_aggregator.mark_dirty()
 
             stored_logs = list(global_stats.get("recent_conversations", []))
 
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+请求统计汇总表回填脚本
+
+用途：根据 request_logs 原始记录重建小时/天汇总表和延迟直方图
+（request_rollups_hourly / request_rollups_daily / request_latency_histograms）。
+升级后首次部署时执行一次，让看板能看到升级前的历史数据。
+
+使用方法：
+    python scripts/backfill_rollups.py
+    python scripts/backfill_rollups.py --batch-size 20000
+
+注意：
+    - 脚本会先清空汇总表再从原始记录全量重建，可重复执行
+    - 建议在服务停止时执行；服务运行中新写入的记录可能被重复或遗漏统计
+
+支持的数据库：
+    - PostgreSQL：配置 DATABASE_URL 环境变量
+    - SQLite：不配置 DATABASE_URL，自动使用 data/data.db
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from core import storage  # noqa: E402
+from core.database import build_rollup_deltas  # noqa: E402
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="根据 request_logs 重建汇总表")
+    parser.add_argument("--batch-size", type=int, default=10000, help="每批读取的原始记录条数")
+    args = parser.parse_args()
+
+    if not storage.is_database_enabled():
+        print("[ERROR] 未配置数据库")
+        return False
+
+    print("=" * 60)
+    print("回填请求统计汇总表")
+    print("=" * 60)
+
+    start = time.time()
+    storage.clear_request_rollups_sync()
+    print("[OK] 已清空汇总表")
+
+    last_id = 0
+    processed = 0
+    while True:
+        page = storage.load_request_logs_after_id_sync(last_id, args.batch_size)
+        if not page:
+            break
+        last_id = page[-1][0]
+        rows = [row[1:] for row in page]
+        if not storage.apply_request_rollups_sync(build_rollup_deltas(rows)):
+            print(f"[ERROR] 写入汇总失败（id <= {last_id}）")
+            return False
+        processed += len(rows)
+        print(f"  已处理 {processed} 条记录 (id <= {last_id})")
+
+    print(f"[OK] 回填完成: {processed} 条记录，耗时 {time.time() - start:.1f}s")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Benchmark account selection cost with many accounts.
+
+Compares three paths:
+  legacy   linear scan over every account, re-parsing ``expires_at`` with ``strptime``
+  scan     linear scan using the cached epoch expiry
+  indexed  current get_account() (cached expiry + availability index)
+
+Usage:
+  python scripts/bench_account_selection.py
+  python scripts/bench_account_selection.py --accounts 10000 --iterations 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.account import (  # noqa: E402
+    AccountConfig,
+    CooldownConfig,
+    MultiAccountManager,
+    RetryPolicy,
+)
+
+BEIJING_TZ = timezone(timedelta(hours=8))
+
+
+def _legacy_is_expired(config: AccountConfig) -> bool:
+    """Pre-change AccountConfig.is_expired(): strptime on every call."""
+    if not config.expires_at:
+        return False
+    try:
+        expire_time = datetime.strptime(config.expires_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=BEIJING_TZ)
+        return (expire_time - datetime.now(BEIJING_TZ)).total_seconds() / 3600 <= 0
+    except Exception:
+        return False
+
+
+def _scan_select(manager: MultiAccountManager, quota_types: list[str], counter: int, is_expired):
+    """Pre-index get_available_accounts() + round-robin pick."""
+    available = [
+        acc for acc in manager.accounts.values()
+        if not acc.config.disabled
+        and not is_expired(acc.config)
+        and acc.are_quotas_available(quota_types)
+    ]
+    return available[counter % len(available)]
+
+
+def build_manager(count: int, seed: int) -> MultiAccountManager:
+    rng = random.Random(seed)
+    retry_policy = RetryPolicy(cooldowns=CooldownConfig(text=7200, images=14400, videos=14400))
+    manager = MultiAccountManager(session_cache_ttl_seconds=3600)
+    now = datetime.now(BEIJING_TZ)
+    for i in range(count):
+        expires = now + timedelta(hours=rng.uniform(-24, 24 * 30))
+        config = AccountConfig(
+            account_id=f"account_{i}",
+            secure_c_ses="x",
+            host_c_oses=None,
+            csesidx=str(i),
+            config_id="bench",
+            expires_at=expires.strftime("%Y-%m-%d %H:%M:%S"),
+            disabled=rng.random() < 0.05,
+        )
+        manager.add_account(config, None, "bench", retry_policy, {})
+        if rng.random() < 0.1:
+            manager.accounts[config.account_id].handle_http_error(429, quota_type=rng.choice(["text", "images"]))
+    return manager
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=10000, help="number of accounts")
+    parser.add_argument("--iterations", type=int, default=200, help="selections per case")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    manager = build_manager(args.accounts, args.seed)
+    quota_types = ["text"]
+    print(f"accounts={args.accounts} available={manager.count_available_accounts(quota_types)} "
+          f"iterations={args.iterations}")
+
+    def run_scan(is_expired) -> None:
+        for i in range(args.iterations):
+            _scan_select(manager, quota_types, i, is_expired)
+
+    async def run_indexed() -> None:
+        for _ in range(args.iterations):
+            account = await manager.get_account(required_quota_types=quota_types)
+            manager.release_account(account)
+
+    cases = [
+        ("legacy", lambda: run_scan(_legacy_is_expired)),
+        ("scan", lambda: run_scan(AccountConfig.is_expired)),
+        ("indexed", lambda: asyncio.run(run_indexed())),
+    ]
+    print(f"{'path':>10} {'total(s)':>10} {'per call(us)':>14} {'speedup':>9}")
+    baseline = None
+    for label, runner in cases:
+        start = time.perf_counter()
+        runner()
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        per_call = elapsed / args.iterations * 1e6
+        print(f"{label:>10} {elapsed:>10.4f} {per_call:>14.1f} {baseline / elapsed:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
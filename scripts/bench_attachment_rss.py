@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Measure peak RSS of preparing an /v1/images/edits upload.
+
+Each path runs in a fresh subprocess so ru_maxrss reflects only that path:
+  legacy   b64encode -> data URI -> regex parse -> json body (json.dumps)
+  current  Attachment(raw) -> one b64encode -> fileContents spliced into the body
+
+Usage:
+  python scripts/bench_attachment_rss.py
+  python scripts/bench_attachment_rss.py --size-mb 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _body_fields() -> dict:
+    return {
+        "configId": "config",
+        "additionalParams": {"token": "-"},
+        "addContextFileRequest": {"name": "sessions/x", "fileName": "upload.png", "mimeType": "image/png"},
+    }
+
+
+def _run_legacy(image_bytes: bytes) -> int:
+    import base64
+    import re
+
+    image_b64 = base64.b64encode(image_bytes).decode()
+    data_uri = f"data:image/png;base64,{image_b64}"
+    content_parts = [{"type": "image_url", "image_url": {"url": data_uri}}, {"type": "text", "text": "edit"}]
+    match = re.match(r"data:([^;]+);base64,(.+)", content_parts[0]["image_url"]["url"])
+    body = _body_fields()
+    body["addContextFileRequest"]["fileContents"] = match.group(2)
+    payload = json.dumps(body).encode()  # what httpx does for json=
+    return len(payload)
+
+
+def _run_current(image_bytes: bytes) -> int:
+    from core.message import Attachment
+
+    attachment = Attachment(mime="image/png", raw=image_bytes)
+    del image_bytes
+    body_json = json.dumps(_body_fields(), separators=(",", ":")).encode()
+    payload = b"".join((body_json[:-2], b',"fileContents":"', attachment.base64_bytes(), b'"}}'))
+    return len(payload)
+
+
+def _child(mode: str, size_mb: int) -> None:
+    baseline = _peak_rss_mb()
+    image_bytes = os.urandom(size_mb * 1024 * 1024)
+    after_read = _peak_rss_mb()
+    size = _run_legacy(image_bytes) if mode == "legacy" else _run_current(image_bytes)
+    print(json.dumps({
+        "mode": mode,
+        "baseline_mb": round(baseline, 1),
+        "after_read_mb": round(after_read, 1),
+        "peak_mb": round(_peak_rss_mb(), 1),
+        "payload_bytes": size,
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=20)
+    parser.add_argument("--child", choices=["legacy", "current"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.size_mb)
+        return
+
+    print(f"image size: {args.size_mb} MB")
+    for mode in ("legacy", "current"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--size-mb", str(args.size_mb)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(out)
+        growth = result["peak_mb"] - result["after_read_mb"]
+        print(
+            f"{mode:>8}: peak RSS {result['peak_mb']:7.1f} MB "
+            f"(+{growth:6.1f} MB over the uploaded bytes, payload {result['payload_bytes']} B)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Benchmark conversation fingerprinting on long chat histories.
+
+Compares two paths:
+  legacy   model_dump() every message, lowercase+join the first three in full, MD5
+  current  get_conversation_key() on the Pydantic models (prefix-capped, blake2b)
+
+Usage:
+  python scripts/bench_conversation_key.py
+  python scripts/bench_conversation_key.py --messages 500 --history-bytes 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+from pydantic import BaseModel
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.message import extract_text_from_content, get_conversation_key  # noqa: E402
+
+
+class Message(BaseModel):
+    """Same shape as main.Message (importing main would start the app)."""
+
+    role: str
+    content: Union[str, List[Dict[str, Any]]]
+
+
+def _legacy_key(messages: List[Message], client_identifier: str) -> str:
+    """Pre-change chat_impl + get_conversation_key."""
+    dumped = [m.model_dump() for m in messages]
+    message_fingerprints = []
+    for msg in dumped[:3]:
+        content = msg.get("content", "")
+        text = extract_text_from_content(content) if isinstance(content, list) else str(content)
+        message_fingerprints.append(f"{msg.get('role', '')}:{text.strip().lower()}")
+    conversation_prefix = f"{client_identifier}|" + "|".join(message_fingerprints)
+    return hashlib.md5(conversation_prefix.encode()).hexdigest()
+
+
+def _build_history(count: int, total_bytes: int) -> List[Message]:
+    per_message = max(1, total_bytes // count)
+    messages = [Message(role="system", content="You are a helpful assistant. " * (per_message // 29 + 1))]
+    # a multimodal turn early in the history: long text + inline image
+    messages.append(Message(role="user", content=[
+        {"type": "text", "text": "Describe this document. " * (per_message // 24 + 1)},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64," + "A" * per_message}},
+    ]))
+    for index in range(2, count):
+        role = "user" if index % 2 == 0 else "assistant"
+        messages.append(Message(role=role, content=f"turn {index} " + "lorem ipsum " * (per_message // 12)))
+    return messages
+
+
+def _bench(fn, messages, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(messages, "127.0.0.1")
+    return (time.perf_counter() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--history-bytes", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    messages = _build_history(args.messages, args.history_bytes)
+    print(f"messages={len(messages)} history_bytes~{args.history_bytes} iterations={args.iterations}")
+    legacy = _bench(_legacy_key, messages, args.iterations)
+    current = _bench(get_conversation_key, messages, args.iterations)
+    print(f" legacy: {legacy * 1e3:8.3f} ms/call")
+    print(f"current: {current * 1e3:8.3f} ms/call  ({legacy / current:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
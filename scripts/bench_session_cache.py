@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Benchmark the conversation→session cache with many conversations.
+
+Compares two in-memory implementations under the same request mix
+(lookup + session lock, then insert for new conversations / touch for
+continued ones):
+  legacy  dict + sort-by-updated_at on overflow, lock pruning rebuilds a key set
+  lru     current MemorySessionCache (OrderedDict LRU, locks reclaimed with entries)
+
+Usage:
+  python scripts/bench_session_cache.py
+  python scripts/bench_session_cache.py --conversations 100000 --max-entries 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.session_cache import MemorySessionCache  # noqa: E402
+
+
+class LegacySessionCache:
+    """Pre-change MultiAccountManager cache + session locks."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: dict = {}
+        self.cache_lock = asyncio.Lock()
+        self.locks: dict = {}
+        self.locks_lock = asyncio.Lock()
+        self.locks_max_size = 2000
+
+    def _ensure_size(self):
+        if len(self.entries) > self.max_entries:
+            sorted_items = sorted(self.entries.items(), key=lambda x: x[1]["updated_at"])
+            remove_count = len(sorted_items) - int(self.max_entries * 0.8)
+            for key, _ in sorted_items[:remove_count]:
+                del self.entries[key]
+
+    async def lock_for(self, conv_key: str) -> asyncio.Lock:
+        async with self.locks_lock:
+            if len(self.locks) > self.locks_max_size:
+                valid_keys = set(self.entries.keys())
+                keys_to_remove = [k for k in self.locks if k not in valid_keys]
+                for k in keys_to_remove[:len(keys_to_remove) // 2]:
+                    del self.locks[k]
+            if conv_key not in self.locks:
+                self.locks[conv_key] = asyncio.Lock()
+            return self.locks[conv_key]
+
+    async def get(self, conv_key: str):
+        return self.entries.get(conv_key)
+
+    async def set(self, conv_key: str, account_id: str, session_id: str):
+        async with self.cache_lock:
+            self.entries[conv_key] = {
+                "account_id": account_id,
+                "session_id": session_id,
+                "updated_at": time.time(),
+            }
+            self._ensure_size()
+
+    async def touch(self, conv_key: str):
+        async with self.cache_lock:
+            if conv_key in self.entries:
+                self.entries[conv_key]["updated_at"] = time.time()
+
+
+async def _run(cache, keys: list[str]) -> list[float]:
+    lock_for = cache.lock_for
+    if not asyncio.iscoroutinefunction(lock_for):
+        async def lock_for(conv_key, _sync=cache.lock_for):
+            return _sync(conv_key)
+
+    samples = []
+    for conv_key in keys:
+        start = time.perf_counter()
+        lock = await lock_for(conv_key)
+        async with lock:
+            if await cache.get(conv_key):
+                await cache.touch(conv_key)
+            else:
+                await cache.set(conv_key, "acc", "session")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _report(name: str, samples: list[float], cache) -> None:
+    samples.sort()
+    total = sum(samples)
+    p99 = samples[int(len(samples) * 0.99)]
+    locks = len(getattr(cache, "locks", getattr(cache, "_locks", {})))
+    print(
+        f"{name:>6}: {len(samples) / total:>10.0f} req/s  "
+        f"mean {statistics.fmean(samples) * 1e6:7.2f} us  "
+        f"p99 {p99 * 1e6:7.2f} us  max {samples[-1] * 1e3:7.2f} ms  locks {locks}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=100_000)
+    parser.add_argument("--max-entries", type=int, default=10_000)
+    parser.add_argument("--requests", type=int, default=300_000)
+    parser.add_argument("--continue-ratio", type=float, default=0.7, help="share of requests continuing a recent conversation")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    keys = []
+    recent: list[str] = []
+    next_id = 0
+    for _ in range(args.requests):
+        if recent and rng.random() < args.continue_ratio:
+            conv_key = recent[rng.randrange(len(recent))]
+        else:
+            conv_key = f"conv-{next_id % args.conversations}"
+            next_id += 1
+            recent.append(conv_key)
+            if len(recent) > args.max_entries:
+                recent.pop(0)
+        keys.append(conv_key)
+
+    print(
+        f"conversations={args.conversations} max_entries={args.max_entries} "
+        f"requests={args.requests} continue_ratio={args.continue_ratio}"
+    )
+    for name, cache in (
+        ("legacy", LegacySessionCache(3600, args.max_entries)),
+        ("lru", MemorySessionCache(3600, args.max_entries)),
+    ):
+        _report(name, await _run(cache, keys), cache)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Benchmark the widgetStreamAssist JSON array parsers.
+
+Compares the legacy per-character parser (fed by ``aiter_lines``) with the
+chunk-level parser (fed by ``aiter_bytes``) on 10 KB / 1 MB / 10 MB payloads.
+
+Usage:
+  python scripts/bench_streaming_parser.py
+  python scripts/bench_streaming_parser.py --payload recorded_stream.json --chunk-size 8192
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from util.streaming_parser import (  # noqa: E402
+    parse_json_array_stream_async,
+    parse_json_array_stream_chunks_async,
+)
+
+SIZES = [("10KB", 10 * 1024), ("1MB", 1024 * 1024), ("10MB", 10 * 1024 * 1024)]
+
+
+def _reply_object(index: int) -> dict:
+    """Shape of one widgetStreamAssist response object (text reply)."""
+    return {
+        "streamAssistResponse": {
+            "answer": {
+                "state": "IN_PROGRESS",
+                "replies": [{
+                    "groundedContent": {
+                        "content": {
+                            "role": "model",
+                            "text": f"第{index}段回复：流式输出的内容 with \"quotes\", {{braces}} and \\ escapes. " * 3,
+                        }
+                    }
+                }],
+            },
+            "sessionInfo": {"session": "projects/0/locations/global/sessions/1234567890"},
+            "assistToken": "token-" + "x" * 32,
+        }
+    }
+
+
+def build_payload(target_size: int) -> bytes:
+    """Build a pretty-printed JSON array of roughly ``target_size`` bytes, like upstream."""
+    parts = []
+    size = 2
+    index = 0
+    while size < target_size:
+        part = json.dumps(_reply_object(index), ensure_ascii=False, indent=2)
+        parts.append(part)
+        size += len(part.encode()) + 2
+        index += 1
+    return ("[" + ",\n".join(parts) + "]").encode()
+
+
+async def _iter_bytes(payload: bytes, chunk_size: int):
+    for i in range(0, len(payload), chunk_size):
+        yield payload[i:i + chunk_size]
+
+
+async def _iter_lines(payload: bytes):
+    for line in payload.decode().splitlines():
+        yield line
+
+
+async def _run_legacy(payload: bytes, chunk_size: int) -> int:
+    count = 0
+    async for _ in parse_json_array_stream_async(_iter_lines(payload)):
+        count += 1
+    return count
+
+
+async def _run_chunk(payload: bytes, chunk_size: int) -> int:
+    count = 0
+    async for _ in parse_json_array_stream_chunks_async(_iter_bytes(payload, chunk_size)):
+        count += 1
+    return count
+
+
+def _bench(runner, payload: bytes, chunk_size: int, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = asyncio.run(runner(payload, chunk_size))
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload", help="recorded widgetStreamAssist response body (used for every size)")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="bytes per aiter_bytes chunk")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best time is reported")
+    args = parser.parse_args()
+
+    if args.payload:
+        cases = [(Path(args.payload).name, Path(args.payload).read_bytes())]
+    else:
+        cases = [(label, build_payload(size)) for label, size in SIZES]
+
+    print(f"{'payload':>10} {'objects':>8} {'legacy(s)':>10} {'chunk(s)':>10} {'speedup':>8}")
+    for label, payload in cases:
+        legacy_s, legacy_count = _bench(_run_legacy, payload, args.chunk_size, args.repeat)
+        chunk_s, chunk_count = _bench(_run_chunk, payload, args.chunk_size, args.repeat)
+        if legacy_count != chunk_count:
+            raise SystemExit(f"object count mismatch on {label}: legacy={legacy_count} chunk={chunk_count}")
+        speedup = legacy_s / chunk_s if chunk_s else float("inf")
+        print(f"{label:>10} {chunk_count:>8} {legacy_s:>10.4f} {chunk_s:>10.4f} {speedup:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
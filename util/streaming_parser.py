@@ -1,7 +1,13 @@
+import codecs
 import json
-from typing import Iterator, Dict, Any, Iterable, AsyncIterator
+import re
+from typing import Iterator, Dict, Any, Iterable, AsyncIterator, Union
 from itertools import chain
 
+# 对象外部只关心结构字符（字符串起点与花括号），字符串内部只关心引号与转义符
+_STRUCTURAL_RE = re.compile(r'[{}"]')
+_STRING_RE = re.compile(r'["\\]')
+
 def parse_json_array_stream(line_iterator: Iterable[str]) -> Iterator[Dict[str, Any]]:
     """
     解析一个由文本行组成的、格式化的(pretty-printed)JSON数组流。
@@ -253,3 +259,119 @@ async def parse_json_array_stream_async(line_iterator: AsyncIterator[str]) -> As
     if brace_level != 0:
         print(f"警告: JSON流意外结束，括号层级为 {brace_level}，可能数据不完整。")
 
+
+
+async def parse_json_array_stream_chunks_async(
+    chunk_iterator: AsyncIterator[Union[bytes, str]]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    块级增量解析：直接消费 `httpx.Response.aiter_bytes()` 产出的数据块。
+
+    与逐字符版本产出完全相同的字典，但只用正则跳到下一个结构字符
+    （对象外部的 `{` `}` `"`，字符串内部的 `"` `\\`），普通文本整段跳过，
+    对象边界确定后对切片调用一次 `json.loads`。数据块按 UTF-8 增量解码，
+    多字节字符跨块拆分时不会出错；跨块的对象以片段列表暂存，避免字符串反复拼接。
+
+    Args:
+        chunk_iterator: 产出 bytes（或已解码 str）数据块的异步迭代器
+
+    Yields:
+        一个从流中解析出的JSON对象的字典。
+
+    Raises:
+        ValueError: 如果流不是以JSON数组开始，或者对象解析失败。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pieces = []  # 跨块对象的已扫描片段
+    depth = 0
+    in_string = False
+    escape_next = False
+    in_array = False
+
+    async def _texts():
+        async for chunk in chunk_iterator:
+            text = decoder.decode(chunk) if isinstance(chunk, (bytes, bytearray)) else chunk
+            if text:
+                yield text
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    async for text in _texts():
+        pos = 0
+        end = len(text)
+
+        # 1. 寻找数组的起始符 '['，之前只允许空白
+        if not in_array:
+            stripped = text.lstrip()
+            if not stripped:
+                continue
+            if stripped[0] != "[":
+                raise ValueError("数据流不是以一个JSON数组 ( '[' ) 开始。")
+            in_array = True
+            pos = end - len(stripped) + 1
+
+        # 跨块对象从本块开头继续
+        obj_start = 0 if depth > 0 else -1
+
+        # 2. 只在结构字符之间跳转
+        while pos < end:
+            if escape_next:
+                escape_next = False
+                pos += 1
+                continue
+
+            if in_string:
+                m = _STRING_RE.search(text, pos)
+                if m is None:
+                    pos = end
+                    break
+                pos = m.end()
+                if m.group() == "\\":
+                    escape_next = True
+                else:
+                    in_string = False
+                continue
+
+            if depth == 0:
+                # 对象之间（逗号、空白、结尾的 ']'）直接跳到下一个对象
+                start = text.find("{", pos)
+                if start < 0:
+                    pos = end
+                    break
+                obj_start = start
+                depth = 1
+                pos = start + 1
+                continue
+
+            m = _STRUCTURAL_RE.search(text, pos)
+            if m is None:
+                pos = end
+                break
+            pos = m.end()
+            char = m.group()
+            if char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    pieces.append(text[obj_start:pos])
+                    obj_str = "".join(pieces)
+                    pieces = []
+                    obj_start = -1
+                    try:
+                        yield json.loads(obj_str, strict=False)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"解析JSON对象失败: {e}\n内容: {obj_str}") from e
+
+        if depth > 0 and obj_start >= 0:
+            pieces.append(text[obj_start:])
+
+    if not in_array:
+        raise ValueError("数据流不是以一个JSON数组 ( '[' ) 开始。")
+
+    # 3. 检查流结束后，是否还有未闭合的对象
+    if depth != 0:
+        print(f"警告: JSON流意外结束，括号层级为 {depth}，可能数据不完整。")